@@ -0,0 +1,243 @@
+# Admission.py
+"""
+Admission control for the expensive endpoints (/chat, /stt, /tts, /chat/batch).
+
+Each request first passes a per-client token bucket (429 + Retry-After when the
+client is sending too fast), then waits for one of the endpoint's concurrency
+slots in a bounded queue (503 + Retry-After when the queue is full or the wait
+exceeds AdmissionQueueTimeout). Limits are per worker process and read from the
+settings on every request, so they can be tuned on a running server.
+
+/chat/batch streams its results, and the middleware would release the slot as
+soon as the response headers go out. That endpoint takes its slot itself with
+`acquire()` and releases it when the last result has been sent.
+"""
+
+import asyncio
+import math
+from contextlib import asynccontextmanager
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import Request
+from starlette.requests import HTTPConnection
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from .Settings import get_settings
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class RateLimited(Overloaded):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> Tuple[bool, float]:
+        """Consume one token; returns (allowed, seconds until a token is available)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class RateLimiter:
+    """Token bucket per (client, endpoint); the least recently seen clients are dropped past `max_clients`."""
+
+    def __init__(self, max_clients: int = 10000):
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client: str, endpoint: str, per_minute: float, burst: float) -> Tuple[bool, float]:
+        key = (client, endpoint)
+        rate = per_minute / 60.0
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket.rate, bucket.burst = rate, burst
+            return bucket.take()
+
+
+class ConcurrencyGate:
+    """
+    At most `limit` requests in flight; up to `queue_size` more wait (FIFO) for at most
+    `timeout` seconds. A released slot is handed straight to the oldest waiter. Thread
+    and event-loop agnostic, so it also works when requests run on different loops.
+    """
+
+    def __init__(self):
+        self.active = 0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+        self._avg_service = 1.0  # seconds, exponentially weighted; used for Retry-After
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, limit: int, queue_size: int, timeout: float):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.active < limit and not self._waiters:
+                self.active += 1
+                return
+            if len(self._waiters) >= queue_size:
+                raise Overloaded(self.retry_after(limit))
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                # otherwise a slot is already on its way; _grant sees the cancelled future and frees it
+            raise Overloaded(self.retry_after(limit))
+
+    def release(self, elapsed: Optional[float] = None):
+        if elapsed is not None:
+            self._avg_service = 0.8 * self._avg_service + 0.2 * elapsed
+        with self._lock:
+            if self._waiters:
+                loop, fut = self._waiters.popleft()
+                loop.call_soon_threadsafe(self._grant, fut)
+            else:
+                self.active -= 1
+
+    def _grant(self, fut: asyncio.Future):
+        if fut.done():  # the waiter timed out meanwhile; pass the slot on
+            self.release()
+        else:
+            fut.set_result(True)
+
+    def retry_after(self, limit: int) -> float:
+        """Rough time until a slot frees up for a newcomer at the back of the queue."""
+        return self._avg_service * (1 + len(self._waiters) / max(1, limit))
+
+
+def client_id(request: HTTPConnection, trust_proxy: bool) -> str:
+    if trust_proxy:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def reject(status: int, message: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"error": message, "retry_after": round(retry_after, 1)},
+        status_code=status,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+# Per-worker admission state.
+limiter = RateLimiter()
+gates: Dict[str, ConcurrencyGate] = {}
+rejected = {"rate_limited": 0, "overloaded": 0}
+
+
+def stats() -> Dict[str, object]:
+    return {
+        "rejected": dict(rejected),
+        "endpoints": {path: {"active": g.active, "waiting": g.waiting} for path, g in gates.items()},
+    }
+
+
+# Streaming endpoints take their slot in the handler (`acquire`), not in the middleware.
+STREAMED = frozenset(["/chat/batch"])
+
+
+def _limits(settings) -> Dict[str, int]:
+    return {"/chat": settings.chat_concurrency, "/stt": settings.stt_concurrency, "/tts": settings.tts_concurrency,
+            "/chat/batch": settings.batch_concurrency}
+
+
+def is_limited(path: str) -> bool:
+    settings = get_settings().admission
+    return settings.enabled and path in _limits(settings) and path not in STREAMED
+
+
+async def acquire(path: str, connection: HTTPConnection) -> Callable[[], None]:
+    """
+    Take one of `path`'s slots and return the function that gives it back (safe to
+    call more than once). Raises RateLimited or Overloaded when the caller should
+    be turned away.
+    """
+    settings = get_settings().admission
+    limits = _limits(settings)
+    if not settings.enabled or path not in limits:
+        return lambda: None
+
+    allowed, wait = limiter.check(client_id(connection, settings.trust_proxy), path,
+                                  settings.rate_per_minute, settings.burst)
+    if not allowed:
+        rejected["rate_limited"] += 1
+        raise RateLimited(wait)
+
+    gate = gates.setdefault(path, ConcurrencyGate())
+    try:
+        await gate.acquire(limits[path], settings.queue_size, settings.queue_timeout)
+    except Overloaded:
+        rejected["overloaded"] += 1
+        raise
+
+    start = time.monotonic()
+    released = threading.Event()
+
+    def release():
+        if not released.is_set():
+            released.set()
+            gate.release(time.monotonic() - start)
+
+    return release
+
+
+@asynccontextmanager
+async def admitted(path: str, connection: HTTPConnection):
+    """
+    Hold one of `path`'s slots for the duration of the block. Raises RateLimited or
+    Overloaded when the caller should be turned away. Also used for the operations
+    multiplexed over the WebSocket, which the HTTP middleware never sees.
+    """
+    release = await acquire(path, connection)
+    try:
+        yield
+    finally:
+        release()
+
+
+class AdmissionMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path.rstrip("/")
+        if not is_limited(path):
+            return await call_next(request)
+        try:
+            async with admitted(path, request):
+                return await call_next(request)
+        except RateLimited as e:
+            return reject(429, "Too many requests", e.retry_after)
+        except Overloaded as e:
+            return reject(503, "Server busy", e.retry_after)
@@ -0,0 +1,236 @@
+# AnswerCache.py
+"""
+Semantic cache of general answers, so a question that was already answered
+("what is python programming language?", "who was akbar?") doesn't cost another
+Groq completion when it is asked again, even worded a little differently.
+
+Queries are embedded with a small CPU model (fastembed, AnswerCacheEmbeddingModel)
+and compared by cosine similarity against every cached query at once: the
+vectors sit in one NumPy matrix, so a lookup is a single matrix-vector product.
+A cached answer is returned when the best match reaches AnswerCacheThreshold.
+Where fastembed isn't installed, or its model can't be loaded, queries are
+embedded as hashed word and character-trigram counts instead. That catches
+rewordings and typos but not synonyms, and has its own threshold
+(AnswerCacheHashThreshold).
+
+Only queries that stand on their own are cached (`cacheable()`): nothing that
+refers back to the conversation ("what about his son?", "explain that again"),
+talks about the user ("my", "I") or depends on the date ("today", "latest").
+A hit also needs the same numbers, question words and negation as the cached
+query (`signature()`). Embeddings barely tell "what is 12 squared" from "what is
+13 squared", "what is python" from "why is python", or "is python compiled" from
+"is python not compiled", and those need different answers.
+
+Entries expire after AnswerCacheTTL seconds. When all AnswerCacheSize slots are
+live, the least recently used one is replaced. The cache lives in the worker's
+memory and is cleared when the chat model, the identity or the cache settings
+change. The embedding model is loaded in the background when the API starts
+(`warm()`), so the first /chat doesn't wait for a download; a turn that
+arrives while it is still loading waits for it.
+"""
+
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .Lazy import Lazy
+from .Settings import get_settings, on_reload
+
+HASH_DIM = 1024
+
+# Question words and fillers, left out of hashed embeddings so the subject decides the match.
+STOP_WORDS = frozenset(
+    "a an the is are was were be of in on to for and or what who whom which how why when where "
+    "do does did can could tell me about please explain define".split())
+
+# Words that tie a query to the conversation, the user or the current date.
+CONTEXT_WORDS = re.compile(
+    r"\b(it|its|that|this|these|those|he|him|his|she|her|hers|they|them|their|there|then|same|again|"
+    r"more|else|also|above|previous|earlier|before|last|next|continue|elaborate|further|"
+    r"i|i'm|my|mine|we|our|us|now|today|tonight|tomorrow|yesterday|current|currently|latest|recent)\b")
+
+
+def cacheable(query: str) -> bool:
+    """True if `query` can be answered the same way regardless of history and date."""
+    query = query.lower().strip()
+    return bool(query) and not CONTEXT_WORDS.search(query)
+
+
+# Words that change which answer is right while barely moving an embedding.
+QUESTION_WORDS = frozenset("what who whom whose which why when where how".split())
+NEGATIONS = re.compile(
+    r"\b(not|no|never|neither|nor|none|nothing|nobody|without|cannot|"
+    r"dont|doesnt|didnt|isnt|arent|wasnt|werent|cant|wont|shouldnt|wouldnt|couldnt|havent|hasnt)\b|n't\b")
+
+
+def signature(query: str) -> Tuple[Tuple[str, ...], Tuple[str, ...], bool]:
+    """Numbers, question words and negation of `query`; a cache hit needs the same signature."""
+    query = query.lower()
+    numbers = tuple(sorted(re.findall(r"\d+(?:\.\d+)?", query)))
+    question = tuple(sorted(QUESTION_WORDS.intersection(re.findall(r"[a-z]+", query))))
+    return numbers, question, bool(NEGATIONS.search(query.replace("\u2019", "'")))
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class HashEmbedder:
+    """Hashed bag of words and character trigrams; no model download needed."""
+    name = "hash"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"[a-z0-9]+", text.lower())
+            words = [w for w in words if w not in STOP_WORDS] or words
+            features = words + [f" {w} "[i:i + 3] for w in words for i in range(len(w))]
+            for feature in features:
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % HASH_DIM] += 1.0 if h & 0x80000000 else -1.0
+        return _normalized(vectors)
+
+
+class FastEmbedder:
+    def __init__(self, model: str):
+        from fastembed import TextEmbedding  # downloads the model on first use, so it needs network once
+        self.name = model
+        self._model = TextEmbedding(model_name=model)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return _normalized(np.array(list(self._model.embed(texts)), dtype=np.float32))
+
+
+def make_embedder(model: str):
+    start = time.monotonic()
+    try:
+        embedder = FastEmbedder(model)
+    except ImportError:
+        print("[AnswerCache] fastembed not installed, using hashed n-grams (AnswerCacheHashThreshold)")
+        return HashEmbedder()
+    except Exception as e:
+        print(f"[AnswerCache] Embedding model {model} unavailable (offline?), using hashed n-grams: {e}")
+        return HashEmbedder()
+    print(f"[AnswerCache] Loaded embedding model {model} in {time.monotonic() - start:.1f}s")
+    return embedder
+
+
+class AnswerCache:
+    def __init__(self, embedder, capacity: int, ttl: float, threshold: float):
+        self.embedder = embedder
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None  # (capacity, dim), allocated on the first store
+        self._expires = np.zeros(self.capacity)      # 0 marks a free slot
+        self._used = np.zeros(self.capacity)
+        self._entries: List[Optional[Tuple[str, str, tuple]]] = [None] * self.capacity  # query, answer, signature
+        self._stats = {"hits": 0, "misses": 0, "skipped": 0, "stores": 0, "evictions": 0, "expirations": 0}
+
+    def _embed(self, query: str) -> np.ndarray:
+        return self.embedder.embed([query.strip()])[0]
+
+    def _best(self, vector: np.ndarray, query_signature: tuple, now: float) -> Tuple[int, float]:
+        # Called with the lock held. Frees expired slots on the way.
+        expired = (self._expires > 0) & (self._expires <= now)
+        if expired.any():
+            self._stats["expirations"] += int(expired.sum())
+            self._expires[expired] = 0
+            for slot in np.flatnonzero(expired):
+                self._entries[slot] = None
+        if self._vectors is None:
+            return -1, 0.0
+        scores = self._vectors @ vector
+        scores[self._expires == 0] = -1.0
+        for slot in np.flatnonzero(scores >= self.threshold):  # few candidates: check their signatures
+            if self._entries[slot][2] != query_signature:
+                scores[slot] = -1.0
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+
+    def lookup(self, query: str) -> Optional[str]:
+        """The cached answer to a query close enough to `query`, or None."""
+        vector = self._embed(query)
+        now = time.time()
+        with self._lock:
+            slot, score = self._best(vector, signature(query), now)
+            if slot < 0 or score < self.threshold:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._used[slot] = now
+            return self._entries[slot][1]
+
+    def skip(self):
+        """Count a query that wasn't eligible for the cache."""
+        with self._lock:
+            self._stats["skipped"] += 1
+
+    def store(self, query: str, answer: str):
+        vector = self._embed(query)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            slot, score = self._best(vector, signature(query), now)
+            if slot < 0 or score < self.threshold:  # not a near-duplicate of a cached query
+                free = np.flatnonzero(self._expires == 0)
+                if free.size:
+                    slot = int(free[0])
+                else:
+                    slot = int(np.argmin(self._used))
+                    self._stats["evictions"] += 1
+            self._vectors[slot] = vector
+            self._expires[slot] = now + self.ttl
+            self._used[slot] = now
+            self._entries[slot] = (query.strip(), answer, signature(query))
+            self._stats["stores"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._expires[:] = 0
+            self._entries = [None] * self.capacity
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = int(np.count_nonzero(self._expires > time.time()))
+        looked_up = stats["hits"] + stats["misses"]
+        stats.update(entries=entries, capacity=self.capacity, embedder=self.embedder.name,
+                     threshold=self.threshold, hit_rate=round(stats["hits"] / looked_up, 3) if looked_up else 0.0)
+        return stats
+
+
+def _make_cache() -> AnswerCache:
+    settings = get_settings().answer_cache
+    embedder = make_embedder(settings.embedding_model)
+    threshold = settings.hash_threshold if isinstance(embedder, HashEmbedder) else settings.threshold
+    return AnswerCache(embedder, settings.size, settings.ttl, threshold)
+
+
+_cache = Lazy(_make_cache)
+
+
+def warm():
+    """Build the cache, loading (or downloading) the embedding model, in the background."""
+    threading.Thread(target=_cache.get, name="answer-cache-load", daemon=True).start()
+
+
+def _on_reload(old, new):
+    if (old.chat, old.identity, old.answer_cache) != (new.chat, new.identity, new.answer_cache):
+        _cache.reset()
+        if new.answer_cache.enabled:
+            warm()
+
+
+on_reload(_on_reload)
+
+
+def get_answer_cache() -> AnswerCache:
+    return _cache.get()
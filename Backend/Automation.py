@@ -1,24 +1,21 @@
 # Automation.py
 
-from AppOpener import close, open as appopen
+# Desktop/automation stacks (AppOpener, pywhatkit, keyboard, bs4) are imported
+# inside the functions that use them so the API process doesn't load them at startup.
 from webbrowser import open as webopen
-from pywhatkit.misc import search, playonyt  # fixed import path
-from dotenv import dotenv_values
 from urllib.parse import quote
-from bs4 import BeautifulSoup
 from rich import print
-from groq import Groq
+from .AppIndex import get_app_index
+from .Settings import get_settings
+from . import LLMGateway
 import requests
 import subprocess
-import keyboard
 import asyncio
 import os
 import re
-from typing import List, Dict
-
-# --- Load environment variables ---
-env_vars = dotenv_values(".env")
-GroqAPIKey = env_vars.get("GroqAPIKey")
+import threading
+import uuid
+from typing import List, Dict, Optional, Tuple
 
 # --- Constants ---
 classes = [
@@ -31,18 +28,14 @@ classes = [
 ]
 useragent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.75 Safari/537.36"
 
-# --- Groq client ---
-client = Groq(api_key=GroqAPIKey)
-
-# --- Globals ---
-messages: List[Dict[str, str]] = []
-SystemChatBot = [
-    {
-        "role": "system",
-        "content": f"Hello, I am {os.environ.get('Username')}. "
-                   "You're a content writer. You have to write content, like letters, codes, applications, essays, notes, songs, poem etc."
-    }
-]
+def SystemChatBot():
+    return [
+        {
+            "role": "system",
+            "content": f"Hello, I am {get_settings().identity.username}. "
+                       "You're a content writer. You have to write content, like letters, codes, applications, essays, notes, songs, poem etc."
+        }
+    ]
 
 # ---------- NEW: Friendly names → official URLs (browser fallback) ----------
 APP_URLS: Dict[str, str] = {
@@ -82,57 +75,51 @@ APP_URLS: Dict[str, str] = {
     "canva": "https://www.canva.com",
 }
 
-# --- Helper: normalize messages for Groq ---
-def normalize_messages(msgs):
-    fixed = []
-    for m in msgs:
-        role = m.get("role", "").lower()
-        if role not in ["system", "user", "assistant"]:
-            role = "user"
-        fixed.append({"role": role, "content": m.get("content", "")})
-    return fixed
-
 # --- Core functions ---
 def GoogleSearch(topic):
+    from pywhatkit.misc import search  # fixed import path
     search(topic)
     return True
 
-def Content(topic):
-    """Generate content using Groq AI and save to file."""
-    def OpenNotepad(file_path):
-        subprocess.Popen(["notepad.exe", file_path])
-
-    def ContentAI(prompt):
-        formatted_msgs = normalize_messages(SystemChatBot + messages)
-        formatted_msgs.append({"role": "user", "content": prompt})
-
-        completion = client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=formatted_msgs,
-            max_tokens=2048,
-            temperature=0.7,
-            top_p=1,
-            stream=True
-        )
-
-        answer = ""
-        for chunk in completion:
-            if chunk.choices[0].delta.content:
-                answer += chunk.choices[0].delta.content
-
-        answer = answer.replace("</s>", "")
-        messages.append({"role": "assistant", "content": answer})
-        return answer
+def ContentFilePath(topic: str) -> str:
+    """A new file under Data/ named after the topic, so concurrent requests never share one."""
+    slug = re.sub(r"[^a-z0-9]+", "-", topic.lower()).strip("-")[:50] or "content"
+    return os.path.join("Data", f"{slug}-{uuid.uuid4().hex[:8]}.txt")
 
+def Content(topic, cancelled: Optional[threading.Event] = None):
+    """
+    Write content about `topic` with Groq, streaming it into a new file as it is generated,
+    then open the file in Notepad. Returns the file path, or False once `cancelled` is set
+    (the partial file is kept). The prompt holds only this request: no shared history.
+    """
     clean_topic = topic.replace("Content", "").strip()
-    content_by_ai = ContentAI(clean_topic)
+    messages = SystemChatBot() + [{"role": "user", "content": clean_topic}]
+
+    def write(text):
+        file.write(text.replace("</s>", ""))
+        file.flush()  # readers see the document grow
 
-    file_path = rf"Data\{clean_topic.lower().replace(' ', '')}.txt"
+    settings = get_settings().content
+    file_path = ContentFilePath(clean_topic)
     with open(file_path, "w", encoding="utf-8") as file:
-        file.write(content_by_ai)
+        completion = LLMGateway.stream_chat(
+            "content",
+            messages,
+            model=settings.model,
+            max_tokens=settings.max_tokens,
+            temperature=settings.temperature,
+            top_p=1,
+            on_token=write,
+            stop=cancelled,
+        )
+    if completion.cancelled:
+        return False
 
-    OpenNotepad(file_path)
-    return True
+    try:
+        subprocess.Popen(["notepad.exe", file_path])
+    except OSError as e:
+        print(f"[Content] Could not open {file_path}: {e}")
+    return file_path
 
 def YouTubeSearch(topic):
     url = f"https://www.youtube.com/results?search_query={topic}"
@@ -140,32 +127,31 @@ def YouTubeSearch(topic):
     return True
 
 def PlayYoutube(query):
+    from pywhatkit.misc import playonyt
     playonyt(query)
     return True
 
 # ---------- NEW: safer fallback if local app not found ----------
 def _best_url_for_app(name: str) -> str:
-    key = name.lower().strip()
-    # direct match
-    if key in APP_URLS:
-        return APP_URLS[key]
-    # fuzzy partial match
-    for k, url in APP_URLS.items():
-        if k in key or key in k:
-            return url
+    match = get_app_index().resolve(name, {"url"})
+    if match:
+        return match.target
     # default to Google search
-    query = name
-    return f"https://www.google.com/search?q={quote(query)}"
+    return f"https://www.google.com/search?q={quote(name)}"
 
 def OpenApp(app_name, sess=requests.session()):
     """
-    Try to open a local desktop app using AppOpener.
-    If not present, fall back to opening the official web app (or Google search) in the browser.
+    Open the installed app or web app whose name best matches `app_name` (see AppIndex).
+    With no good match, fall back to a Google search in the browser.
     """
     name = app_name.strip().strip("\"'")  # sanitize quotes
+    match = get_app_index().resolve(name, {"app"})  # installed apps first, like before
     try:
-        # Attempt local app open (AppOpener does fuzzy matching with match_closest=True)
-        appopen(name, match_closest=True, output=True, throw_error=True)
+        if match is None:
+            raise LookupError("no installed app matches")
+        from AppOpener import open as appopen
+        # Exact indexed name: AppOpener doesn't need to rescan for the closest app
+        appopen(match.target, match_closest=False, output=True, throw_error=True)
         return True
     except Exception as app_open_error:
         print(f"[OpenApp] AppOpener failed for '{name}': {app_open_error}")
@@ -184,6 +170,7 @@ def OpenApp(app_name, sess=requests.session()):
         def extract_links(html):
             if html is None:
                 return []
+            from bs4 import BeautifulSoup
             soup = BeautifulSoup(html, 'html.parser')
             # Try general link extraction if jsname selector fails
             links = [a.get('href') for a in soup.find_all('a', href=True)]
@@ -219,12 +206,18 @@ def CloseApp(app_name):
     if "chrome" in app_name.lower():
         return False
     try:
-        close(app_name, match_closest=True, output=True, throw_error=True)
+        from AppOpener import close
+        match = get_app_index().resolve(app_name, {"app"})
+        if match:
+            close(match.target, match_closest=False, output=True, throw_error=True)
+        else:
+            close(app_name, match_closest=True, output=True, throw_error=True)
         return True
     except:
         return False
 
 def System(command):
+    import keyboard
     cmd = command.lower().strip()
     if cmd == "mute":
         keyboard.press_and_release("volume mute")
@@ -236,25 +229,37 @@ def System(command):
         keyboard.press_and_release("volume down")
     return True
 
+# --- Command parsing ---
+# Command prefix -> function taking the rest of the command.
+ACTIONS = {
+    "open": OpenApp,
+    "close": CloseApp,
+    "play": PlayYoutube,
+    "content": Content,
+    "google search": GoogleSearch,
+    "youtube search": YouTubeSearch,
+    "system": System,
+}
+CANCELLABLE = {"content"}  # actions that accept a `cancelled` event
+
+def ParseCommand(command: str) -> Optional[Tuple[str, str]]:
+    """"open notepad" -> ("open", "notepad"); None when no action matches."""
+    c = command.strip()
+    if c.startswith("open") and ("open it" in c or c == "open file"):
+        return None
+    for action in ACTIONS:
+        if c.startswith(action):
+            return action, c.removeprefix(action).strip()
+    return None
+
 # --- Async command executor ---
 async def TranslateAndExecute(commands: List[str]):
     funcs = []
     for command in commands:
-        c = command.strip()
-        if c.startswith("open") and "open it" not in c and "open file" != c:
-            funcs.append(asyncio.to_thread(OpenApp, c.removeprefix("open ").strip()))
-        elif c.startswith("close"):
-            funcs.append(asyncio.to_thread(CloseApp, c.removeprefix("close ").strip()))
-        elif c.startswith("play"):
-            funcs.append(asyncio.to_thread(PlayYoutube, c.removeprefix("play ").strip()))
-        elif c.startswith("content"):
-            funcs.append(asyncio.to_thread(Content, c.removeprefix("content ").strip()))
-        elif c.startswith("google search"):
-            funcs.append(asyncio.to_thread(GoogleSearch, c.removeprefix("google search ").strip()))
-        elif c.startswith("youtube search"):
-            funcs.append(asyncio.to_thread(YouTubeSearch, c.removeprefix("youtube search ").strip()))
-        elif c.startswith("system"):
-            funcs.append(asyncio.to_thread(System, c.removeprefix("system ").strip()))
+        parsed = ParseCommand(command)
+        if parsed:
+            action, target = parsed
+            funcs.append(asyncio.to_thread(ACTIONS[action], target))
         else:
             print(f"[Automation] No Function Found. For command: {command}")
 
@@ -0,0 +1,180 @@
+# AutomationExecutor.py
+"""
+Managed execution of automation commands (open, close, play, content, ...).
+
+`submit()` turns the automation decisions of a query into jobs and returns at
+once; the request never waits for an app to open or content to be written.
+Jobs run on one thread pool (AutomationWorkers threads), and at most
+Automation<Action>Concurrency jobs of one action type run at the same time. The
+rest wait in a FIFO per type, so a few slow "content" jobs (long LLM calls)
+can't hold up "open" or "close".
+
+Job records (status, result, error, timestamps) are written to the shared state
+on every transition, so any worker can answer a status poll. Unfinished jobs
+are also registered in Tasks under the session and job that submitted them, so
+/stop reaches them. Cancelling drops a queued job straight away, and a running
+content job stops at the next streamed chunk. Other actions are short and are
+left to finish.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from .Automation import ACTIONS, CANCELLABLE, ParseCommand
+from .Lazy import Lazy
+from . import Tasks
+from .Settings import get_settings
+from .State import get_state
+
+JOB_REGISTRY = "automation:jobs"
+FINISHED = ("done", "failed", "cancelled")
+
+
+@dataclass
+class AutomationJob:
+    job_id: str
+    command: str
+    action: str
+    target: str
+    status: str = "queued"  # queued -> running -> done | failed | cancelled
+    result: Any = None
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    worker: int = field(default_factory=os.getpid)
+    session: Optional[str] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    task: Optional[Tasks.Task] = field(default=None, repr=False)
+
+    def record(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in (
+            "job_id", "command", "action", "target", "status", "result", "error",
+            "created", "started", "finished", "worker", "session")}
+
+
+def _limit(action: str) -> int:
+    settings = get_settings().automation
+    limits = {"open": settings.open_concurrency, "close": settings.close_concurrency,
+              "play": settings.play_concurrency, "content": settings.content_concurrency}
+    return max(1, limits.get(action, settings.other_concurrency))
+
+
+class AutomationExecutor:
+    def __init__(self, workers: int):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="automation")
+        self._lock = threading.Lock()
+        self._running: Dict[str, int] = defaultdict(int)
+        self._waiting: Dict[str, Deque[AutomationJob]] = defaultdict(deque)
+        self._jobs: Dict[str, AutomationJob] = {}  # this worker's unfinished jobs
+
+    # --- submission ---
+    def submit(self, commands: List[str]) -> List[AutomationJob]:
+        """Queue every automation command in `commands`; others (general, realtime, ...) are skipped."""
+        jobs = []
+        for command in commands:
+            parsed = ParseCommand(command)
+            if parsed is None:
+                continue
+            job = AutomationJob(uuid.uuid4().hex, command.strip(), *parsed, session=Tasks.current_session())
+            job.task = Tasks.register("automation", lambda job_id=job.job_id: self.cancel(job_id),
+                                      task_id=job.job_id, description=job.command)
+            self._save(job)
+            with self._lock:
+                self._jobs[job.job_id] = job
+                if self._running[job.action] < _limit(job.action):
+                    self._start(job)
+                else:
+                    self._waiting[job.action].append(job)
+            jobs.append(job)
+        return jobs
+
+    def _start(self, job: AutomationJob):
+        # Called with the lock held.
+        self._running[job.action] += 1
+        self._pool.submit(self._run, job)
+
+    def _run(self, job: AutomationJob):
+        try:
+            if job.cancel_event.is_set():
+                self._finish(job, "cancelled")
+                return
+            job.status, job.started = "running", time.time()
+            self._save(job)
+            kwargs = {"cancelled": job.cancel_event} if job.action in CANCELLABLE else {}
+            try:
+                with Tasks.scope(job.task.session, job.task.job):  # tag what the action starts (LLM streams)
+                    result = ACTIONS[job.action](job.target, **kwargs)
+            except Exception as e:
+                print(f"[Automation] Task error: {job.command}: {e}")
+                self._finish(job, "failed", error=str(e))
+                return
+            if job.cancel_event.is_set():
+                self._finish(job, "cancelled")
+            elif result is False:
+                self._finish(job, "failed", error=f"could not {job.command}")
+            else:
+                self._finish(job, "done", result=result)
+        finally:
+            with self._lock:
+                self._running[job.action] -= 1
+                waiting = self._waiting[job.action]
+                if waiting and self._running[job.action] < _limit(job.action):
+                    self._start(waiting.popleft())
+
+    def _finish(self, job: AutomationJob, status: str, result: Any = None, error: Optional[str] = None):
+        job.status, job.result, job.error, job.finished = status, result, error, time.time()
+        with self._lock:
+            self._jobs.pop(job.job_id, None)
+        Tasks.unregister(job.task)
+        self._save(job)
+        self._prune()
+
+    # --- records ---
+    @staticmethod
+    def _save(job: AutomationJob):
+        get_state().hset(JOB_REGISTRY, job.job_id, job.record())
+
+    @staticmethod
+    def _prune():
+        """Keep the newest AutomationJobHistory finished jobs."""
+        state = get_state()
+        finished = sorted((r for r in state.hgetall(JOB_REGISTRY).values() if r.get("status") in FINISHED),
+                          key=lambda r: r.get("finished") or 0)
+        for record in finished[:max(0, len(finished) - get_settings().automation.job_history)]:
+            state.hdel(JOB_REGISTRY, record["job_id"])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return get_state().hgetall(JOB_REGISTRY).get(job_id)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        records = sorted(get_state().hgetall(JOB_REGISTRY).values(), key=lambda r: r.get("created") or 0, reverse=True)
+        return records[:limit]
+
+    # --- cancellation ---
+    def cancel(self, job_id: str) -> bool:
+        """Cancel one of this worker's unfinished jobs; False if it isn't one."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return False
+            job.cancel_event.set()
+            queued = job in self._waiting[job.action]
+            if queued:
+                self._waiting[job.action].remove(job)
+        if queued:
+            self._finish(job, "cancelled")
+        return True
+
+
+_executor = Lazy(lambda: AutomationExecutor(get_settings().server.automation_workers))
+
+
+def get_executor() -> AutomationExecutor:
+    return _executor.get()
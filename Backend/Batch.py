@@ -0,0 +1,135 @@
+# Batch.py
+"""
+Bulk question runs (regression checks, FAQ pre-generation) without one /chat
+POST per question.
+
+Input is JSONL: one prompt per line, either a JSON object with a "prompt" and
+an optional "id", or a bare JSON string. Every prompt goes through
+process_query in its own isolated conversation (State.isolated_history), so
+items neither see nor rewrite the shared chat log, and they don't see each
+other. Nothing else is changed either: automation, image generation and
+reminder intents are answered with "Not run in a batch: ..." instead of being
+carried out, and answers aren't written to the answer cache or counted for
+prefetching. Up to `concurrency` items run at once (BatchConcurrency by default,
+capped at BatchMaxConcurrency). Results are emitted as JSONL in the order the
+items finish:
+
+    {"index": 3, "id": "q3", "prompt": "...", "response": "...", "ms": 812.4}
+    {"index": 5, "id": null, "prompt": "...", "error": "...", "ms": 3.1}
+
+The batch is registered in Tasks, so /stop (or /stop?job=<X-Job-ID>) cancels
+the items in flight and skips the rest.
+
+    python -m Backend.Batch questions.jsonl --concurrency 8 --out answers.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from . import Tasks
+from .Settings import get_settings
+from .State import isolated_history
+
+
+def parse_items(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """JSONL lines to items; blank lines are skipped, malformed ones become items with an error."""
+    items = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        item: Dict[str, Any] = {"index": len(items), "id": None, "prompt": None}
+        try:
+            value = json.loads(line)
+            if isinstance(value, str):
+                value = {"prompt": value}
+            prompt = value.get("prompt") if isinstance(value, dict) else None
+            if not isinstance(prompt, str) or not prompt.strip():
+                raise ValueError("expected a JSON string or an object with a \"prompt\"")
+            item.update(id=value.get("id"), prompt=prompt)
+        except ValueError as e:
+            item["error"] = f"invalid line: {e}"
+        items.append(item)
+    return items
+
+
+def resolve_concurrency(requested: Optional[int]) -> int:
+    settings = get_settings().batch
+    return max(1, min(requested or settings.concurrency, settings.max_concurrency))
+
+
+def answer_isolated(answer: Callable[[str], str], prompt: str) -> str:
+    with isolated_history():
+        return answer(prompt)
+
+
+async def run_batch(items: List[Dict[str, Any]], answer: Callable[[str], str],
+                    concurrency: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Answer `items` with `answer(prompt)` (process_query); yields one result per item as it finishes."""
+    limit = asyncio.Semaphore(resolve_concurrency(concurrency))
+    done: asyncio.Queue = asyncio.Queue()
+
+    with Tasks.track("batch", description=f"{len(items)} prompts") as task:
+        async def run(item: Dict[str, Any]):
+            result = {key: item[key] for key in ("index", "id", "prompt")}
+            async with limit:
+                start = time.perf_counter()
+                if "error" in item:
+                    result["error"] = item["error"]
+                elif task.cancelled.is_set():
+                    result["error"] = "Cancelled"
+                else:
+                    try:
+                        result["response"] = await run_in_threadpool(answer_isolated, answer, item["prompt"])
+                    except Exception as e:
+                        result["error"] = str(e)
+                result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+            await done.put(result)
+
+        workers = [asyncio.create_task(run(item)) for item in items]
+        try:
+            for _ in items:
+                yield await done.get()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+
+async def _run_cli(args) -> int:
+    from .Main import process_query
+
+    if args.input == "-":
+        items = parse_items(sys.stdin)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            items = parse_items(f)
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    errors, start = 0, time.perf_counter()
+    try:
+        async for result in run_batch(items, process_query, args.concurrency):
+            errors += "error" in result
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"[Batch] {len(items)} prompts, {errors} errors, {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 1 if errors else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of prompts, writing JSONL results.")
+    parser.add_argument("input", help="JSONL file of prompts ('-' for stdin)")
+    parser.add_argument("--concurrency", type=int, help="prompts answered at once (default BatchConcurrency)")
+    parser.add_argument("--out", help="write results here instead of stdout")
+    return asyncio.run(_run_cli(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
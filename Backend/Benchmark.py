@@ -0,0 +1,716 @@
+# Benchmark.py
+"""
+Offline benchmark harness for the backend.
+
+Every upstream the backend talks to (Groq, Cohere, Google search, OpenWeatherMap,
+Hugging Face, edge-tts, Chrome speech recognition) is replaced by a fake client
+that replays the recorded responses in data/BenchmarkFixtures.json with a
+configurable latency and token rate. The /chat, /stt and /tts endpoints, the
+/voice pipeline and the image generation path are then driven concurrently and
+we report throughput, latency percentiles and memory, so regressions show up on
+a machine without network access or API keys.
+
+Usage:
+    python -m Backend.Benchmark --scenario all --requests 200 --concurrency 8
+    python -m Backend.Benchmark --scenario chat --latency-ms 150 --tokens-per-sec 300
+    python -m Backend.Benchmark --scenario import --requests 5
+    python -m Backend.Benchmark --scenario router --requests 2000
+    python -m Backend.Benchmark --json bench.json
+    python -m Backend.Benchmark --baseline bench.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource  # Unix only; used for peak RSS.
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+FIXTURES_PATH = os.path.join(PROJECT_ROOT, "data", "BenchmarkFixtures.json")
+SCENARIOS = ["chat", "stt", "tts", "voice", "image"]
+
+# Packages that must not be loaded just by importing the API module.
+HEAVY_MODULES = [
+    "selenium", "webdriver_manager", "pygame", "edge_tts", "pywhatkit", "AppOpener",
+    "keyboard", "PIL", "bs4", "cohere", "groq", "googlesearch", "mtranslate", "PyQt5",
+    "numpy", "fastembed",
+]
+
+# =========================
+# UPSTREAM PROFILE
+# =========================
+@dataclass
+class UpstreamProfile:
+    """How the fake upstreams behave: time to first byte, streaming rate and failures."""
+    latency_ms: float = 20.0
+    tokens_per_sec: float = 2000.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 1234
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def wait_first_byte(self):
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            fail = self.error_rate > 0 and self._rng.random() < self.error_rate
+        delay = max(0.0, self.latency_ms + jitter) / 1000.0
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ConnectionError("Simulated upstream failure")
+
+    def wait_token(self, speedup: float = 1.0):
+        if self.tokens_per_sec > 0:
+            time.sleep(1.0 / (self.tokens_per_sec * speedup))
+
+
+class CallCounter:
+    """Thread-safe count of upstream calls per kind (groq, cohere, search, ...)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def hit(self, kind: str):
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+
+def load_fixtures(path: str = FIXTURES_PATH) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _tokenize(text: str) -> List[str]:
+    """Split text into word-sized pieces the way a streaming API would deliver them."""
+    words = text.split(" ")
+    return [w + " " for w in words[:-1]] + words[-1:]
+
+
+def _pick(items: List[str], key: str) -> str:
+    return items[zlib.crc32(key.encode("utf-8")) % len(items)]
+
+# =========================
+# FAKE CLIENTS
+# =========================
+class FakeGroq:
+    """Replays recorded answers through the Groq streaming chat completions interface."""
+
+    def __init__(self, fixtures, profile: UpstreamProfile, counter: CallCounter, api_key=None, **kwargs):
+        self.fixtures = fixtures
+        self.profile = profile
+        self.counter = counter
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=None, stream=False, max_tokens=None, **kwargs):
+        self.counter.hit("groq")
+        last_user = next((m.get("content", "") for m in reversed(messages or []) if m.get("role") == "user"), "")
+        answer = _pick(self.fixtures["answers"], last_user)
+        if not stream:
+            self.profile.wait_first_byte()
+            message = types.SimpleNamespace(content=answer, role="assistant")
+            return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+        # Smaller models stream faster ("model_speedup" in the fixtures); max_tokens caps the answer.
+        speedup = self.fixtures.get("model_speedup", {}).get(model, 1.0)
+        return self._stream(answer, messages or [], speedup, max_tokens)
+
+    def _stream(self, answer, messages, speedup=1.0, max_tokens=None):
+        self.profile.wait_first_byte()
+        tokens = _tokenize(answer)[:max_tokens]
+        for token in tokens:
+            self.profile.wait_token(speedup)
+            delta = types.SimpleNamespace(content=token)
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], x_groq=None)
+        # Like Groq, report usage on a final chunk without content.
+        usage = types.SimpleNamespace(prompt_tokens=sum(len(m.get("content", "").split()) for m in messages),
+                                      completion_tokens=len(tokens))
+        yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=None))],
+                                    x_groq=types.SimpleNamespace(usage=usage))
+
+
+class FakeCohere:
+    """Replays recorded decisions through the Cohere chat_stream interface."""
+
+    def __init__(self, fixtures, profile: UpstreamProfile, counter: CallCounter, api_key=None, **kwargs):
+        self.fixtures = fixtures
+        self.profile = profile
+        self.counter = counter
+
+    def decide(self, message: str) -> str:
+        from .Model import BATCH_HEADER
+        if message.startswith(BATCH_HEADER):
+            numbered = re.findall(r"^(\d+)\. (.*)$", message, re.MULTILINE)
+            return json.dumps({n: self.decide(query) for n, query in numbered})
+        key = message.strip().lower()
+        decision = self.fixtures["decisions"].get(key)
+        if decision is None:
+            decision = self.fixtures["default_decision"].format(query=key)
+        return decision
+
+    def chat_stream(self, message="", **kwargs):
+        self.counter.hit("cohere")
+        return self._stream(self.decide(message), message)
+
+    def chat(self, message="", **kwargs):
+        self.counter.hit("cohere")
+        self.profile.wait_first_byte()
+        return types.SimpleNamespace(text=self.decide(message))
+
+    def _stream(self, decision, message):
+        self.profile.wait_first_byte()
+        tokens = _tokenize(decision)
+        for token in tokens:
+            self.profile.wait_token()
+            yield types.SimpleNamespace(event_type="text-generation", text=token)
+        units = types.SimpleNamespace(input_tokens=len(message.split()), output_tokens=len(tokens))
+        yield types.SimpleNamespace(event_type="stream-end",
+                                    response=types.SimpleNamespace(meta=types.SimpleNamespace(billed_units=units)))
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None, content=b"", text=""):
+        self.status_code = status_code
+        self._payload = payload
+        self.content = content
+        self.text = text
+        self.headers = {"Content-Type": "application/json" if payload is not None else "text/html"}
+        self.ok = status_code < 400
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeHTTP:
+    """Routes requests.Session.request calls to recorded weather, image and page fixtures."""
+
+    def __init__(self, fixtures, profile: UpstreamProfile, counter: CallCounter):
+        self.fixtures = fixtures
+        self.profile = profile
+        self.counter = counter
+
+    def request(self, session, method, url, *args, **kwargs):
+        self.profile.wait_first_byte()
+        if "openweathermap.org/geo" in url:
+            self.counter.hit("geocode")
+            return FakeResponse(payload=self.fixtures["geocode"])
+        if "openweathermap.org" in url:
+            self.counter.hit("weather")
+            return FakeResponse(payload=self.fixtures["weather"])
+        if "huggingface" in url:
+            self.counter.hit("image")
+            return FakeResponse(content=b"\xff\xd8" + b"\0" * self.fixtures["image_bytes"])
+        self.counter.hit("http")
+        html = self.fixtures["page_html"]
+        return FakeResponse(text=html, content=html.encode("utf-8"))
+
+
+class FakeCommunicate:
+    """edge_tts.Communicate replacement producing fixed-size audio."""
+
+    fixtures: Dict[str, Any] = {}
+    profile: Optional[UpstreamProfile] = None
+    counter: Optional[CallCounter] = None
+
+    def __init__(self, text, voice=None, **kwargs):
+        self.text = text
+
+    async def stream(self):
+        self.counter.hit("tts")  # type: ignore
+        await asyncio.to_thread(self.profile.wait_first_byte)  # type: ignore
+        for _ in range(self.fixtures["audio_chunks"]):
+            yield {"type": "audio", "data": b"\0" * self.fixtures["audio_chunk_bytes"]}
+
+    async def save(self, path):
+        with open(path, "wb") as f:
+            async for chunk in self.stream():
+                f.write(chunk["data"])
+
+
+class FakeChromeDriver:
+    """Selenium driver replacement that 'recognises' a recorded transcript."""
+
+    fixtures: Dict[str, Any] = {}
+    profile: Optional[UpstreamProfile] = None
+    counter: Optional[CallCounter] = None
+
+    def __init__(self, *args, **kwargs):
+        self.counter.hit("chrome")  # type: ignore
+        self.transcript = ""
+
+    def get(self, url):
+        self.profile.wait_first_byte()  # type: ignore
+        self.transcript = _pick(self.fixtures["transcripts"], url + str(id(self)))
+
+    def find_element(self, by=None, value=None):
+        return types.SimpleNamespace(text=self.transcript)
+
+    def quit(self):
+        pass
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    sys.modules[name] = mod
+    parent, _, child = name.rpartition(".")
+    if parent and parent in sys.modules:
+        setattr(sys.modules[parent], child, mod)
+    return mod
+
+
+def install_fakes(fixtures, profile: UpstreamProfile, counter: CallCounter):
+    """
+    Register fake SDK modules and HTTP transport. The LLM gateway builds its
+    Groq and Cohere clients from these modules on first use; clients built
+    earlier are dropped so the fakes always answer.
+    """
+    def search(query, advanced=False, num_results=10, **kwargs):
+        counter.hit("search")
+        profile.wait_first_byte()
+        results = [types.SimpleNamespace(**r) for r in fixtures["search_results"][:num_results]]
+        return iter(results) if advanced else iter(r.url for r in results)
+
+    _module("groq", Groq=lambda *a, **k: FakeGroq(fixtures, profile, counter, *a, **k))
+    _module("cohere", Client=lambda *a, **k: FakeCohere(fixtures, profile, counter, *a, **k))
+    _module("googlesearch", search=search)
+    from . import LLMGateway
+    LLMGateway.reset()
+
+    FakeCommunicate.fixtures, FakeCommunicate.profile, FakeCommunicate.counter = fixtures, profile, counter
+    _module("edge_tts", Communicate=FakeCommunicate)
+
+    FakeChromeDriver.fixtures, FakeChromeDriver.profile, FakeChromeDriver.counter = fixtures, profile, counter
+    _module("selenium")
+    _module("selenium.webdriver", Chrome=FakeChromeDriver)
+    _module("selenium.webdriver.common")
+    _module("selenium.webdriver.common.by", By=types.SimpleNamespace(ID="id"))
+    _module("selenium.webdriver.chrome")
+    _module("selenium.webdriver.chrome.service", Service=lambda *a, **k: None)
+    _module("selenium.webdriver.chrome.options", Options=lambda: types.SimpleNamespace(
+        add_argument=lambda *a: None, add_experimental_option=lambda *a: None))
+    _module("webdriver_manager")
+    _module("webdriver_manager.chrome", ChromeDriverManager=lambda: types.SimpleNamespace(install=lambda: "chromedriver"))
+    _module("mtranslate", translate=lambda text, to="en", src="auto": text)
+
+    music = types.SimpleNamespace(load=lambda path: None, play=lambda: None, get_busy=lambda: False, stop=lambda: None)
+    mixer = types.SimpleNamespace(get_init=lambda: True, init=lambda: None, quit=lambda: None, music=music)
+    clock = types.SimpleNamespace(tick=lambda fps: None)
+    _module("pygame", mixer=mixer, time=types.SimpleNamespace(Clock=lambda: clock))
+
+    # Desktop-only automation stacks: never touch the host from a benchmark.
+    _module("pywhatkit")
+    _module("pywhatkit.misc", search=lambda topic: True, playonyt=lambda query: True)
+    _module("AppOpener", open=lambda *a, **k: True, close=lambda *a, **k: True, give_appnames=lambda: {})
+    _module("keyboard", press_and_release=lambda key: None)
+
+    # Upstream calls are skipped when a key is missing; the fakes answer them instead.
+    for key in ("CohereAPIKey", "GroqAPIKey", "HuggingFaceAPIKey", "OpenWeatherMapAPIKey"):
+        os.environ.setdefault(key, "benchmark")
+
+    import requests
+    import webbrowser
+    transport = FakeHTTP(fixtures, profile, counter)
+    requests.Session.request = lambda self, method, url, *a, **k: transport.request(self, method, url, *a, **k)  # type: ignore
+    webbrowser.open = lambda *a, **k: True  # type: ignore
+
+# =========================
+# RUNNER
+# =========================
+@dataclass
+class ScenarioResult:
+    scenario: str
+    requests: int
+    concurrency: int
+    errors: int
+    wall_s: float
+    throughput_rps: float
+    p50_ms: float
+    p90_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    py_peak_kb: float
+    rss_peak_kb: float
+    upstream_calls: Dict[str, int]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _rss_kb() -> float:
+    if resource is None:
+        return 0.0
+    return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def run_scenario(name: str, call: Callable[[int], Any], requests: int, concurrency: int,
+                 counter: CallCounter, trace_memory: bool = False) -> ScenarioResult:
+    """Run `call(i)` (a coroutine factory) `requests` times across `concurrency` threads."""
+    errors = 0
+    errors_lock = threading.Lock()
+
+    def one(i: int) -> float:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            asyncio.run(call(i))
+        except Exception as e:
+            print(f"[Benchmark] {name} request {i} failed: {e}")
+            with errors_lock:
+                errors += 1
+        return (time.perf_counter() - start) * 1000.0
+
+    counter.reset()
+    if trace_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    py_peak = 0.0
+    if trace_memory:
+        py_peak = tracemalloc.get_traced_memory()[1] / 1024.0
+        tracemalloc.stop()
+
+    return ScenarioResult(
+        scenario=name,
+        requests=requests,
+        concurrency=concurrency,
+        errors=errors,
+        wall_s=round(wall, 4),
+        throughput_rps=round(requests / wall, 2) if wall else 0.0,
+        p50_ms=round(percentile(latencies, 50), 2),
+        p90_ms=round(percentile(latencies, 90), 2),
+        p95_ms=round(percentile(latencies, 95), 2),
+        p99_ms=round(percentile(latencies, 99), 2),
+        max_ms=round(latencies[-1], 2) if latencies else 0.0,
+        py_peak_kb=round(py_peak, 1),
+        rss_peak_kb=_rss_kb(),
+        upstream_calls=counter.snapshot(),
+    )
+
+
+def build_calls(fixtures) -> Dict[str, Callable[[int], Any]]:
+    """Coroutine factories driving each endpoint / path exactly as FastAPI would."""
+    from fastapi import Request, UploadFile
+    from . import Main
+    from . import ImageGeneration
+
+    prompts = fixtures["chat_prompts"]
+    texts = fixtures["tts_texts"]
+    images = fixtures["image_prompts"]
+
+    async def chat(i):
+        return await Main.chat_endpoint(prompt=prompts[i % len(prompts)], chat_id=None)
+
+    async def stt(i):
+        upload = UploadFile(file=io.BytesIO(b"RIFF" + b"\0" * 2048), filename=f"bench_{i}.wav")
+        result = await Main.speech_to_text_endpoint(file=upload)
+        if result.get("error"):
+            raise RuntimeError(result["error"])
+        return result
+
+    async def tts(i):
+        # /tts schedules synthesis and playback and returns; this measures the endpoint, not the audio.
+        return await Main.text_to_speech_endpoint(text=texts[i % len(texts)])
+
+    async def voice(i):
+        # A distinct client per turn: the stage gates apply, the per-client rate limit doesn't.
+        connection = Request({"type": "http", "headers": [], "client": (f"bench-{i}", 0)})
+        path = os.path.join("Data", f"bench_voice_{i}.wav")
+        with open(path, "wb") as f:
+            f.write(b"RIFF" + b"\0" * 2048)
+        async for event in Main.voice_turn(connection, path):
+            if event["stage"] == "error":
+                raise RuntimeError(event["error"])
+
+    async def image(i):
+        return await ImageGeneration.generate_images(images[i % len(images)])
+
+    return {"chat": chat, "stt": stt, "tts": tts, "voice": voice, "image": image}
+
+
+def compare(results: List[ScenarioResult], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Return human-readable regressions of `results` against a previous --json run."""
+    regressions = []
+    for r in results:
+        base = baseline.get(r.scenario)
+        if not base:
+            continue
+        if base["p95_ms"] and r.p95_ms > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{r.scenario}: p95 {r.p95_ms}ms > baseline {base['p95_ms']}ms")
+        if base["throughput_rps"] and r.throughput_rps < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{r.scenario}: throughput {r.throughput_rps}rps < baseline {base['throughput_rps']}rps")
+        if base.get("py_peak_kb") and r.py_peak_kb > base["py_peak_kb"] * (1 + tolerance):
+            regressions.append(f"{r.scenario}: python peak {r.py_peak_kb}KB > baseline {base['py_peak_kb']}KB")
+        if r.errors > base.get("errors", 0):
+            regressions.append(f"{r.scenario}: {r.errors} errors > baseline {base.get('errors', 0)}")
+    return regressions
+
+
+@dataclass
+class ImportResult:
+    module: str
+    runs: int
+    median_s: float
+    min_s: float
+    max_s: float
+    heavy_loaded: List[str]
+
+
+_IMPORT_PROBE = (
+    "import json, sys, time\n"
+    "t = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - t\n"
+    "heavy = [m for m in {heavy!r} if m in sys.modules]\n"
+    "print(json.dumps({{'s': elapsed, 'heavy': heavy}}))\n"
+)
+
+
+def measure_import(module: str = "Backend.Main", runs: int = 5) -> ImportResult:
+    """Cold-import `module` in fresh interpreters and report timing and heavy packages pulled in."""
+    code = _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)
+    timings, heavy = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f"import of {module} failed:\n{out.stderr}")
+        probe = json.loads(out.stdout.strip().splitlines()[-1])
+        timings.append(probe["s"])
+        heavy.update(probe["heavy"])
+    return ImportResult(
+        module=module,
+        runs=runs,
+        median_s=round(statistics.median(timings), 4),
+        min_s=round(min(timings), 4),
+        max_s=round(max(timings), 4),
+        heavy_loaded=sorted(heavy),
+    )
+
+
+@dataclass
+class RouterResult:
+    queries: int
+    legacy_us: float           # mean microseconds per query, substring checks
+    router_us: float           # mean microseconds per query, KeywordRouter
+    needed_searches: int       # recorded queries that really need the realtime path
+    legacy_searches: int       # queries each approach forces onto the realtime search path
+    router_searches: int
+    searches_avoided: int      # forced by the substring checks but not needed, and no longer forced
+    missed: int                # needed but not forced by the router (left to the decision model)
+    weather_preempted: int     # multi-intent weather queries the substring check answered with weather only
+
+
+def measure_router(fixtures, runs: int = 1000) -> RouterResult:
+    """Time both routers over the recorded query set and count realtime searches each forces."""
+    from .KeywordRouter import get_router, legacy_hints
+
+    cases = fixtures["router_queries"]
+    router = get_router()
+    router.route("warm up")
+
+    def timed(route) -> float:
+        start = time.perf_counter()
+        for _ in range(runs):
+            for case in cases:
+                route(case["query"])
+        return (time.perf_counter() - start) * 1e6 / (runs * len(cases))
+
+    legacy = [legacy_hints(c["query"]) for c in cases]
+    routed = [router.route(c["query"]) for c in cases]
+    return RouterResult(
+        queries=len(cases),
+        legacy_us=round(timed(legacy_hints), 2),
+        router_us=round(timed(router.route), 2),
+        needed_searches=sum(c["realtime"] for c in cases),
+        legacy_searches=sum(h.realtime for h in legacy),
+        router_searches=sum(h.realtime for h in routed),
+        searches_avoided=sum(l.realtime and not h.realtime and not c["realtime"]
+                             for c, l, h in zip(cases, legacy, routed)),
+        missed=sum(c["realtime"] and not h.realtime for c, h in zip(cases, routed)),
+        weather_preempted=sum(l.weather and h.multi for l, h in zip(legacy, routed)),
+    )
+
+
+def print_table(results: List[ScenarioResult]):
+    header = f"{'scenario':<8} {'reqs':>5} {'conc':>4} {'err':>4} {'rps':>9} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8} {'pyKB':>9} {'rssKB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r.scenario:<8} {r.requests:>5} {r.concurrency:>4} {r.errors:>4} {r.throughput_rps:>9} "
+              f"{r.p50_ms:>8} {r.p90_ms:>8} {r.p95_ms:>8} {r.p99_ms:>8} {r.max_ms:>8} {r.py_peak_kb:>9} {r.rss_peak_kb:>9}")
+        print(f"{'':<8} upstream: {r.upstream_calls}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline backend benchmark with recorded upstream fixtures.")
+    parser.add_argument("--scenario", default="all",
+                        help="chat, stt, tts, voice, image, import, router or all (comma separated)")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated upstream time to first byte")
+    parser.add_argument("--tokens-per-sec", type=float, default=2000.0, help="simulated streaming rate (0 = instant)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--fixtures", default=FIXTURES_PATH)
+    parser.add_argument("--answer-cache", action="store_true",
+                        help="keep the semantic answer cache on (off by default: repeated prompts would all hit it)")
+    parser.add_argument("--search-cache", action="store_true",
+                        help="keep the realtime search result cache on (off by default, like --answer-cache)")
+    parser.add_argument("--decision-batching", action="store_true",
+                        help="micro-batch concurrent decision calls (DecisionBatching)")
+    parser.add_argument("--trace-memory", action="store_true", help="track Python heap peak (slows the run)")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--baseline", help="previous --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    scenarios = SCENARIOS + ["import", "router"] if args.scenario == "all" else [s.strip() for s in args.scenario.split(",")]
+    unknown = [s for s in scenarios if s not in SCENARIOS + ["import", "router"]]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    # Import timing runs in fresh interpreters with the real packages, before any fakes exist.
+    import_result = None
+    if "import" in scenarios:
+        scenarios.remove("import")
+        import_result = measure_import(runs=max(1, min(args.requests, 20)))
+        print(f"import {import_result.module}: median {import_result.median_s}s "
+              f"(min {import_result.min_s}s, max {import_result.max_s}s, {import_result.runs} runs)")
+        print(f"heavy packages loaded at import: {import_result.heavy_loaded or 'none'}")
+
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    fixtures = load_fixtures(args.fixtures)
+    profile = UpstreamProfile(args.latency_ms, args.tokens_per_sec, args.jitter_ms, args.error_rate)
+    counter = CallCounter()
+    install_fakes(fixtures, profile, counter)
+    if not args.answer_cache:
+        os.environ["AnswerCache"] = "false"
+    if not args.search_cache:
+        os.environ["SearchCacheTTL"] = "0"
+    if args.decision_batching:
+        os.environ["DecisionBatching"] = "true"
+
+    # The backend reads and writes relative paths (Data\ChatLog.json, Frontend\Files ...);
+    # run inside a scratch directory so the real chat log is never touched.
+    workdir = tempfile.mkdtemp(prefix="bai-bench-")
+    os.chdir(workdir)
+    os.makedirs("Data", exist_ok=True)
+
+    router_result = None
+    if "router" in scenarios:
+        scenarios.remove("router")
+        router_result = measure_router(fixtures, runs=max(1, args.requests))
+        print(f"router: {router_result.router_us}us/query (substring checks {router_result.legacy_us}us) "
+              f"over {router_result.queries} recorded queries")
+        print(f"realtime searches forced: {router_result.router_searches} (substring checks "
+              f"{router_result.legacy_searches}, needed {router_result.needed_searches}); "
+              f"avoided {router_result.searches_avoided}, missed {router_result.missed}, "
+              f"multi-intent weather queries no longer pre-empted {router_result.weather_preempted}")
+
+    calls = build_calls(fixtures)
+    results = []
+    for name in scenarios:
+        asyncio.run(calls[name](0))  # warm-up: imports, first client construction
+        results.append(run_scenario(name, calls[name], args.requests, args.concurrency, counter, args.trace_memory))
+
+    if results:
+        print_table(results)
+        from . import LLMGateway
+        for purpose, usage in LLMGateway.stats().items():
+            print(f"llm {purpose}: {usage['calls']} calls, {usage['errors']} errors, "
+                  f"{usage['prompt_tokens']} prompt / {usage['completion_tokens']} completion tokens, "
+                  f"ttft {usage['ttft_ms']}, models {usage['models']}")
+
+    if json_path:
+        report: Dict[str, Any] = {r.scenario: asdict(r) for r in results}
+        if import_result:
+            report["import"] = asdict(import_result)
+        if router_result:
+            report["router"] = asdict(router_result)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        base_import = baseline.get("import")
+        if import_result and base_import:
+            if import_result.median_s > base_import["median_s"] * (1 + args.tolerance):
+                regressions.append(f"import: median {import_result.median_s}s > baseline {base_import['median_s']}s")
+            new_heavy = set(import_result.heavy_loaded) - set(base_import["heavy_loaded"])
+            if new_heavy:
+                regressions.append(f"import: now loads {sorted(new_heavy)}")
+        base_router = baseline.get("router")
+        if router_result and base_router:
+            if router_result.router_us > base_router["router_us"] * (1 + args.tolerance):
+                regressions.append(f"router: {router_result.router_us}us/query > baseline {base_router['router_us']}us")
+            if router_result.missed > base_router["missed"]:
+                regressions.append(f"router: misses {router_result.missed} realtime queries > baseline {base_router['missed']}")
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+# Entry point for the script.
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+# ChatStore.py
+"""
+Persistent multi-chat history for the PWA's sync API.
+
+Chats and their messages live in one WAL-mode SQLite file (ChatStorePath) shared
+by all workers on the host. Every change takes the next value of a single
+revision counter: messages are immutable and keep theirs as `seq`, chats get a
+new `rev` whenever they are renamed, touched by a new message or deleted (kept
+as a tombstone). That gives clients two cheap cursors:
+
+- `seq` pages backwards through one chat (index on chat_id, seq);
+- `rev` asks for everything that changed since the last sync (indexes on rev).
+
+This is separate from the LLM context in State.py, which only keeps the last
+HistoryLimit messages of a conversation.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from .Lazy import Lazy
+from .Settings import get_settings
+
+TITLE_LENGTH = 50
+
+
+def chat_title(first_message: str) -> str:
+    """Same rule as the PWA: the first message, truncated."""
+    text = first_message.strip()
+    return text[:TITLE_LENGTH] + "..." if len(text) > TITLE_LENGTH else text
+
+
+class ChatStore:
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER);
+            INSERT OR IGNORE INTO meta (key, value) VALUES ('rev', 0);
+            CREATE TABLE IF NOT EXISTS chats (
+                id TEXT PRIMARY KEY, title TEXT, created REAL, updated REAL,
+                last_message TEXT, deleted INTEGER DEFAULT 0, rev INTEGER);
+            CREATE INDEX IF NOT EXISTS chats_updated ON chats (deleted, updated, id);
+            CREATE INDEX IF NOT EXISTS chats_rev ON chats (rev);
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY, id TEXT UNIQUE, chat_id TEXT, role TEXT,
+                content TEXT, created REAL);
+            CREATE INDEX IF NOT EXISTS messages_chat ON messages (chat_id, seq);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _next_rev(conn: sqlite3.Connection) -> int:
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'rev'")
+        return conn.execute("SELECT value FROM meta WHERE key = 'rev'").fetchone()[0]
+
+    def current_rev(self) -> int:
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'rev'").fetchone()[0]
+
+    # --- chats ---
+    def list_chats(self, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Live chats, most recently updated first. `cursor` is the `next_cursor` of the previous page."""
+        conn = self._conn()
+        if cursor:
+            updated, _, chat_id = cursor.partition("|")
+            try:
+                updated = float(updated)
+            except ValueError:
+                raise ValueError(f"Invalid cursor {cursor!r}") from None
+        conn.execute("BEGIN")  # sync_cursor must describe the same snapshot as the page
+        try:
+            if cursor:
+                rows = conn.execute(
+                    "SELECT * FROM chats WHERE deleted = 0 AND (updated < ? OR (updated = ? AND id < ?))"
+                    " ORDER BY updated DESC, id DESC LIMIT ?",
+                    (updated, updated, chat_id, limit + 1)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM chats WHERE deleted = 0 ORDER BY updated DESC, id DESC LIMIT ?",
+                                    (limit + 1,)).fetchall()
+            sync_cursor = self.current_rev()
+        finally:
+            conn.execute("COMMIT")
+        chats = [dict(row) for row in rows[:limit]]
+        next_cursor = f"{chats[-1]['updated']!r}|{chats[-1]['id']}" if len(rows) > limit else None
+        return {"chats": chats, "next_cursor": next_cursor, "sync_cursor": sync_cursor}
+
+    def create_chat(self, title: str = "New chat", chat_id: Optional[str] = None) -> Dict[str, Any]:
+        conn = self._conn()
+        now = time.time()
+        chat_id = chat_id or uuid.uuid4().hex
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO chats (id, title, created, updated, last_message, deleted, rev) VALUES (?, ?, ?, ?, '', 0, ?)"
+                " ON CONFLICT(id) DO UPDATE SET title = excluded.title, created = excluded.created,"
+                " updated = excluded.updated, deleted = 0, rev = excluded.rev WHERE chats.deleted = 1",
+                (chat_id, title, now, now, self._next_rev(conn)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return dict(conn.execute("SELECT * FROM chats WHERE id = ?", (chat_id,)).fetchone())
+
+    def delete_chat(self, chat_id: str) -> bool:
+        """Drop the messages and leave a tombstone so syncing clients remove the chat too."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            found = conn.execute("UPDATE chats SET deleted = 1, last_message = '', updated = ?, rev = ?"
+                                 " WHERE id = ? AND deleted = 0",
+                                 (time.time(), self._next_rev(conn), chat_id)).rowcount
+            conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return bool(found)
+
+    # --- messages ---
+    def add_messages(self, chat_id: str, messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Append {"role", "content"} messages, creating the chat (titled after the first one) if needed."""
+        conn = self._conn()
+        now = time.time()
+        stored = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            chat = conn.execute("SELECT title, deleted FROM chats WHERE id = ?", (chat_id,)).fetchone()
+            title = chat["title"] if chat and not chat["deleted"] else None
+            if title is None or title == "New chat":
+                title = chat_title(messages[0]["content"]) if messages else "New chat"
+            for message in messages:
+                row = {"seq": self._next_rev(conn), "id": message.get("id") or uuid.uuid4().hex,
+                       "chat_id": chat_id, "role": message["role"], "content": message["content"], "created": now}
+                conn.execute("INSERT INTO messages (seq, id, chat_id, role, content, created)"
+                             " VALUES (:seq, :id, :chat_id, :role, :content, :created)", row)
+                stored.append(row)
+            conn.execute(
+                "INSERT INTO chats (id, title, created, updated, last_message, deleted, rev) VALUES (?, ?, ?, ?, ?, 0, ?)"
+                " ON CONFLICT(id) DO UPDATE SET title = excluded.title, updated = excluded.updated,"
+                " last_message = excluded.last_message, deleted = 0, rev = excluded.rev",
+                (chat_id, title, now, now, stored[-1]["content"][:100] if stored else "", self._next_rev(conn)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return stored
+
+    def messages(self, chat_id: str, limit: int, before: Optional[int] = None) -> Dict[str, Any]:
+        """The `limit` messages preceding `before` (latest page when omitted), oldest first."""
+        conn = self._conn()
+        if before is not None:
+            rows = conn.execute("SELECT * FROM messages WHERE chat_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                                (chat_id, before, limit + 1)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM messages WHERE chat_id = ? ORDER BY seq DESC LIMIT ?",
+                                (chat_id, limit + 1)).fetchall()
+        page = [dict(row) for row in reversed(rows[:limit])]
+        return {"messages": page, "next_before": page[0]["seq"] if len(rows) > limit else None}
+
+    def changes(self, since: int, limit: int) -> Dict[str, Any]:
+        """Chats (including tombstones) and messages changed after revision `since`."""
+        conn = self._conn()
+        # One read transaction: the messages, the cursor and the chats all come from
+        # the same snapshot, so a commit by another worker in between can't move
+        # the cursor past messages this response doesn't contain.
+        conn.execute("BEGIN")
+        try:
+            rows = conn.execute("SELECT * FROM messages WHERE seq > ? ORDER BY seq LIMIT ?",
+                                (since, limit + 1)).fetchall()
+            more = len(rows) > limit
+            messages = [dict(row) for row in rows[:limit]]
+            cursor = messages[-1]["seq"] if more else self.current_rev()
+            chats = [dict(row) for row in conn.execute(
+                "SELECT * FROM chats WHERE rev > ? AND rev <= ? ORDER BY rev", (since, cursor)).fetchall()]
+        finally:
+            conn.execute("COMMIT")
+        return {"chats": chats, "messages": messages, "cursor": cursor, "more": more}
+
+
+_store = Lazy(lambda: ChatStore(get_settings().state.chat_store_path))
+
+
+def get_chat_store() -> ChatStore:
+    return _store.get()
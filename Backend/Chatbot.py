@@ -1,38 +1,20 @@
 # Chatbot.py
 
-from groq import Groq
-from json import load, dump
 import datetime
-from dotenv import dotenv_values
-
-# --- Load environment variables ---
-env_vars = dotenv_values(".env")
-Username = env_vars.get("Username")
-Assistantname = env_vars.get("Assistantname")
-GroqAPIKey = env_vars.get("GroqAPIKey")
-
-# --- Groq client ---
-client = Groq(api_key=GroqAPIKey)
-
-# --- Globals ---
-messages = []
+from .Settings import get_settings
+from .State import load_history, append_history, clear_history, is_isolated
+from . import LLMGateway
+from .ModelRouter import choose
 
 # --- System prompt ---
-System = f"""Hello, I am {Username}, You are a very accurate and advanced AI chatbot named {Assistantname} which also has real-time up-to-date information from the internet.
+def SystemChatBot():
+    identity = get_settings().identity
+    System = f"""Hello, I am {identity.username}, You are a very accurate and advanced AI chatbot named {identity.assistant_name} which also has real-time up-to-date information from the internet.
 *** Do not tell time until I ask, do not talk too much, just answer the question.***
 *** Reply in only English, even if the question is in Hindi, reply in English.***
 *** Do not provide notes in the output, just answer the question and never mention your training data. ***
 """
-
-SystemChatBot = [{"role": "system", "content": System}]
-
-# --- Ensure chat log file exists ---
-try:
-    with open(r"Data\ChatLog.json", "r") as f:
-        messages = load(f)
-except FileNotFoundError:
-    with open(r"Data\ChatLog.json", "w") as f:
-        dump([], f)
+    return [{"role": "system", "content": System}]
 
 # --- Helpers ---
 def RealtimeInformation():
@@ -56,61 +38,88 @@ def AnswerModifier(answer):
     non_empty_lines = [line for line in lines if line.strip()]
     return '\n'.join(non_empty_lines)
 
-def normalize_messages(msgs):
-    """Ensure messages list is in correct Groq API format."""
-    fixed = []
-    for m in msgs:
-        role = m.get("role", "").lower()
-        if role not in ["system", "user", "assistant"]:
-            role = "user"
-        fixed.append({"role": role, "content": m.get("content", "")})
-    return fixed
-
 # --- Main chatbot function ---
-def ChatBot(query):
+def CachedAnswer(query):
+    """Answer from the semantic answer cache, or None; see AnswerCache.py."""
+    if not get_settings().answer_cache.enabled:
+        return None
     try:
-        # Load chat history
-        with open(r"Data\ChatLog.json", "r") as f:
-            messages = load(f)
-
-        # Append user's message
-        messages.append({"role": "user", "content": f"{query}"})
+        from .AnswerCache import cacheable, get_answer_cache  # NumPy (and fastembed) only when the cache is used
+        cache = get_answer_cache()
+        if not cacheable(query):
+            cache.skip()
+            return None
+        return cache.lookup(query)
+    except Exception as e:
+        print(f"[AnswerCache] Lookup failed: {e}")
+        return None
 
-        # Prepare messages for Groq
-        formatted_msgs = normalize_messages(
-            SystemChatBot + [{"role": "system", "content": RealtimeInformation()}] + messages
-        )
+def CacheAnswer(query, answer):
+    if not get_settings().answer_cache.enabled or not answer or is_isolated():  # batch answers aren't cached
+        return
+    try:
+        from .AnswerCache import cacheable, get_answer_cache
+        if cacheable(query):
+            get_answer_cache().store(query, answer)
+    except Exception as e:
+        print(f"[AnswerCache] Store failed: {e}")
 
-        # Call Groq API
-        completion = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",  # change to llama3-70b-8192 if needed
-            messages=formatted_msgs,
-            max_tokens=1024,
-            temperature=0.7,
-            top_p=1,
-            stream=True
-        )
+def ChatBot(query, on_token=None, retry=True):
+    """`on_token(text)` is called with each streamed chunk as it arrives."""
+    streamed = []
 
-        answer = ""
-        for chunk in completion:
-            if chunk.choices[0].delta.content:
-                answer += chunk.choices[0].delta.content
+    def forward(text):
+        streamed.append(text)
+        if on_token:
+            on_token(text)
 
-        answer = answer.replace("</s>", "")
-        messages.append({"role": "assistant", "content": answer})
+    try:
+        # Append user's message
+        user_message = {"role": "user", "content": f"{query}"}
+
+        # Context-free questions asked before are answered without a completion
+        cached = CachedAnswer(query)
+        if cached is not None:
+            if on_token:
+                on_token(cached)
+            append_history([user_message, {"role": "assistant", "content": cached}])
+            return cached
+
+        # Load chat history (shared by all workers through the state backend)
+        messages = load_history()
+        messages.append(user_message)
+
+        # Call Groq through the shared gateway (streams chunks to on_token);
+        # short conversational turns get the fast model tier (see ModelRouter.py)
+        settings = get_settings().chat
+        route = choose("chat", query)
+        completion = LLMGateway.stream_chat(
+            "chat",
+            SystemChatBot() + [{"role": "system", "content": RealtimeInformation()}] + messages,
+            model=route.model,
+            max_tokens=route.max_tokens,
+            temperature=settings.temperature,
+            top_p=settings.top_p,
+            on_token=forward,
+            fallback_model=route.fallback,
+        )
+        answer = completion.text
 
         # Save updated chat log
-        with open(r"Data\ChatLog.json", "w") as f:
-            dump(messages, f, indent=4)
+        append_history([user_message, {"role": "assistant", "content": answer}])
 
-        return AnswerModifier(answer)
+        answer = AnswerModifier(answer)
+        if not completion.cancelled:  # a partial answer isn't worth keeping
+            CacheAnswer(query, answer)
+        return answer
 
     except Exception as e:
         print(f"Error: {e}")
-        # Reset chat log if something goes wrong
-        with open(r"Data\ChatLog.json", "w") as f:
-            dump([], f, indent=4)
-        return ChatBot(query)
+        if not retry or streamed:
+            raise  # a retry would stream the start of the answer to the client a second time
+        # Reset chat log if something goes wrong (history the API rejects), then try once more
+        clear_history()
+        return ChatBot(query, on_token, retry=False)
 
 # --- Test mode ---
 if __name__ == "__main__":
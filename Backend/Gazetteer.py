@@ -0,0 +1,394 @@
+# Gazetteer.py
+"""
+Offline place lookup for weather queries: city, state and country to
+latitude and longitude, without a round trip to the OpenWeatherMap geocoder.
+
+The source is a tab-separated file: GazetteerPath, or the bundled
+`data/Gazetteer.tsv`, which holds the world's large cities, US state capitals
+and the largest US cities. More rows can be appended by hand or imported from
+GeoNames:
+
+    python -m Backend.Gazetteer import-geonames cities15000.txt \
+        --admin1 admin1CodesASCII.txt --countries countryInfo.txt --out data/Gazetteer.tsv
+
+The first lookup in a process compiles the source into a binary index
+(GazetteerIndexPath), unless the index is already newer than the source, and
+memory-maps it. Workers share the mapped pages, nothing is parsed at startup,
+and a large gazetteer costs no Python heap. The index holds:
+
+- one fixed-size record per place: latitude, longitude, population and a label
+  ("Tempe, Arizona, US");
+- a sorted table of lookup keys. Every name and alternate name appears alone
+  and combined with the state code or name and the country code or name
+  ("tempe", "tempe az", "tempe arizona us", ...). Keys are lowercase ASCII
+  words, and equal keys are ordered most populous first, so "paris" is Paris,
+  France and "paris tx" is Paris, Texas.
+
+- a sorted table of qualifiers: every state code and name and country code,
+  name and alias in the source ("az", "arizona", "us", "united states").
+
+An exact lookup is a binary search over the key table, a few microseconds.
+`resolve()` tries the whole text, then its longest run of words that is a key
+("new york city today" -> "new york city"), then a fuzzy match. A run followed
+by a qualifier is passed over: "rome georgia" is not Rome, Italy just because
+the gazetteer lacks Rome, Georgia, so it resolves to nothing and the caller
+falls back to the remote geocoder. The fuzzy match compares the text against
+the keys sharing its first two letters and accepts the best one scoring at
+least GazetteerFuzzyThreshold ("pheonix" -> Phoenix).
+"""
+
+import argparse
+import bisect
+import difflib
+import mmap
+import os
+import re
+import struct
+import sys
+import unicodedata
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .Lazy import Lazy
+from .Settings import get_settings, on_reload
+
+BUNDLED_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "Gazetteer.tsv")
+MAGIC = b"GAZ2"
+HEADER = struct.Struct("<4sIIII")  # magic, places, keys, qualifiers, offset of the string blob
+PLACE = struct.Struct("<ffIIH")    # latitude, longitude, population, label offset, label length
+KEY = struct.Struct("<IHI")        # key offset, key length, place index
+QUALIFIER = struct.Struct("<IH")   # qualifier offset, qualifier length
+MAX_WORDS = 5                     # longest run of words tried as a place name
+FUZZY_SCAN = 20000                # keys compared at most per fuzzy lookup
+
+# Other ways of writing a country in a query, besides its code and name.
+COUNTRY_ALIASES = {"US": ["usa", "america", "united states of america"],
+                   "GB": ["uk", "britain", "great britain", "england"],
+                   "AE": ["uae"]}
+# State and country codes that are also words a query goes on with ("paris in the morning").
+CODE_WORDS = {"in", "is", "it", "or", "to", "at", "by", "so", "me", "do", "be", "my", "no", "as", "an", "am",
+              "go", "hi", "ok", "id"}
+COLUMNS = ["name", "admin1_code", "admin1_name", "country_code", "country_name",
+           "latitude", "longitude", "population", "alternate_names"]
+
+
+@dataclass(frozen=True)
+class Place:
+    label: str  # "Tempe, Arizona, US", the form the OpenWeatherMap geocoder reports
+    lat: float
+    lon: float
+    population: int
+
+
+def normalize(text: str) -> str:
+    """Lowercase ASCII words: "São Paulo, BR" -> "sao paulo br"."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text.replace("'", "")))
+
+
+# =========================
+# SOURCE
+# =========================
+def read_source(path: str) -> List[Dict[str, str]]:
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            values = line.rstrip("\n").split("\t")
+            rows.append(dict(zip(COLUMNS, values + [""] * (len(COLUMNS) - len(values)))))
+    return rows
+
+
+def place_qualifiers(row: Dict[str, str]) -> Tuple[List[str], List[str]]:
+    """The ways of writing a row's state, and its country."""
+    states = [s for s in (row["admin1_code"], row["admin1_name"]) if s]
+    countries = [c for c in (row["country_code"], row["country_name"]) if c] + \
+        COUNTRY_ALIASES.get(row["country_code"], [])
+    return states, countries
+
+
+def place_keys(row: Dict[str, str]) -> List[str]:
+    names = [row["name"]] + [a for a in row["alternate_names"].split(",") if a.strip()]
+    states, countries = place_qualifiers(row)
+    keys = set()
+    for name in names:
+        for qualifiers in [[]] + [[s] for s in states] + [[c] for c in countries] + \
+                [[s, c] for s in states for c in countries]:
+            key = normalize(" ".join([name] + qualifiers))
+            if key:
+                keys.add(key)
+    return sorted(keys)
+
+
+def build_index(source: str, target: str) -> int:
+    """Compile the source TSV into the binary index at `target`; returns the number of places."""
+    rows = read_source(source)
+    blob = bytearray()
+
+    def add_string(text: str) -> Tuple[int, int]:
+        data = text.encode("utf-8")[:65535]
+        blob.extend(data)
+        return len(blob) - len(data), len(data)
+
+    places = bytearray()
+    keys: List[Tuple[bytes, int, int]] = []  # key, -population, place index
+    qualifiers = set()
+    for index, row in enumerate(rows):
+        label = ", ".join(p for p in (row["name"], row["admin1_name"], row["country_code"]) if p)
+        population = int(row["population"] or 0)
+        places += PLACE.pack(float(row["latitude"]), float(row["longitude"]), population, *add_string(label))
+        keys.extend((key.encode("ascii"), -population, index) for key in place_keys(row))
+        states, countries = place_qualifiers(row)
+        qualifiers.update(normalize(q) for q in states + countries)
+    keys.sort()
+    table = bytearray()
+    for key, _, index in keys:
+        offset, length = add_string(key.decode("ascii"))
+        table += KEY.pack(offset, length, index)
+    qualifiers.discard("")
+    for qualifier in sorted(q.encode("ascii") for q in qualifiers):
+        table += QUALIFIER.pack(*add_string(qualifier.decode("ascii")))
+
+    directory = os.path.dirname(target)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp = f"{target}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(rows), len(keys), len(qualifiers), HEADER.size + len(places) + len(table)))
+        f.write(places)
+        f.write(table)
+        f.write(blob)
+    os.replace(temp, target)  # other workers see the old index or the new one, never half of it
+    return len(rows)
+
+
+# =========================
+# INDEX
+# =========================
+class _Table:
+    """A sorted string table as a sequence of bytes, for bisect."""
+
+    def __init__(self, count: int, get: Callable[[int], bytes]):
+        self._count, self._get = count, get
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._get(i)
+
+
+class Gazetteer:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.place_count, self.key_count, self.qualifier_count, self._strings = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a gazetteer index")
+        self._keys_at = HEADER.size + self.place_count * PLACE.size
+        self._qualifiers_at = self._keys_at + self.key_count * KEY.size
+        self._view = _Table(self.key_count, lambda i: self.key(i)[0])
+        self._qualifiers = _Table(self.qualifier_count, self.qualifier)
+
+    def key(self, i: int) -> Tuple[bytes, int]:
+        offset, length, place = KEY.unpack_from(self._mm, self._keys_at + i * KEY.size)
+        start = self._strings + offset
+        return self._mm[start:start + length], place
+
+    def qualifier(self, i: int) -> bytes:
+        offset, length = QUALIFIER.unpack_from(self._mm, self._qualifiers_at + i * QUALIFIER.size)
+        start = self._strings + offset
+        return self._mm[start:start + length]
+
+    def qualified(self, words: List[str]) -> bool:
+        """Whether `words` start with a state or country ("georgia", "wa", "united states")."""
+        for size in range(1, min(len(words), MAX_WORDS) + 1):
+            target = " ".join(words[:size]).encode("ascii", "ignore")
+            i = bisect.bisect_left(self._qualifiers, target)
+            if i < self.qualifier_count and self.qualifier(i) == target and \
+                    not (size == 1 and words[0] in CODE_WORDS):
+                return True
+        return False
+
+    def place(self, i: int) -> Place:
+        lat, lon, population, offset, length = PLACE.unpack_from(self._mm, HEADER.size + i * PLACE.size)
+        start = self._strings + offset
+        label = self._mm[start:start + length].decode("utf-8")
+        return Place(label, round(lat, 4), round(lon, 4), population)
+
+    def exact(self, key: str) -> Optional[Place]:
+        """The most populous place with this normalized key."""
+        target = key.encode("ascii", "ignore")
+        i = bisect.bisect_left(self._view, target)
+        if i < self.key_count:
+            found, place = self.key(i)
+            if found == target:
+                return self.place(place)
+        return None
+
+    def find(self, key: str) -> Tuple[Optional[Place], bool]:
+        """
+        The longest run of words in a normalized text that names a place, and
+        whether a run was passed over because a state or country followed it.
+        """
+        words = key.split()
+        passed_over = False
+        for size in range(min(len(words), MAX_WORDS), 0, -1):
+            best: Optional[Place] = None
+            for start in range(len(words) - size + 1):
+                place = self.exact(" ".join(words[start:start + size]))
+                if place and self.qualified(words[start + size:]):
+                    passed_over = True  # "rome georgia": some other Rome than the one in the index
+                elif place and (best is None or place.population > best.population):
+                    best = place
+            if best:
+                return best, passed_over
+        return None, passed_over
+
+    def fuzzy(self, key: str, threshold: float) -> Optional[Place]:
+        """Best match among the keys sharing the first two letters of `key`, if it scores `threshold`."""
+        if len(key) < 4:
+            return None
+        prefix = key[:2].encode("ascii", "ignore")
+        lo = bisect.bisect_left(self._view, prefix)
+        hi = min(bisect.bisect_left(self._view, prefix + b"\xff"), lo + FUZZY_SCAN)
+        matcher = difflib.SequenceMatcher(autojunk=False)
+        matcher.set_seq2(key)
+        best: Tuple[float, int, int] = (threshold, -1, -1)  # score, population, place
+        for i in range(lo, hi):
+            candidate, place = self.key(i)
+            if abs(len(candidate) - len(key)) > 3:
+                continue
+            matcher.set_seq1(candidate.decode("ascii"))
+            if matcher.real_quick_ratio() < best[0] or matcher.quick_ratio() < best[0]:
+                continue
+            score = matcher.ratio()
+            if score >= best[0]:
+                population = self.place(place).population
+                if (score, population) > best[:2]:
+                    best = (score, population, place)
+        return self.place(best[2]) if best[2] >= 0 else None
+
+    def resolve(self, text: str) -> Optional[Place]:
+        key = normalize(text)
+        if not key:
+            return None
+        place = self.exact(key)
+        if place is not None:
+            return place
+        place, passed_over = self.find(key)
+        if place is not None or passed_over:  # a fuzzy match would turn "athens ga" into "athens gr"
+            return place
+        return self.fuzzy(key, get_settings().weather.gazetteer_fuzzy_threshold)
+
+
+def source_path() -> str:
+    return get_settings().weather.gazetteer_path or BUNDLED_PATH
+
+
+def _index_magic(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC))
+
+
+def _make_gazetteer() -> Optional[Gazetteer]:
+    source, target = source_path(), get_settings().weather.gazetteer_index_path
+    try:
+        if not os.path.exists(target) or _index_magic(target) != MAGIC or \
+                (os.path.exists(source) and os.path.getmtime(source) > os.path.getmtime(target)):
+            build_index(source, target)  # missing, built by an older version, or older than its source
+        return Gazetteer(target)
+    except (OSError, ValueError) as e:
+        print(f"[Gazetteer] Unavailable, using the remote geocoder only: {e}")
+        return None
+
+
+_gazetteer = Lazy(_make_gazetteer)
+
+
+def _on_reload(old, new):
+    if (old.weather.gazetteer_path, old.weather.gazetteer_index_path) != \
+            (new.weather.gazetteer_path, new.weather.gazetteer_index_path):
+        _gazetteer.reset()
+
+
+on_reload(_on_reload)
+
+
+def resolve_place(text: str) -> Optional[Place]:
+    """The place named in `text`, from the local gazetteer; None on a miss or when it is off."""
+    if not get_settings().weather.gazetteer:
+        return None
+    gazetteer = _gazetteer.get()
+    return gazetteer.resolve(text) if gazetteer is not None else None
+
+
+# =========================
+# GEONAMES IMPORT
+# =========================
+def import_geonames(cities: str, admin1: Optional[str], countries: Optional[str]) -> Iterable[str]:
+    """TSV rows in the gazetteer format for a GeoNames cities file (e.g. cities15000.txt)."""
+    admin1_names: Dict[str, str] = {}
+    if admin1:
+        with open(admin1, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) >= 2:
+                    admin1_names[parts[0]] = parts[1]
+    country_names: Dict[str, str] = {}
+    if countries:
+        with open(countries, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if not line.startswith("#") and len(parts) > 4:
+                    country_names[parts[0]] = parts[4]
+    with open(cities, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 15:
+                continue
+            name, ascii_name, lat, lon, country, admin1_code, population = \
+                parts[1], parts[2], parts[4], parts[5], parts[8], parts[10], parts[14]
+            state = admin1_names.get(f"{country}.{admin1_code}", "")
+            code = admin1_code if admin1_code.isalpha() else ""  # numeric codes mean nothing to users
+            alternates = ascii_name if ascii_name != name else ""
+            yield "\t".join([name, code, state, country, country_names.get(country, ""),
+                             lat, lon, population or "0", alternates])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build or query the offline gazetteer.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("build", help="compile the gazetteer source into GazetteerIndexPath")
+    lookup = commands.add_parser("lookup", help="resolve place names")
+    lookup.add_argument("names", nargs="+")
+    geonames = commands.add_parser("import-geonames", help="append GeoNames cities to a gazetteer TSV")
+    geonames.add_argument("cities", help="GeoNames cities file, e.g. cities15000.txt")
+    geonames.add_argument("--admin1", help="admin1CodesASCII.txt, for state and province names")
+    geonames.add_argument("--countries", help="countryInfo.txt, for country names")
+    geonames.add_argument("--out", help="TSV file to append to (default stdout)")
+    args = parser.parse_args(argv)
+
+    settings = get_settings().weather
+    if args.command == "build":
+        count = build_index(source_path(), settings.gazetteer_index_path)
+        print(f"[Gazetteer] {count} places -> {settings.gazetteer_index_path}")
+    elif args.command == "lookup":
+        for name in args.names:
+            print(f"{name}: {resolve_place(name)}")
+    else:
+        out = open(args.out, "a", encoding="utf-8") if args.out else sys.stdout
+        try:
+            for row in import_geonames(args.cities, args.admin1, args.countries):
+                out.write(row + "\n")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,18 +2,14 @@
 
 import asyncio
 from random import randint
-from PIL import Image
 import requests
-from dotenv import get_key
 import os
+import queue
 from time import sleep
+from .Settings import get_settings
 
 # --- Config ---
-API_URL = "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0"
-headers = {"Authorization": f"Bearer {get_key('.env', 'HuggingFaceAPIKey')}"}
-
 DATA_DIR = r"Data"
-TRIGGER_FILE = r"Frontend\Files\ImageGeneration.data"
 
 # --- Helpers ---
 def safe_filename(name: str) -> str:
@@ -22,8 +18,9 @@ def safe_filename(name: str) -> str:
 
 def open_images(prompt):
     """Open generated images for the given prompt."""
+    from PIL import Image  # only needed when displaying results
     base_name = safe_filename(prompt)
-    files = [f"{base_name}_{i}.jpg" for i in range(1, 5)]
+    files = [f"{base_name}_{i}.jpg" for i in range(1, get_settings().image.count + 1)]
 
     for jpg_file in files:
         image_path = os.path.join(DATA_DIR, jpg_file)
@@ -39,15 +36,19 @@ def open_images(prompt):
 
 async def query(payload):
     """Send generation request to Hugging Face."""
-    response = await asyncio.to_thread(requests.post, API_URL, headers=headers, json=payload)
+    settings = get_settings()
+    headers = {"Authorization": f"Bearer {settings.keys.huggingface}"}
+    response = await asyncio.to_thread(
+        requests.post, settings.image.api_url, headers=headers, json=payload, timeout=settings.image.timeout
+    )
     return response.content
 
 async def generate_images(prompt: str):
-    """Generate 4 images for the given prompt."""
+    """Generate ImageCount (default 4) images for the given prompt."""
     tasks = []
     safe_prompt = safe_filename(prompt)
 
-    for _ in range(4):
+    for _ in range(get_settings().image.count):
         payload = {
             "inputs": f"{prompt}, quality=4K, sharpness=maximum, Ultra High details, high resolution, seed={randint(0, 1000000)}"
         }
@@ -65,33 +66,52 @@ def GenerateImages(prompt: str):
     asyncio.run(generate_images(prompt))
     open_images(prompt)
 
-# --- Main loop ---
-if __name__ == "__main__":
+def _run_job(job):
+    print(f"Generating images for prompt: {job.prompt}")
+    try:
+        GenerateImages(job.prompt)
+    except Exception as e:
+        print(f"Image generation error: {e}")
+
+def RunWorker():
+    """Process ImageJob messages from the bus until idle for ImageWorkerIdle seconds."""
+    from .MessageBus import ImageJob, get_bus
+    from .State import get_state
+    bus = get_bus()
+    jobs = queue.Queue()
+    bus.subscribe(ImageJob, jobs.put)
     while True:
         try:
-            if not os.path.exists(TRIGGER_FILE):
-                sleep(1)
-                continue
-
-            with open(TRIGGER_FILE, "r") as f:
-                data = f.read().strip()
-
-            if not data or "," not in data:
-                sleep(1)
-                continue
-
-            prompt, status = data.split(",", 1)
-            if status == "True":
-                print(f"Generating images for prompt: {prompt}")
-                GenerateImages(prompt)
-
-                # Reset trigger
-                with open(TRIGGER_FILE, "w") as f:
-                    f.write("False,False")
-                break
-            else:
-                sleep(1)
+            job = jobs.get(timeout=get_settings().bus.image_worker_idle)
+        except queue.Empty:
+            break
+        _run_job(job)
+
+    # Idle: mark the record so the API starts a new worker for jobs from now on,
+    # then leave the topic. Jobs the broker routed here before the leave are in
+    # `jobs` once it's confirmed, so they run before exiting instead of being lost.
+    state = get_state()
+    record = state.hgetall("processes").get(str(os.getpid()))
+    if record is not None:
+        state.hset("processes", str(os.getpid()), {**record, "stopping": True})
+    bus.leave(ImageJob)
+    while True:
+        try:
+            job = jobs.get_nowait()
+        except queue.Empty:
+            return
+        _run_job(job)
 
-        except Exception as e:
-            print(f"Image generation error: {e}")
-            sleep(1)
+# --- Main ---
+if __name__ == "__main__":
+    import sys
+    try:
+        if len(sys.argv) > 1 and sys.argv[1] != "--worker":
+            # One-off run with the prompt as an argument.
+            GenerateImages(" ".join(sys.argv[1:]))
+        else:
+            # Worker started by the API (or by hand): jobs arrive on the image_jobs topic.
+            RunWorker()
+    finally:
+        from .State import get_state
+        get_state().hdel("processes", str(os.getpid()))
@@ -0,0 +1,120 @@
+# KeywordRouter.py
+"""
+Keyword routing hints for process_query, found in one pass over the query.
+
+The keyword tables (weather, realtime, multi-intent connectors) come from
+settings, as comma-separated phrases. They are compiled once into an
+Aho-Corasick automaton over words rather than characters, so a keyword only
+matches whole words: "time" doesn't fire on "sometimes" or "anytime", and "news"
+doesn't fire on "newspaper". Multi-word phrases ("what time", "right now") match
+as consecutive words. Scanning is linear in the number of words in the query,
+however many phrases the tables hold.
+
+The automaton is rebuilt when the keyword settings change.
+"""
+
+import re
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from .Lazy import Lazy
+from .Settings import get_settings, on_reload
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class KeywordMatcher:
+    """Word-level Aho-Corasick automaton over phrases grouped by category."""
+
+    def __init__(self, tables: Dict[str, Iterable[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, str]]] = [[]]  # (category, phrase) ending at each node
+        for category, phrases in tables.items():
+            for phrase in phrases:
+                words = tokenize(phrase)
+                if not words:
+                    continue
+                node = 0
+                for word in words:
+                    child = self._goto[node].get(word)
+                    if child is None:
+                        child = len(self._goto)
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._out.append([])
+                        self._goto[node][word] = child
+                    node = child
+                self._out[node].append((category, " ".join(words)))
+
+        # Failure links, breadth first: the longest proper suffix that is also a trie path.
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(word, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        """Phrases found in `text`, by category."""
+        found: Dict[str, List[str]] = defaultdict(list)
+        node = 0
+        for word in tokenize(text):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for category, phrase in self._out[node]:
+                found[category].append(phrase)
+        return dict(found)
+
+
+@dataclass(frozen=True)
+class RouteHints:
+    weather: bool = False   # answer with the weather API
+    realtime: bool = False  # needs fresh information: force the realtime search path
+    multi: bool = False     # joins several requests ("... and open youtube")
+    matches: Dict[str, List[str]] = field(default_factory=dict)
+
+
+def _phrases(value: str) -> List[str]:
+    return [phrase.strip() for phrase in value.split(",") if phrase.strip()]
+
+
+class KeywordRouter:
+    def __init__(self, tables: Dict[str, Iterable[str]]):
+        self._matcher = KeywordMatcher(tables)
+
+    def route(self, query: str) -> RouteHints:
+        matches = self._matcher.scan(query)
+        return RouteHints(weather="weather" in matches, realtime="realtime" in matches,
+                          multi="multi" in matches, matches=matches)
+
+
+def _make_router() -> KeywordRouter:
+    settings = get_settings().router
+    return KeywordRouter({"weather": _phrases(settings.weather_keywords),
+                          "realtime": _phrases(settings.realtime_keywords),
+                          "multi": _phrases(settings.multi_keywords)})
+
+
+_router = Lazy(_make_router)
+on_reload(lambda old, new: _router.reset() if old.router != new.router else None)
+
+
+def get_router() -> KeywordRouter:
+    return _router.get()
+
+
+def legacy_hints(query: str) -> RouteHints:
+    """The substring checks process_query used before this router, for benchmark comparisons."""
+    query = query.lower()
+    return RouteHints(weather=any(k in query for k in ["weather", "temperature", "forecast"]),
+                      realtime=any(k in query for k in ["time", "today", "news"]))
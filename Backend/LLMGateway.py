@@ -0,0 +1,323 @@
+# LLMGateway.py
+"""
+One gateway for every LLM call: the chatbot, realtime search and content
+writer (Groq), and the decision model (Cohere).
+
+- Clients: one Groq and one Cohere client per worker, each on a pooled
+  keep-alive HTTP connection pool (LLMMaxConnections, LLMKeepAlive), so calls
+  reuse warm TLS connections instead of every module holding its own client.
+  They are built on first use and rebuilt when a key or a pool setting changes;
+  the old pool is closed once calls already using it have had LLMTimeout to finish.
+- Streaming: `stream_chat()` normalizes the messages, streams the completion as
+  a Tasks "llm" task (so /stop reaches it), passes each chunk to `on_token` and
+  returns the whole text. Callers no longer repeat the concatenation loop.
+- Timeouts: every call has a timeout, LLMTimeout unless the caller passes one.
+  A stream that fails before its first token is retried once on the caller's
+  fallback model.
+- Accounting: prompt and completion tokens (as reported by the API, otherwise
+  estimated at four characters per token), time to first token and duration
+  are recorded per purpose ("chat", "realtime", "content", "decision",
+  "prefetch").
+  `stats()` backs GET /llm. `model_health()` summarizes each model's recent
+  latency and errors for ModelRouter.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from .Lazy import Lazy
+from .Settings import get_settings, on_reload
+from . import Tasks
+
+SAMPLES = 200  # recent calls kept per purpose for latency percentiles
+HEALTH_SAMPLES = 20  # recent calls per model behind model_health()
+COUNTERS = ("calls", "errors", "cancelled", "estimated", "prompt_tokens", "completion_tokens")
+
+
+@dataclass
+class Completion:
+    text: str
+    model: str = ""
+    cancelled: bool = False
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    estimated: bool = False   # token counts estimated, not reported by the API
+    ttft_ms: Optional[float] = None
+    total_ms: float = 0.0
+
+
+# =========================
+# CLIENTS
+# =========================
+_pools: Dict[str, Any] = {}  # "groq" / "cohere" -> the httpx pool of the current client
+
+
+def _http_client(name: str):
+    """A shared keep-alive connection pool for client `name`; None if httpx isn't available."""
+    settings = get_settings().llm
+    try:
+        import httpx
+    except ImportError:
+        return None
+    pool = _pools[name] = httpx.Client(
+        timeout=settings.timeout,
+        limits=httpx.Limits(max_connections=settings.max_connections,
+                            max_keepalive_connections=settings.keepalive,
+                            keepalive_expiry=settings.keepalive_expiry))
+    return pool
+
+
+def _make_groq():
+    from groq import Groq
+    settings = get_settings()
+    kwargs: Dict[str, Any] = {"max_retries": settings.llm.max_retries, "timeout": settings.llm.timeout}
+    http_client = _http_client("groq")
+    if http_client is not None:
+        kwargs["http_client"] = http_client
+    return Groq(api_key=settings.keys.groq, **kwargs)
+
+
+def _make_cohere():
+    import cohere
+    settings = get_settings()
+    kwargs: Dict[str, Any] = {"timeout": settings.llm.timeout}
+    http_client = _http_client("cohere")
+    if http_client is not None:
+        kwargs["httpx_client"] = http_client
+    return cohere.Client(api_key=settings.keys.cohere, **kwargs)
+
+
+groq = Lazy(_make_groq)
+cohere = Lazy(_make_cohere)
+
+
+def _retire(name: str, client: Lazy, grace: float):
+    """Drop `client`; its pool is closed after `grace` seconds, once calls still using it are done."""
+    pool = _pools.pop(name, None)
+    client.reset()
+    if pool is None:
+        return
+    if grace <= 0:
+        pool.close()
+        return
+    timer = threading.Timer(grace, pool.close)
+    timer.daemon = True
+    timer.start()
+
+
+def _on_reload(old, new):
+    if old.keys.groq != new.keys.groq or old.llm != new.llm:
+        _retire("groq", groq, old.llm.timeout)
+    if old.keys.cohere != new.keys.cohere or old.llm != new.llm:
+        _retire("cohere", cohere, old.llm.timeout)
+
+
+on_reload(_on_reload)
+
+
+def reset():
+    """Drop both clients and close their pools; the next call builds new ones (e.g. after swapping the SDK modules)."""
+    _retire("groq", groq, 0)
+    _retire("cohere", cohere, 0)
+
+
+# =========================
+# ACCOUNTING
+# =========================
+_lock = threading.Lock()
+_totals: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+_ttft: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=SAMPLES))
+_durations: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=SAMPLES))
+_models: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))  # purpose -> model -> calls
+# model -> recent (monotonic time, time to first token or duration in ms, failed); drives model_health()
+_health: Dict[str, Deque[Tuple[float, float, bool]]] = defaultdict(lambda: deque(maxlen=HEALTH_SAMPLES))
+
+
+def _estimate(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _record(purpose: str, model: str, result: Optional[Completion], error: bool = False):
+    with _lock:
+        totals = _totals[purpose]
+        totals["calls"] += 1
+        _models[purpose][model] += 1
+        if error or result is None:
+            totals["errors"] += 1
+            _health[model].append((time.monotonic(), 0.0, True))
+            return
+        if not result.cancelled:
+            _health[model].append((time.monotonic(), result.ttft_ms if result.ttft_ms is not None else result.total_ms,
+                                   False))
+        totals["cancelled"] += result.cancelled
+        totals["estimated"] += result.estimated
+        totals["prompt_tokens"] += result.prompt_tokens
+        totals["completion_tokens"] += result.completion_tokens
+        if result.ttft_ms is not None:
+            _ttft[purpose].append(result.ttft_ms)
+        _durations[purpose].append(result.total_ms)
+
+
+def _percentiles(samples: Iterable[float]) -> Dict[str, float]:
+    values = sorted(samples)
+    if not values:
+        return {}
+    pick = lambda pct: round(values[min(len(values) - 1, int(len(values) * pct / 100))], 1)
+    return {"p50": pick(50), "p95": pick(95), "max": round(values[-1], 1)}
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {purpose: {**{name: totals[name] for name in COUNTERS}, "models": dict(_models[purpose]),
+                          "ttft_ms": _percentiles(_ttft[purpose]),
+                          "duration_ms": _percentiles(_durations[purpose])}
+                for purpose, totals in _totals.items()}
+
+
+@dataclass(frozen=True)
+class ModelHealth:
+    samples: int
+    latency_ms: Optional[float]  # median time to first token of recent successful calls
+    error_rate: float
+
+
+def model_health(model: str, window: Optional[float] = None) -> ModelHealth:
+    """How `model` did over its last HEALTH_SAMPLES calls in this worker, those of the last `window` seconds."""
+    since = time.monotonic() - window if window is not None else float("-inf")
+    with _lock:
+        recent = [(ms, failed) for at, ms, failed in _health.get(model, ()) if at >= since]
+    if not recent:
+        return ModelHealth(0, None, 0.0)
+    latencies = sorted(ms for ms, failed in recent if not failed)
+    latency = latencies[len(latencies) // 2] if latencies else None
+    return ModelHealth(len(recent), latency, sum(failed for _, failed in recent) / len(recent))
+
+
+# =========================
+# CALLS
+# =========================
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Messages in the Groq API format: known roles only, content always present."""
+    fixed = []
+    for m in messages:
+        role = m.get("role", "").lower()
+        if role not in ["system", "user", "assistant"]:
+            role = "user"
+        fixed.append({"role": role, "content": m.get("content", "")})
+    return fixed
+
+
+def stream_chat(purpose: str, messages: List[Dict[str, Any]], model: str, max_tokens: Optional[int] = None,
+                temperature: Optional[float] = None, top_p: Optional[float] = None,
+                on_token: Optional[Callable[[str], None]] = None, stop: Optional[threading.Event] = None,
+                timeout: Optional[float] = None, fallback_model: Optional[str] = None) -> Completion:
+    """
+    Stream a Groq chat completion. `on_token(text)` gets each chunk as it arrives.
+    Iteration ends early when `stop` is set or the task is cancelled through /stop;
+    the result then has `cancelled` set and holds the text generated so far. If the
+    call fails before the first token, it is retried once on `fallback_model`.
+    """
+    messages = normalize_messages(messages)
+    params: Dict[str, Any] = {"max_tokens": max_tokens, "temperature": temperature, "top_p": top_p}
+    params = {name: value for name, value in params.items() if value is not None}
+    models = [model] + ([fallback_model] if fallback_model and fallback_model != model else [])
+    for attempt, current in enumerate(models):
+        result = Completion(text="", model=current)
+        try:
+            return _stream_once(purpose, messages, current, params, on_token, stop, timeout, result)
+        except Exception as e:
+            if result.ttft_ms is not None or attempt == len(models) - 1:
+                raise  # tokens already went out, or nothing left to try
+            print(f"[LLMGateway] {purpose} on {current} failed, retrying on {models[attempt + 1]}: {e}")
+    raise AssertionError("unreachable")
+
+
+def _stream_once(purpose: str, messages: List[Dict[str, str]], model: str, params: Dict[str, Any],
+                 on_token: Optional[Callable[[str], None]], stop: Optional[threading.Event],
+                 timeout: Optional[float], result: Completion) -> Completion:
+    start = time.perf_counter()
+    try:
+        completion = groq.get().chat.completions.create(
+            model=model, messages=messages, stream=True, timeout=timeout or get_settings().llm.timeout, **params)
+
+        parts: List[str] = []
+        usage = None
+        stopped = threading.Event()
+        chunks = Tasks.stream("llm", completion, purpose, stopped)
+        for chunk in chunks:
+            if stop is not None and stop.is_set():
+                chunks.close()
+                close = getattr(completion, "close", None)
+                if close is not None:
+                    close()  # don't leave the response half-read on a pooled connection
+                break
+            x_groq = getattr(chunk, "x_groq", None)
+            if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                usage = x_groq.usage
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                if result.ttft_ms is None:
+                    result.ttft_ms = round((time.perf_counter() - start) * 1000, 1)
+                parts.append(text)
+                if on_token:
+                    on_token(text)
+    except Exception:
+        _record(purpose, model, None, error=True)
+        raise
+
+    result.text = "".join(parts).replace("</s>", "")
+    result.cancelled = stopped.is_set() or (stop is not None and stop.is_set())
+    if usage is not None:
+        result.prompt_tokens, result.completion_tokens = usage.prompt_tokens, usage.completion_tokens
+    else:
+        result.estimated = True
+        result.prompt_tokens = sum(_estimate(m["content"]) for m in messages)
+        result.completion_tokens = _estimate(result.text)
+    result.total_ms = round((time.perf_counter() - start) * 1000, 1)
+    _record(purpose, model, result)
+    return result
+
+
+def cohere_chat(purpose: str, message: str, model: str, stream: bool = True,
+                timeout: Optional[float] = None, **kwargs) -> Completion:
+    """A Cohere chat call (streamed or not) returning its whole text; `kwargs` go to the SDK."""
+    options = {"timeout_in_seconds": timeout or get_settings().llm.timeout}
+    start = time.perf_counter()
+    result = Completion(text="", model=model)
+    meta = None
+    try:
+        client = cohere.get()
+        if stream:
+            parts: List[str] = []
+            for event in client.chat_stream(model=model, message=message, request_options=options, **kwargs):
+                if event.event_type == "text-generation":
+                    if result.ttft_ms is None:
+                        result.ttft_ms = round((time.perf_counter() - start) * 1000, 1)
+                    parts.append(event.text)
+                elif event.event_type == "stream-end":
+                    meta = getattr(getattr(event, "response", None), "meta", None)
+            result.text = "".join(parts)
+        else:
+            response = client.chat(model=model, message=message, request_options=options, **kwargs)
+            result.text = response.text or ""
+            result.ttft_ms = round((time.perf_counter() - start) * 1000, 1)
+            meta = getattr(response, "meta", None)
+    except Exception:
+        _record(purpose, model, None, error=True)
+        raise
+
+    units = getattr(meta, "billed_units", None)
+    if units is not None and units.input_tokens is not None:
+        result.prompt_tokens, result.completion_tokens = int(units.input_tokens), int(units.output_tokens or 0)
+    else:
+        result.estimated = True
+        history = kwargs.get("chat_history") or []
+        result.prompt_tokens = _estimate(message + (kwargs.get("preamble") or "")) + \
+            sum(_estimate(m.get("message", "")) for m in history)
+        result.completion_tokens = _estimate(result.text)
+    result.total_ms = round((time.perf_counter() - start) * 1000, 1)
+    _record(purpose, model, result)
+    return result
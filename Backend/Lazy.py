@@ -0,0 +1,42 @@
+# Lazy.py
+"""
+On-first-use construction for expensive objects (API clients, drivers, heavy SDKs).
+
+Importing a backend module must stay cheap: the API process should start in well
+under a second and a worker that only serves /chat should never pay for the
+audio, browser or GUI stacks. Modules therefore import heavy packages inside the
+functions that need them and wrap client construction in `Lazy`.
+"""
+
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """Build a value with `factory` the first time `get()` is called, exactly once."""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._value = self._factory()
+                    self._loaded = True
+        return self._value  # type: ignore
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def reset(self):
+        """Drop the cached value so the next `get()` rebuilds it (e.g. after a key change)."""
+        with self._lock:
+            self._value = None
+            self._loaded = False
@@ -2,71 +2,145 @@
 
 from .Model import FirstLayerDMM
 from .RealtimeSearchEngine import RealtimeSearchEngine
-from .Automation import Automation
+from .AutomationExecutor import get_executor
 from .SpeechToText import SpeechRecognitionFromFile
 from .Chatbot import ChatBot
-from .TextToSpeech import TextToSpeech
+from .KeywordRouter import RouteHints, get_router
+from .Gazetteer import resolve_place
+from .TextToSpeech import (TextToSpeech, StreamSpeech, SpokenText, SentenceSplitter, IsLongAnswer,
+                           RESPONSES, SPOKEN_SENTENCES)
+from .Settings import get_settings, reload_settings
+from .State import get_state, is_isolated
+from .ChatStore import get_chat_store
+from . import Admission
+from . import Batch
+from . import LLMGateway
+from . import Prefetch
+from . import Reminders
+from . import Tasks
+from .MessageBus import (AssistantStatus, ImageJob, StopRequest, SetAssistantStatus, ShowTextToScreen, get_bus,
+                         publish)
 
-from fastapi import FastAPI, Form, UploadFile, File
+from fastapi import FastAPI, Form, UploadFile, File, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import dotenv_values
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
 import requests
 import re
+import base64
+import random
+import json
 import os
+import sys
+import time
+import uuid
 import subprocess
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, Callable
 import signal
-import multiprocessing
-
-# NEW: for safe Automation launch inside FastAPI's event loop
 import asyncio
-import inspect
-from concurrent.futures import ThreadPoolExecutor
 
 # =========================
-# ENV & CONSTANTS
+# CONSTANTS
 # =========================
-env_vars = dotenv_values(".env")
-Username = env_vars.get("Username", "User")
-Assistantname = env_vars.get("Assistantname", "Assistant")
-WeatherAPIKey = env_vars.get("OpenWeatherMapAPIKey", "")
-DefaultLocation = env_vars.get("DefaultLocation", "Tempe,AZ,US")
-
-subprocesses = []
 Functions = ["open", "close", "play", "system", "content", "google search", "youtube search"]
 
 # =========================
-# SAFE AUTOMATION LAUNCHER
+# CHILD PROCESS REGISTRY
 # =========================
-_executor: Optional[ThreadPoolExecutor] = None
+# Records live in the shared state so /stop on any worker sees every child;
+# Popen handles are kept locally by the worker that started them. A record is
+# only trusted while its PID still belongs to the same process (same start
+# time), so a stale record from a crashed worker or an earlier run never
+# signals an unrelated process that reused the PID.
+PROCESS_REGISTRY = "processes"
+_children: Dict[int, subprocess.Popen] = {}
 
-def launch_automation(decision):
-    """
-    Run Automation(decision) safely from both sync and async contexts:
-    - async Automation -> schedule with asyncio.create_task when a loop is running, else asyncio.run
-    - sync Automation  -> offload to a thread so we don't block FastAPI's event loop
-    """
-    global _executor
+def _process_start(pid: int) -> Optional[str]:
+    """Start time of `pid` in clock ticks since boot (Linux /proc); None if unknown or gone."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # The command name may contain spaces and parentheses; fields resume after the last ")".
+    fields = stat[stat.rindex(")") + 2:].split()
+    return fields[19] if len(fields) > 19 else None
+
+def register_process(kind: str, proc: subprocess.Popen):
+    _children[proc.pid] = proc
+    get_state().hset(PROCESS_REGISTRY, str(proc.pid), {
+        "kind": kind, "worker": os.getpid(), "started": time.time(), "start_ticks": _process_start(proc.pid)})
+
+def _is_recorded_process(pid: int, info: Dict[str, Any]) -> bool:
+    """True if `pid` is still the process described by its registry record."""
+    proc = _children.get(pid)
+    if proc is not None:
+        return proc.poll() is None
+    recorded = info.get("start_ticks")
+    return recorded is not None and _process_start(pid) == recorded
+
+def prune_process_registry() -> int:
+    """Drop registry records whose process has exited or whose PID now belongs to another process."""
+    state = get_state()
+    pruned = 0
+    for pid, info in state.hgetall(PROCESS_REGISTRY).items():
+        if not _is_recorded_process(int(pid), info):
+            state.hdel(PROCESS_REGISTRY, pid)
+            pruned += 1
+    return pruned
 
-    if inspect.iscoroutinefunction(Automation):
+def stop_registered_processes() -> int:
+    killed = 0
+    state = get_state()
+    for pid, info in state.hgetall(PROCESS_REGISTRY).items():
+        proc = _children.pop(int(pid), None)
         try:
-            loop = asyncio.get_running_loop()
-            if loop.is_running():
-                asyncio.create_task(Automation(decision))
-            else:
-                asyncio.run(Automation(decision))
-        except RuntimeError:
-            asyncio.run(Automation(decision))
-    else:
+            if proc is not None:
+                if proc.poll() is None:
+                    proc.terminate()
+                    killed += 1
+            elif _is_recorded_process(int(pid), info):
+                # Started by another worker on this host, and verifiably still that child.
+                os.kill(int(pid), signal.SIGTERM)
+                killed += 1
+        except OSError:
+            pass  # already gone
+        state.hdel(PROCESS_REGISTRY, pid)
+    return killed
+
+def submit_image_job(prompt: str) -> str:
+    """Queue `prompt` on the image_jobs topic, starting a worker if no running one got it."""
+    job = ImageJob(prompt=prompt, job_id=uuid.uuid4().hex)
+    try:
+        # The ack says whether a subscribed worker took the job or the broker is holding it.
+        if get_bus().publish(job, ack=True):
+            return job.job_id
+    except OSError as e:
+        print(f"[MessageBus] Could not publish {job.topic}: {e}")
+    # Held until a worker subscribes: one may be starting up already. Workers on
+    # their way out are marked "stopping" before they leave the topic.
+    state = get_state()
+    running = False
+    for pid, info in state.hgetall(PROCESS_REGISTRY).items():
+        if info.get("kind") != "image":
+            continue
+        if not _is_recorded_process(int(pid), info):
+            state.hdel(PROCESS_REGISTRY, pid)
+        elif not info.get("stopping"):
+            running = True
+    if not running:
         try:
-            loop = asyncio.get_running_loop()
-            if _executor is None:
-                _executor = ThreadPoolExecutor(max_workers=2)
-            loop.run_in_executor(_executor, Automation, decision)  # fire-and-forget
-        except RuntimeError:
-            # No running loop (unlikely in FastAPI). As a last resort, call directly.
-            Automation(decision) # type: ignore
+            worker = subprocess.Popen(
+                [sys.executable, '-m', 'Backend.ImageGeneration', '--worker'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                stdin=subprocess.DEVNULL, shell=False
+            )
+            register_process("image", worker)
+        except Exception as e:
+            print(f"Error starting ImageGeneration: {e}")
+    return job.job_id
 
 # =========================
 # WEATHER HELPERS (robust)
@@ -130,7 +204,8 @@ def extract_location_from_query(query: str) -> Optional[str]:
       - "current weather Tempe Arizona"
       - "what’s the weather right now in 'Tempe, AZ'?"
       - "'Tempe, AZ' weather"
-    Returns a string suitable for OWM geocoding, e.g. "Tempe,AZ,US".
+    Returns the location as written, e.g. "Tempe, AZ"; canonicalize_location()
+    turns it into the form OWM geocoding wants ("Tempe,AZ,US").
     """
     q = _clean_str(query)
 
@@ -139,14 +214,14 @@ def extract_location_from_query(query: str) -> Optional[str]:
     if m:
         loc = _clean_str(m.group(1)).strip("'\"")
         if loc:
-            return canonicalize_location(loc)
+            return loc
 
     # "quoted location"
     m2 = re.search(r"[\"']([^\"']+)[\"']", q)
     if m2:
         loc = _clean_str(m2.group(1))
         if loc:
-            return canonicalize_location(loc)
+            return loc
 
     # strip weather words & stopwords
     tokens = [t for t in re.split(r"\s+", q) if t]
@@ -163,15 +238,16 @@ def extract_location_from_query(query: str) -> Optional[str]:
         return None
 
     filtered = _normalize_location_tokens(filtered)
-    loc = _clean_str(" ".join(filtered))
-    return canonicalize_location(loc)
+    return _clean_str(" ".join(filtered))
 
 def geocode_location(q: str) -> Optional[Tuple[float, float, str]]:
-    if not WeatherAPIKey:
+    settings = get_settings()
+    if not settings.keys.openweathermap:
         return None
     url = "https://api.openweathermap.org/geo/1.0/direct"
     try:
-        resp = requests.get(url, params={"q": q, "limit": 1, "appid": WeatherAPIKey}, timeout=10)
+        resp = requests.get(url, params={"q": q, "limit": 1, "appid": settings.keys.openweathermap},
+                            timeout=settings.weather.timeout)
         data = resp.json()
         if not isinstance(data, list) or len(data) == 0:
             return None
@@ -188,12 +264,24 @@ def geocode_location(q: str) -> Optional[Tuple[float, float, str]]:
     except Exception:
         return None
 
+def resolve_location(loc_str: str) -> Optional[Tuple[float, float, str]]:
+    """
+    The bundled gazetteer first (no round trip), on the location as written;
+    the OpenWeatherMap geocoder, on its canonical form, only on a miss.
+    """
+    place = resolve_place(loc_str)
+    if place is not None:
+        return (place.lat, place.lon, place.label)
+    return geocode_location(canonicalize_location(loc_str))
+
 def fetch_weather_by_coords(lat: float, lon: float) -> Optional[Dict[str, Any]]:
-    if not WeatherAPIKey:
+    settings = get_settings()
+    if not settings.keys.openweathermap:
         return None
     url = "https://api.openweathermap.org/data/2.5/weather"
     try:
-        resp = requests.get(url, params={"lat": lat, "lon": lon, "appid": WeatherAPIKey, "units": "metric"}, timeout=10)
+        resp = requests.get(url, params={"lat": lat, "lon": lon, "appid": settings.keys.openweathermap, "units": "metric"},
+                            timeout=settings.weather.timeout)
         return resp.json()
     except Exception:
         return None
@@ -220,14 +308,15 @@ def format_weather_response(label: str, payload: Optional[Dict[str, Any]]) -> st
     return ", ".join(parts) + "."
 
 def get_weather(query: str) -> str:
-    if not WeatherAPIKey:
+    settings = get_settings()
+    if not settings.keys.openweathermap:
         return "Weather API key not set. Please add OpenWeatherMapAPIKey to your .env."
 
     loc_str: Optional[str] = extract_location_from_query(query)
     if not loc_str:
-        loc_str = DefaultLocation  # ensure a non-None string
+        loc_str = settings.weather.default_location  # ensure a non-None string
 
-    geo = geocode_location(loc_str) # type: ignore
+    geo = resolve_location(loc_str)
     if not geo:
         return f"Could not find weather for {loc_str}."
 
@@ -238,88 +327,110 @@ def get_weather(query: str) -> str:
 # =========================
 # CORE AI
 # =========================
-def process_query(Query: str) -> str:
+def process_query(Query: str, on_token: Optional[Callable[[str], None]] = None) -> str:
     """
     Handles AI decision making for both general & realtime queries.
     Weather is handled directly via OpenWeatherMap APIs.
+    LLM answers are also streamed chunk by chunk to `on_token` when given.
     """
-    TaskExecution = False
-    ImageExecution = False
-    ImageGenerationQuery = ""
+    router = get_router()
+    hints = router.route(Query)
 
-    # Weather first (direct API)
-    if any(k in Query.lower() for k in ["weather", "temperature", "forecast"]):
+    # Weather first (direct API); a query that also asks for something else goes on below
+    if hints.weather and not hints.multi:
         return get_weather(Query)
 
     Decision = FirstLayerDMM(Query)
 
+    if hints.weather:
+        WeatherAnswer = get_weather(Query)
+        Decision = [i for i in Decision if not router.route(i).weather]
+        if not Decision:
+            return WeatherAnswer
+        # "weather today and open youtube": the rest shouldn't be forced onto realtime by the weather part
+        Rest = answer_decisions(Query, Decision, router.route(" and ".join(Decision)), on_token)
+        return f"{WeatherAnswer}\n{Rest}"
+
+    return answer_decisions(Query, Decision, hints, on_token)
+
+def answer_decisions(Query: str, Decision: list, hints: RouteHints,
+                     on_token: Optional[Callable[[str], None]] = None) -> str:
+    # Reminders are stored and scheduled here; they fire through the status/response channel.
+    # Their confirmations follow the answer to the rest of the decision.
+    ReminderRequests = [i for i in Decision if i.startswith("reminder")]
+    if ReminderRequests:
+        if is_isolated():
+            Replies = ["Not run in a batch: " + ", ".join(ReminderRequests)]
+        else:
+            Replies = []
+            for reminder_request in ReminderRequests:
+                try:
+                    Reminder = Reminders.set_reminder(reminder_request[len("reminder"):])
+                    Replies.append(f"Reminder set for {Reminders.describe(Reminder)}: {Reminder['message']}.")
+                except ValueError as e:
+                    Replies.append(f"I couldn't set that reminder: {e}.")
+        Decision = [i for i in Decision if not i.startswith("reminder")]
+        if not Decision:
+            return " ".join(Replies)
+        # "general what is today's date, reminder 11:00pm 5th aug dancing performance"
+        RestQuery = " and ".join(" ".join(i.split()[1:]) for i in Decision)
+        Rest = answer_decisions(RestQuery, Decision, get_router().route(RestQuery), on_token)
+        return f"{Rest}\n{' '.join(Replies)}"
+
+    TaskExecution = False
+    ImageExecution = False
+    ImageGenerationQuery = ""
+
     G = any(i.startswith("general") for i in Decision)
     R = any(i.startswith("realtime") for i in Decision)
 
-    # Force realtime for certain keywords
-    if any(word in Query.lower() for word in ["time", "today", "news"]):
+    # Force realtime for time and news keywords (whole words only)
+    if hints.realtime:
         R = True
         G = False
         Decision = [f"realtime {Query}"]
 
-    Mearged_query = " and ".join(
-        [" ".join(i.split()[1:]) for i in Decision if i.startswith("general") or i.startswith("realtime")]
-    )
-
     # Image generation side-effects (kept as in your code)
     for queries in Decision:
         if "generate" in queries:
             ImageGenerationQuery = str(queries)
             ImageExecution = True
 
+    # Batch runs (State.isolated_history) answer questions only: automation,
+    # image jobs and reminders would act on this machine for real.
+    Isolated = is_isolated()
+
     for queries in Decision:
-        if not TaskExecution:
+        if not TaskExecution and not Isolated:
             if any(queries.startswith(func) for func in Functions):
-                # SAFE: no asyncio.run() inside FastAPI
-                launch_automation(list(Decision))
+                # Runs in the background; outcomes are polled via /automation
+                get_executor().submit(list(Decision))
                 TaskExecution = True
 
     if ImageExecution:
-        try:
-            os.makedirs(r"Frontend\Files", exist_ok=True)
-            with open(r"Frontend\Files\ImageGeneration.data", "w", encoding="utf-8") as file:
-                file.write(f"{ImageGenerationQuery},True")
-            p1 = subprocess.Popen(
-                ['python', r'ImageGeneration.py'],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                stdin=subprocess.PIPE, shell=False
-            )
-            subprocesses.append(p1)
-        except Exception as e:
-            print(f"Error starting ImageGeneration.py: {e}")
+        if not Isolated:
+            submit_image_job(ImageGenerationQuery)
 
         if G and R or R:
-            return RealtimeSearchEngine(Query)
+            return RealtimeSearchEngine(Query, on_token)
 
     # Automation answers first
     for Queries in Decision:
         if any(Queries.startswith(func) for func in Functions):
-            try:
-                asyncio.run(Automation(list(Decision)))
-                return f"Executing: {Queries}"
-            except Exception as e:
-                # Fallback to browser if app not found
-                import webbrowser
-                search_term = Queries.replace("open", "").replace("close", "").strip()
-                if search_term:
-                    webbrowser.open(f"https://www.google.com/search?q={search_term}")
-                    return f"Could not open {search_term} as an app. Opened in browser instead."
-                else:
-                    return f"Automation failed: {e}"
+            return f"Not run in a batch: {Queries}" if Isolated else f"Executing: {Queries}"
+    if ImageExecution and Isolated:
+        return f"Not run in a batch: {ImageGenerationQuery}"
 
     # General / Realtime answers
     for Queries in Decision:
         if "general" in Queries:
             QueryFinal = Queries.replace("general", "")
-            return ChatBot(QueryFinal)
+            SetAssistantStatus("Thinking...")
+            return ChatBot(QueryFinal, on_token)
         elif "realtime" in Queries:
             QueryFinal = Queries.replace("realtime", "")
-            return RealtimeSearchEngine(QueryFinal)
+            SetAssistantStatus("Searching...")
+            return RealtimeSearchEngine(QueryFinal, on_token)
         elif "exit" in Queries:
             return "Okay, Bye!"
 
@@ -336,25 +447,182 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Job-ID"],
 )
 
+# Per-client rate limits and per-endpoint concurrency limits for /chat, /stt, /tts.
+app.add_middleware(Admission.AdmissionMiddleware)
+
+@app.middleware("http")
+async def task_scope(request: Request, call_next):
+    """Tag the request's work with X-Session-ID / X-Job-ID (generated if absent) so /stop can target it."""
+    job = request.headers.get("x-job-id") or uuid.uuid4().hex
+    with Tasks.scope(request.headers.get("x-session-id"), job):
+        response = await call_next(request)
+    response.headers["X-Job-ID"] = job
+    return response
+
+@app.on_event("startup")
+def subscribe_stop_requests():
+    # /stop on any worker reaches the tasks of every worker.
+    try:
+        get_bus().subscribe(StopRequest, lambda m: Tasks.cancel(m.session or None, m.job or None))
+    except OSError as e:
+        print(f"[Main] Message bus unavailable, /stop only reaches this worker: {e}")
+
+@app.on_event("startup")
+def prune_processes():
+    # Workers started without serve() (plain uvicorn/gunicorn) or restarted after a crash.
+    prune_process_registry()
+
+@app.on_event("startup")
+def load_answer_cache():
+    # Loads the embedding model now rather than inside the first /chat of this worker.
+    if get_settings().answer_cache.enabled:
+        from .AnswerCache import warm
+        warm()
+
+@app.on_event("startup")
+def start_prefetch():
+    # Keeps the search results of hot realtime queries fresh; see Backend/Prefetch.py.
+    if get_settings().prefetch.enabled:
+        Prefetch.get_scheduler().start()
+
+@app.on_event("startup")
+def start_reminders():
+    # Fires pending reminders (including ones that came due while the API was down).
+    if get_settings().reminders.enabled:
+        Reminders.get_scheduler().start()
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
+@app.get("/admission")
+async def admission_stats():
+    return Admission.stats()
+
+@app.get("/llm")
+async def llm_usage():
+    return LLMGateway.stats()
+
+@app.get("/prefetch")
+async def prefetch_stats():
+    return Prefetch.stats()
+
+@app.get("/cache")
+async def answer_cache_stats():
+    if not get_settings().answer_cache.enabled:
+        return {"enabled": False}
+    from .AnswerCache import get_answer_cache
+    return {"enabled": True, **get_answer_cache().stats()}
+
+@app.delete("/cache")
+async def clear_answer_cache():
+    from .AnswerCache import get_answer_cache
+    get_answer_cache().clear()
+    return {"status": "cleared"}
+
+@app.get("/settings")
+async def settings_endpoint():
+    return get_settings().public()
+
+@app.post("/settings/reload")
+async def reload_settings_endpoint():
+    return reload_settings().public()
+
+def run_chat_turn(prompt: str, chat_id: Optional[str] = None,
+                  on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, list]:
+    """One user turn: GUI updates, the answer, and (for PWA chats) persistence. Blocking."""
+    identity = get_settings().identity
+    ShowTextToScreen(f"{identity.username} : {prompt}")
+    SetAssistantStatus("Thinking...")
+    # The GUI shows the answer as it streams: chunks extend the row for
+    # message_id and the final message replaces it with the finished answer.
+    message_id = uuid.uuid4().hex
+    prefix = [f"{identity.assistant_name} : "]
+
+    def stream_token(text: str):
+        ShowTextToScreen(prefix.pop() + text if prefix else text, message_id, final=False)
+        if on_token:
+            on_token(text)
+
+    try:
+        Answer = process_query(prompt, stream_token)
+        ShowTextToScreen(f"{identity.assistant_name} : {Answer}", message_id)
+    finally:
+        SetAssistantStatus("Available...")
+    stored = []
+    if chat_id:
+        # PWA chats are persisted so other devices (and reloads) can sync them.
+        stored = get_chat_store().add_messages(
+            chat_id, [{"role": "user", "content": prompt}, {"role": "assistant", "content": Answer}])
+    return Answer, stored
+
 @app.post("/chat")
-async def chat_endpoint(prompt: str = Form(...)):
-    Answer = process_query(prompt)
-    return {"response": Answer}
+async def chat_endpoint(prompt: str = Form(...), chat_id: Optional[str] = Form(None)):
+    # Blocking work runs in the threadpool so queued requests can time out on the event loop.
+    Answer, stored = await run_in_threadpool(run_chat_turn, prompt, chat_id)
+    if not chat_id:
+        return {"response": Answer}
+    return {"response": Answer, "chat_id": chat_id, "messages": stored}
 
-processes = {}
+@app.post("/chat/batch")
+async def chat_batch_endpoint(request: Request, file: UploadFile = File(...), concurrency: Optional[int] = Form(None)):
+    """JSONL prompts in, JSONL results out as each finishes; see Backend/Batch.py."""
+    try:
+        items = Batch.parse_items((await file.read()).decode("utf-8").splitlines())
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Batch file must be UTF-8 JSONL")
+    limit = get_settings().batch.max_items
+    if len(items) > limit:
+        raise HTTPException(status_code=413, detail=f"At most {limit} prompts per batch")
+    # Holds a /chat/batch admission slot (ChatBatchConcurrency per worker) until the last result is sent.
+    try:
+        release = await Admission.acquire("/chat/batch", request)
+    except Admission.RateLimited as e:
+        return Admission.reject(429, "Too many requests", e.retry_after)
+    except Admission.Overloaded as e:
+        return Admission.reject(503, "Server busy", e.retry_after)
 
-def run_stt(path, queue):
+    async def lines():
+        try:
+            async for result in Batch.run_batch(items, process_query, concurrency):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            release()
+
+    # The background task covers a client that disconnects before the body starts.
+    return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+# =========================
+# CHAT HISTORY SYNC (PWA)
+# =========================
+@app.get("/chats")
+async def list_chats(limit: int = 20, cursor: Optional[str] = None):
     try:
-        text = SpeechRecognitionFromFile(path)
-        queue.put(text)
-    except Exception as e:
-        queue.put(f"Error: {e}")
+        return await run_in_threadpool(get_chat_store().list_chats, min(max(1, limit), 100), cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/chats")
+async def create_chat(title: str = Form("New chat"), chat_id: Optional[str] = Form(None)):
+    return await run_in_threadpool(get_chat_store().create_chat, title, chat_id)
+
+@app.get("/chats/sync")
+async def sync_chats(since: int = 0, limit: int = 500):
+    return await run_in_threadpool(get_chat_store().changes, since, min(max(1, limit), 1000))
+
+@app.delete("/chats/{chat_id}")
+async def delete_chat(chat_id: str):
+    if not await run_in_threadpool(get_chat_store().delete_chat, chat_id):
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return {"status": "deleted", "chat_id": chat_id}
+
+@app.get("/chats/{chat_id}/messages")
+async def chat_messages(chat_id: str, before: Optional[int] = None, limit: Optional[int] = None):
+    limit = min(max(1, limit or get_settings().state.chat_page_size), 200)
+    return await run_in_threadpool(get_chat_store().messages, chat_id, limit, before)
 
 @app.post("/stt")
 async def speech_to_text_endpoint(file: UploadFile = File(...)):
@@ -363,11 +631,13 @@ async def speech_to_text_endpoint(file: UploadFile = File(...)):
         f.write(await file.read())
 
     try:
-        text = SpeechRecognitionFromFile(temp_path)
+        SetAssistantStatus("Listening...")
+        text = await run_in_threadpool(SpeechRecognitionFromFile, temp_path)
         return {"text": text}
     except Exception as e:
         return {"text": "", "error": str(e)}
     finally:
+        SetAssistantStatus("Available...")
         if os.path.exists(temp_path):
             os.remove(temp_path)
 
@@ -376,23 +646,428 @@ async def text_to_speech_endpoint(text: str = Form(...)):
     audio_path = TextToSpeech(text)
     return {"audio_file": audio_path}
 
-# Keep track of subprocesses
-running_processes = []
+# =========================
+# VOICE PIPELINE
+# =========================
+async def voice_turn(connection, audio_path: str, chat_id: Optional[str] = None, speak: bool = True):
+    """
+    A whole voice turn (speech -> transcript -> answer -> speech) as a stream of events:
+      {"stage": "transcript", "text"}, {"stage": "sentence", "text"} per sentence of the answer,
+      {"stage": "audio", "data": mp3 bytes}, {"stage": "answer", "text", "messages"},
+      {"stage": "done", "timings"}; or {"stage": "error", "error", "retry_after"?} to end early.
+    Stages overlap: each sentence is synthesized as soon as the answer stream completes it,
+    while the model is still generating the rest. Every event carries "ms" since the start,
+    and "timings" collects when each stage first produced output. `audio_path` is removed.
+    Each stage is admitted like its own endpoint (/stt, /chat, /tts). After /stop the
+    answer ends where its stream was closed and nothing more is spoken.
+    """
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    voice = Tasks.register("voice", description="voice turn")
+
+    def mark(stage: str) -> float:
+        return timings.setdefault(stage, round((time.perf_counter() - started) * 1000, 1))
+
+    def event(stage: str, **fields) -> Dict[str, Any]:
+        return {"stage": stage, "ms": round((time.perf_counter() - started) * 1000, 1), **fields}
+
+    try:
+        try:
+            async with Admission.admitted("/stt", connection):
+                SetAssistantStatus("Listening...")
+                transcript = await run_in_threadpool(SpeechRecognitionFromFile, audio_path)
+        finally:
+            if os.path.exists(audio_path):
+                os.remove(audio_path)
+        mark("transcript")
+        yield event("transcript", text=transcript)
+        if not transcript:
+            SetAssistantStatus("Available...")
+            yield event("done", timings=timings)
+            return
+
+        loop = asyncio.get_running_loop()
+        sentences: asyncio.Queue = asyncio.Queue()
+        splitter = SentenceSplitter()
+
+        def on_token(text: str):
+            mark("first_token")
+            for sentence in splitter.feed(text):
+                loop.call_soon_threadsafe(sentences.put_nowait, sentence)
+
+        async def answer_turn():
+            try:
+                async with Admission.admitted("/chat", connection):
+                    answer, stored = await run_in_threadpool(run_chat_turn, transcript, chat_id, on_token)
+                # The unterminated tail, or the whole answer when it didn't stream (weather, automation, ...)
+                rest = splitter if "first_token" in timings else SentenceSplitter()
+                for sentence in ([] if rest is splitter else rest.feed(answer)) + rest.flush():
+                    sentences.put_nowait(sentence)
+                return answer, stored
+            finally:
+                sentences.put_nowait(None)
+
+        async def speech(text: str):
+            async with Admission.admitted("/tts", connection):
+                async for chunk in StreamSpeech(text):
+                    if voice.cancelled.is_set():
+                        break
+                    mark("first_audio")
+                    yield event("audio", data=chunk)
+
+        turn = asyncio.ensure_future(answer_turn())
+        try:
+            spoken, held = 0, []
+            while True:
+                sentence = await sentences.get()
+                if sentence is None:
+                    break
+                mark("first_sentence")
+                yield event("sentence", text=sentence)
+                if not speak or voice.cancelled.is_set():
+                    continue
+                if spoken < SPOKEN_SENTENCES:
+                    spoken += 1
+                    async for audio in speech(sentence):
+                        yield audio
+                else:
+                    held.append(sentence)  # only spoken if the answer turns out short
+            answer, stored = await turn
+        finally:
+            turn.cancel()
+        mark("answer")
+        yield event("answer", text=answer, chat_id=chat_id, messages=stored)
+        if speak and not voice.cancelled.is_set():
+            remaining = [random.choice(RESPONSES)] if IsLongAnswer(answer) else held
+            if remaining:
+                async for audio in speech(" ".join(remaining)):
+                    yield audio
+        mark("total")
+        yield event("done", timings=timings)
+    except Admission.Overloaded as e:
+        SetAssistantStatus("Available...")
+        yield event("error", error="Too many requests" if isinstance(e, Admission.RateLimited) else "Server busy",
+                    retry_after=round(e.retry_after, 1))
+    except Exception as e:  # e.g. the chat model failed mid-answer; end the stream with an error event
+        yield event("error", error=str(e))
+    finally:
+        Tasks.unregister(voice)
+
+@app.post("/voice")
+async def voice_endpoint(request: Request, file: UploadFile = File(...), chat_id: Optional[str] = Form(None),
+                         speak: bool = Form(True)):
+    """
+    /stt, /chat and /tts in one request. The reply is NDJSON, one voice_turn event per
+    line as it happens; audio events carry base64 MP3 chunks.
+    """
+    ext = re.sub(r"[^a-z0-9]", "", os.path.splitext(file.filename or "")[1].lower()) or "webm"
+    temp_path = os.path.join("Data", f"voice_{uuid.uuid4().hex}.{ext}")
+    with open(temp_path, "wb") as f:
+        f.write(await file.read())
+
+    async def lines():
+        async for item in voice_turn(request, temp_path, chat_id, speak):
+            if item["stage"] == "audio":
+                item = {**item, "data": base64.b64encode(item["data"]).decode("ascii")}
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# =========================
+# WEBSOCKET CHANNEL
+# =========================
+WS_PROTOCOL_VERSION = 1
+WS_SEND_QUEUE = 256                   # outgoing frames buffered per connection
+WS_MAX_RECORDING = 20 * 1024 * 1024   # bytes of mic audio accepted per recording
+
+@app.websocket("/ws")
+async def websocket_channel(websocket: WebSocket):
+    """
+    One persistent connection multiplexing chat, tokens, status, TTS audio and mic audio.
+    Text frames are JSON objects with a "type"; requests carry a client-chosen "id"
+    that every related reply repeats, so several can be in flight at once.
+
+    client -> server
+      {"type": "chat", "id", "prompt", "chat_id"?, "speak"?}   answer (and audio if speak)
+      {"type": "tts", "id", "text"}                              audio
+      {"type": "mic_start", "id", "format"?}, binary audio frames, {"type": "mic_end", "id"}   transcript
+      the same with "reply": true (and "chat_id"?, "speak"?)      a whole voice_turn: transcript,
+                                                                   sentence..., answer, audio, done
+      {"type": "stop", "id", "job"?}   cancel this connection's requests (or the one with id `job`)
+      {"type": "ping"}
+
+    server -> client
+      hello {version, session}, pong, stopped {id, cancelled}, status {text}, token {id, text}, answer {id, text, messages},
+      transcript {id, text}, sentence {id, text}, done {id, timings},
+      audio_start {id, format}, audio_end {id}, error {id, error, retry_after?}
+      Binary frames between audio_start and audio_end are MP3 chunks for that id.
+
+    Operations are admitted like their HTTP counterparts (/chat, /stt, /tts). All
+    replies go through one bounded outbox: token producers wait while the client
+    reads slowly, and status updates are dropped rather than queued.
+    """
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    session = websocket.query_params.get("session") or uuid.uuid4().hex
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE)
+    audio_lock = asyncio.Lock()  # one audio stream at a time so binary frames don't interleave
+    tasks = set()
+    recording: Dict[str, Any] = {}
+    closed = False
+
+    async def sender():
+        while True:
+            frame = await outbox.get()
+            if isinstance(frame, bytes):
+                await websocket.send_bytes(frame)
+            else:
+                await websocket.send_text(json.dumps(frame))
+
+    def on_status(message: AssistantStatus):
+        def put():
+            if not closed and not outbox.full():
+                outbox.put_nowait({"type": "status", "text": message.text})
+        loop.call_soon_threadsafe(put)
+
+    def token_sink(request_id):
+        def on_token(text: str):
+            if not closed:
+                # Blocks this worker thread while the outbox is full (backpressure).
+                asyncio.run_coroutine_threadsafe(
+                    outbox.put({"type": "token", "id": request_id, "text": text}), loop).result()
+        return on_token
+
+    async def stream_audio(request_id, text: str):
+        async with audio_lock:
+            await outbox.put({"type": "audio_start", "id": request_id, "format": "audio/mpeg"})
+            async for chunk in StreamSpeech(SpokenText(text)):
+                await outbox.put(chunk)
+            await outbox.put({"type": "audio_end", "id": request_id})
+
+    async def handle_chat(msg):
+        prompt = str(msg.get("prompt", "")).strip()
+        if not prompt:
+            raise ValueError("prompt is required")
+        async with Admission.admitted("/chat", websocket):
+            answer, stored = await run_in_threadpool(run_chat_turn, prompt, msg.get("chat_id"), token_sink(msg.get("id")))
+        await outbox.put({"type": "answer", "id": msg.get("id"), "text": answer,
+                          "chat_id": msg.get("chat_id"), "messages": stored})
+        if msg.get("speak"):
+            async with Admission.admitted("/tts", websocket):
+                await stream_audio(msg.get("id"), answer)
+
+    async def handle_tts(msg):
+        async with Admission.admitted("/tts", websocket):
+            await stream_audio(msg.get("id"), str(msg.get("text", "")))
+
+    async def handle_recording(request_id, rec: Dict[str, Any]):
+        ext = re.sub(r"[^a-z0-9]", "", rec["format"].lower()) or "webm"
+        temp_path = os.path.join("Data", f"ws_{uuid.uuid4().hex}.{ext}")
+        with open(temp_path, "wb") as f:
+            f.writelines(rec["chunks"])
+        if rec["reply"]:
+            await handle_voice(request_id, temp_path, rec)
+            return
+        try:
+            async with Admission.admitted("/stt", websocket):
+                SetAssistantStatus("Listening...")
+                text = await run_in_threadpool(SpeechRecognitionFromFile, temp_path)
+        finally:
+            SetAssistantStatus("Available...")
+            os.remove(temp_path)
+        await outbox.put({"type": "transcript", "id": request_id, "text": text})
+
+    async def handle_voice(request_id, temp_path: str, rec: Dict[str, Any]):
+        # voice_turn events become frames of the same names; audio goes out as binary frames.
+        streaming = False
+        try:
+            async for item in voice_turn(websocket, temp_path, rec["chat_id"], rec["speak"]):
+                stage = item.pop("stage")
+                if stage == "audio":
+                    if not streaming:
+                        await audio_lock.acquire()
+                        streaming = True
+                        await outbox.put({"type": "audio_start", "id": request_id, "format": "audio/mpeg"})
+                    await outbox.put(item["data"])
+                    continue
+                if stage in ("done", "error") and streaming:
+                    await outbox.put({"type": "audio_end", "id": request_id})
+                    streaming = False
+                    audio_lock.release()
+                await outbox.put({"type": stage, "id": request_id, **item})
+        finally:
+            if streaming:
+                audio_lock.release()
+
+    def spawn(request_id, coro):
+        async def run():
+            current = asyncio.current_task()
+            # Registered so /stop (or a "stop" message) can cancel it; threadpool work it
+            # starts inherits the session/job tags and registers its own streams.
+            with Tasks.scope(session, str(request_id) if request_id is not None else None), \
+                    Tasks.track("ws", lambda: loop.call_soon_threadsafe(current.cancel), description=coro.__name__):
+                try:
+                    await coro
+                except asyncio.CancelledError:
+                    if not closed:
+                        await outbox.put({"type": "error", "id": request_id, "error": "Cancelled"})
+                except Admission.Overloaded as e:
+                    await outbox.put({"type": "error", "id": request_id, "error": "Server busy",
+                                      "retry_after": round(e.retry_after, 1)})
+                except Exception as e:
+                    await outbox.put({"type": "error", "id": request_id, "error": str(e)})
+        task = asyncio.create_task(run())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    send_task = asyncio.create_task(sender())
+    get_bus().subscribe(AssistantStatus, on_status)
+    await outbox.put({"type": "hello", "version": WS_PROTOCOL_VERSION, "session": session})
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                if recording:
+                    recording["size"] += len(message["bytes"])
+                    if recording["size"] > WS_MAX_RECORDING:
+                        await outbox.put({"type": "error", "id": recording["id"], "error": "Recording too large"})
+                        recording.clear()
+                    else:
+                        recording["chunks"].append(message["bytes"])
+                continue
+            try:
+                msg = json.loads(message.get("text") or "")
+                kind = msg["type"]
+            except (ValueError, TypeError, KeyError):
+                await outbox.put({"type": "error", "id": None, "error": "Expected a JSON object with a type"})
+                continue
+            request_id = msg.get("id")
+            if kind == "ping":
+                await outbox.put({"type": "pong", "id": request_id})
+            elif kind == "chat":
+                spawn(request_id, handle_chat(msg))
+            elif kind == "tts":
+                spawn(request_id, handle_tts(msg))
+            elif kind == "stop":
+                job = msg.get("job")
+                stopped = Tasks.cancel(session, str(job) if job is not None else None)
+                await outbox.put({"type": "stopped", "id": request_id, "cancelled": len(stopped)})
+            elif kind == "mic_start":
+                recording.clear()
+                recording.update(id=request_id, format=str(msg.get("format", "webm")), chunks=[], size=0,
+                                 reply=bool(msg.get("reply")), chat_id=msg.get("chat_id"),
+                                 speak=bool(msg.get("speak", True)))
+            elif kind == "mic_end":
+                if recording.get("id") == request_id:
+                    spawn(request_id, handle_recording(request_id, dict(recording)))
+                    recording.clear()
+            else:
+                await outbox.put({"type": "error", "id": request_id, "error": f"Unknown type {kind!r}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        closed = True
+        get_bus().unsubscribe(AssistantStatus, on_status)
+        for task in list(tasks):
+            task.cancel()
+        send_task.cancel()
+        while not outbox.empty():  # release token producers blocked on a full outbox
+            outbox.get_nowait()
+
+# =========================
+# AUTOMATION JOBS
+# =========================
+@app.get("/automation")
+async def list_automation_jobs(limit: int = 50):
+    return {"jobs": await run_in_threadpool(get_executor().recent, min(max(1, limit), 200))}
+
+@app.get("/automation/{job_id}")
+async def automation_job(job_id: str):
+    record = await run_in_threadpool(get_executor().get, job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return record
+
+@app.post("/automation/{job_id}/cancel")
+async def cancel_automation_job(job_id: str):
+    if not await run_in_threadpool(get_executor().cancel, job_id):
+        raise HTTPException(status_code=404, detail="No unfinished job with this id on this worker")
+    return await run_in_threadpool(get_executor().get, job_id)
+
+# =========================
+# REMINDERS
+# =========================
+@app.get("/reminders")
+async def list_reminders(status: str = "pending", limit: int = 50):
+    if status not in ("pending", "fired", "cancelled"):
+        raise HTTPException(status_code=400, detail="status must be pending, fired or cancelled")
+    store = Reminders.get_reminder_store()
+    return {"reminders": await run_in_threadpool(store.list, status, min(max(1, limit), 500))}
+
+@app.delete("/reminders/{reminder_id}")
+async def cancel_reminder(reminder_id: str):
+    if not await run_in_threadpool(Reminders.cancel_reminder, reminder_id):
+        raise HTTPException(status_code=404, detail="No pending reminder with this id")
+    return await run_in_threadpool(Reminders.get_reminder_store().get, reminder_id)
+
+@app.get("/tasks")
+async def list_tasks():
+    """Work in flight on this worker (LLM streams, browser sessions, playback, jobs, ...)."""
+    return {"tasks": Tasks.active()}
 
 @app.post("/stop")
-async def stop_process():
-    killed = 0
-    for pid, proc_info in list(processes.items()):
-        if proc_info["process"].is_alive():
-            proc_info["process"].terminate()
-            killed += 1
-        del processes[pid]
-    return {"status": "stopped", "killed": killed}
-    
+async def stop_process(session: Optional[str] = None, job: Optional[str] = None):
+    """
+    Cancel in-flight work on every worker: all of it, or only one session's or job's.
+    Worker subprocesses are shared, so only an unscoped stop terminates them.
+    """
+    stopped = Tasks.cancel(session, job)
+    publish(StopRequest(session=session or "", job=job or ""))
+    killed = 0 if session or job else stop_registered_processes()
+    return {"status": "stopped", "cancelled": len(stopped), "tasks": stopped, "killed": killed}
+
 
 # =========================
 # ENTRY POINT
 # =========================
-if __name__ == "__main__":
+def serve(argv=None):
+    """
+    Development: python -m Backend.Main --reload
+    Production:  python -m Backend.Main --workers 0            (one uvicorn worker per CPU)
+                 python -m Backend.Main --workers 8 --gunicorn (gunicorn + uvicorn workers)
+    """
+    import argparse
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Run the B-AI API server.")
+    parser.add_argument("--host", default=settings.server.host)
+    parser.add_argument("--port", type=int, default=settings.server.port)
+    parser.add_argument("--workers", type=int, default=settings.server.workers, help="0 = one per CPU core")
+    parser.add_argument("--reload", action="store_true", help="auto-reload on code changes (single worker)")
+    parser.add_argument("--gunicorn", action="store_true", help="use gunicorn as the process manager")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    if args.reload:
+        workers = 1
+    if workers > 1 and settings.state.backend.lower() == "memory":
+        print("[Main] StateBackend=memory is per-process; use sqlite or redis so workers share history and caches.")
+    # No worker has started a child yet: records left over from an earlier run are all stale.
+    state = get_state()
+    for pid in state.hgetall(PROCESS_REGISTRY):
+        state.hdel(PROCESS_REGISTRY, pid)
+
+    if args.gunicorn and workers > 1:
+        os.execvp("gunicorn", [
+            "gunicorn", "Backend.Main:app",
+            "--worker-class", "uvicorn.workers.UvicornWorker",
+            "--workers", str(workers),
+            "--bind", f"{args.host}:{args.port}",
+        ])
+
     import uvicorn
-    uvicorn.run("Main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("Backend.Main:app", host=args.host, port=args.port, reload=args.reload, workers=workers)
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,523 @@
+# MessageBus.py
+"""
+Local pub/sub message bus shared by the API workers, the desktop GUI and the
+image generation worker. It replaces the Frontend/Files/*.data files, which
+were overwritten whole by one side and polled by the other, so two writes
+between polls lost a message.
+
+Transport is a Unix domain socket (BusPath) on POSIX and a localhost TCP port
+(BusPort) elsewhere. There is no separate daemon: the first process that needs
+the bus becomes the broker (elected with a lock file / exclusive bind), and the
+others reconnect and re-elect if it goes away.
+
+Guarantees:
+- typed topics: every message is one of the dataclasses below;
+- ordered delivery: messages on a topic reach each subscriber in publish order;
+- backpressure: each subscriber has a bounded queue (BusQueueSize). When it is
+  full the broker stops reading from the publisher, whose socket writes then
+  block, instead of dropping messages. A subscriber that stays full for
+  SLOW_CONSUMER_TIMEOUT seconds is disconnected;
+- retained state: new subscribers immediately get the last mic state, status
+  and response;
+- work queues: image_jobs go to exactly one subscriber (round robin) and are
+  held by the broker until a worker subscribes. A publisher can ask for an ack
+  telling it whether a worker got the job, and a worker that wants to exit
+  leaves the topic first, so a job is never routed to a process on its way out.
+
+Each topic is delivered by its own dispatcher thread. No lock is held while a
+message waits for room in a subscriber's queue, so one slow subscriber stalls
+only its topic's publishers.
+"""
+
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Type, Union
+
+from .Lazy import Lazy
+from .Settings import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+HAS_UNIX = hasattr(socket, "AF_UNIX") and fcntl is not None
+SLOW_CONSUMER_TIMEOUT = 30.0
+PENDING_LIMIT = 1000  # undelivered work-queue items kept while no worker is subscribed
+
+# =========================
+# TOPICS
+# =========================
+@dataclass
+class MicState:
+    topic = "mic"
+    active: bool = False
+
+
+@dataclass
+class AssistantStatus:
+    topic = "status"
+    text: str = ""
+
+
+@dataclass
+class Response:
+    topic = "responses"
+    text: str = ""
+    role: str = "assistant"
+    message_id: str = ""
+    # Streaming: messages with final=False carry the next chunk of `message_id`'s
+    # text; the closing final=True message carries the complete text.
+    final: bool = True
+
+
+@dataclass
+class ImageJob:
+    topic = "image_jobs"
+    prompt: str = ""
+    job_id: str = ""
+
+
+@dataclass
+class StopRequest:
+    # Broadcast by /stop so every worker cancels its matching tasks; empty = everything.
+    topic = "stop"
+    session: str = ""
+    job: str = ""
+
+
+Message = Union[MicState, AssistantStatus, Response, ImageJob, StopRequest]
+TOPICS: Dict[str, Type] = {cls.topic: cls for cls in (MicState, AssistantStatus, Response, ImageJob, StopRequest)}
+RETAINED_TOPICS = {"mic", "status", "responses"}
+QUEUE_TOPICS = {"image_jobs"}
+
+
+def _frame(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj) + "\n").encode("utf-8")
+
+
+def _read_lines(sock: socket.socket):
+    buffer = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line:
+                yield json.loads(line.decode("utf-8"))
+
+# =========================
+# BROKER
+# =========================
+class _Subscriber:
+    def __init__(self, broker: "Broker", conn: socket.socket, queue_size: int):
+        self.broker = broker
+        self.conn = conn
+        self.topics: set = set()
+        self.queue: "queue.Queue[bytes]" = queue.Queue(maxsize=queue_size)
+        self.alive = True
+        threading.Thread(target=self._send_loop, daemon=True).start()
+
+    def put(self, frame: bytes) -> bool:
+        """
+        Blocks while the queue is full (backpressure); drops a consumer that never catches up.
+        False if the frame wasn't queued because the subscriber is gone.
+        """
+        if not self.alive:
+            return False
+        try:
+            self.queue.put(frame, timeout=SLOW_CONSUMER_TIMEOUT)
+            return True
+        except queue.Full:
+            print("[MessageBus] Disconnecting slow subscriber")
+            self.close()
+            return False
+
+    def _send_loop(self):
+        while self.alive:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            try:
+                self.conn.sendall(frame)
+            except OSError:
+                self.close()
+
+    def close(self):
+        if self.alive:
+            self.alive = False
+            self.broker.unsubscribe(self)
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+
+
+class Broker:
+    def __init__(self, server: socket.socket, queue_size: int, lock_file=None):
+        self.server = server
+        self.queue_size = queue_size
+        self._lock_file = lock_file  # held for the broker's lifetime
+        self._lock = threading.Lock()  # guards _subs and _inboxes only; never held while delivering
+        self._subs: Dict[str, List[_Subscriber]] = defaultdict(list)
+        self._inboxes: Dict[str, "queue.Queue[tuple]"] = {}
+        # Owned by each topic's dispatcher thread:
+        self._retained: Dict[str, bytes] = {}
+        self._pending: Dict[str, deque] = defaultdict(deque)
+        self._seq: Dict[str, int] = defaultdict(int)
+        self._rr: Dict[str, int] = defaultdict(int)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket):
+        # Everything this broker writes to `conn` (messages, acks) goes through one subscriber queue.
+        subscriber: Optional[_Subscriber] = None
+        try:
+            for msg in _read_lines(conn):
+                op = msg.get("op")
+                if subscriber is None and (op == "sub" or msg.get("ack")):
+                    subscriber = _Subscriber(self, conn, self.queue_size)
+                if op == "pub":
+                    self.route(msg["topic"], msg["data"], subscriber if msg.get("ack") else None, msg.get("ack"))
+                elif op == "sub":
+                    self.subscribe(subscriber, msg["topics"])
+                elif op == "unsub" and subscriber is not None:
+                    self.leave(subscriber, msg["topics"], msg.get("ack"))
+        except (OSError, ValueError):
+            pass
+        finally:
+            if subscriber is not None:
+                subscriber.close()
+            else:
+                conn.close()
+
+    # Each topic has one dispatcher thread that applies subscribes, leaves and
+    # messages in arrival order, so every subscriber sees the same sequence.
+    # Callers only enqueue: a slow subscriber stalls its topic's dispatcher and,
+    # once the inbox is full, the publishers' reads (backpressure), but never a
+    # lock that other topics or connections need.
+    def _inbox(self, topic: str) -> "queue.Queue[tuple]":
+        with self._lock:
+            inbox = self._inboxes.get(topic)
+            if inbox is None:
+                inbox = self._inboxes[topic] = queue.Queue(maxsize=self.queue_size)
+                threading.Thread(target=self._dispatch, args=(topic, inbox), daemon=True).start()
+            return inbox
+
+    def subscribe(self, sub: _Subscriber, topics: List[str]):
+        for topic in topics:
+            self._inbox(topic).put(("sub", sub, None))
+
+    def leave(self, sub: _Subscriber, topics: List[str], ack: Optional[str] = None):
+        """Stop routing `topics` to `sub`; the ack follows every message already sent to it."""
+        for index, topic in enumerate(topics):
+            self._inbox(topic).put(("leave", sub, ack if index == len(topics) - 1 else None))
+
+    def unsubscribe(self, sub: _Subscriber):
+        with self._lock:
+            for topic in sub.topics:
+                if sub in self._subs[topic]:
+                    self._subs[topic].remove(sub)
+
+    def route(self, topic: str, data: Dict[str, Any], reply: Optional[_Subscriber] = None, ack: Optional[str] = None):
+        self._inbox(topic).put(("msg", data, (reply, ack) if reply is not None else None))
+
+    def _dispatch(self, topic: str, inbox: "queue.Queue[tuple]"):
+        while True:
+            kind, arg, extra = inbox.get()
+            try:
+                if kind == "msg":
+                    self._deliver(topic, arg, extra)
+                elif kind == "sub":
+                    self._add(topic, arg)
+                elif kind == "leave":
+                    with self._lock:
+                        arg.topics.discard(topic)
+                        if arg in self._subs[topic]:
+                            self._subs[topic].remove(arg)
+                    if extra:
+                        arg.put(_frame({"op": "ack", "id": extra}))
+            except Exception as e:
+                print(f"[MessageBus] {topic} dispatch failed: {e}")
+
+    def _add(self, topic: str, sub: _Subscriber):
+        with self._lock:
+            if not sub.alive:
+                return
+            sub.topics.add(topic)
+            self._subs[topic].append(sub)
+        retained = self._retained.get(topic)
+        if retained is not None:
+            sub.put(retained)
+        pending = self._pending[topic]
+        while pending and sub.alive:
+            sub.put(pending.popleft())
+
+    def _deliver(self, topic: str, data: Dict[str, Any], reply):
+        self._seq[topic] += 1
+        frame = _frame({"op": "msg", "topic": topic, "seq": self._seq[topic], "data": data})
+        with self._lock:
+            subs = [s for s in self._subs[topic] if s.alive]
+        if topic in RETAINED_TOPICS and data.get("final", True):
+            self._retained[topic] = frame  # a streamed chunk alone is meaningless to a late joiner
+        delivered = True
+        if topic in QUEUE_TOPICS:
+            delivered = False
+            while subs and not delivered:  # exactly one worker; skip ones that died meanwhile
+                sub = subs.pop(self._rr[topic] % len(subs))
+                self._rr[topic] += 1
+                delivered = sub.put(frame)
+            if not delivered:
+                pending = self._pending[topic]
+                if len(pending) >= PENDING_LIMIT:
+                    print(f"[MessageBus] Dropping oldest pending {topic} message")
+                    pending.popleft()
+                pending.append(frame)
+        else:
+            for sub in subs:
+                sub.put(frame)
+        if reply is not None:
+            subscriber, ack = reply
+            subscriber.put(_frame({"op": "ack", "id": ack, "delivered": delivered}))
+
+
+def _try_become_broker() -> Optional[Broker]:
+    bus = get_settings().bus
+    if HAS_UNIX:
+        directory = os.path.dirname(bus.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(bus.path + ".lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        if os.path.exists(bus.path):
+            os.unlink(bus.path)  # stale socket from a broker that died
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(bus.path)
+        server.listen(64)
+        return Broker(server, bus.queue_size, lock_file)
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        server.bind(("127.0.0.1", bus.port))
+    except OSError:
+        server.close()
+        return None
+    server.listen(64)
+    return Broker(server, bus.queue_size)
+
+# =========================
+# CLIENT
+# =========================
+_broker: Optional[Broker] = None
+
+
+class BusClient:
+    """One connection per process; thread-safe publish, callback-based subscribe."""
+
+    def __init__(self):
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._conn_lock = threading.Lock()
+        self._handlers: Dict[str, List[Callable[[Message], None]]] = defaultdict(list)
+        self._last: Dict[str, Message] = {}
+        self._reader: Optional[threading.Thread] = None
+        self._acks: Dict[str, list] = {}  # id -> [threading.Event, ack frame]
+
+    def _open(self) -> socket.socket:
+        bus = get_settings().bus
+        if HAS_UNIX:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(bus.path)
+        else:
+            sock = socket.create_connection(("127.0.0.1", bus.port), timeout=1.0)
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _connect(self, timeout: float = 5.0) -> socket.socket:
+        global _broker
+        with self._conn_lock:
+            if self._sock is not None:
+                return self._sock
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    self._sock = self._open()
+                    break
+                except OSError:
+                    if _broker is None:
+                        _broker = _try_become_broker()
+                        if _broker is not None:
+                            continue
+                    if time.monotonic() >= deadline:
+                        raise
+                    time.sleep(0.05)
+            if self._handlers:
+                self._sock.sendall(_frame({"op": "sub", "topics": list(self._handlers)}))
+                self._start_reader()
+            return self._sock
+
+    def _drop(self, sock: socket.socket):
+        with self._conn_lock:
+            if self._sock is sock:
+                self._sock = None
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def _send(self, obj: Dict[str, Any], timeout: float):
+        frame = _frame(obj)
+        for attempt in range(2):
+            sock = self._connect(timeout)
+            try:
+                with self._send_lock:
+                    sock.sendall(frame)
+                return
+            except OSError:
+                self._drop(sock)  # broker went away; reconnect (and maybe take over) once
+                if attempt:
+                    raise
+
+    def _send_acked(self, obj: Dict[str, Any], timeout: float) -> Optional[Dict[str, Any]]:
+        """Send `obj` asking the broker to confirm it; the ack frame, or None if none came within `timeout`."""
+        ack_id = uuid.uuid4().hex
+        waiter = self._acks[ack_id] = [threading.Event(), None]
+        try:
+            self._send({**obj, "ack": ack_id}, timeout)
+            self._start_reader()
+            waiter[0].wait(timeout)
+            return waiter[1]
+        finally:
+            self._acks.pop(ack_id, None)
+
+    def publish(self, message: Message, timeout: float = 5.0, ack: bool = False) -> Optional[bool]:
+        """
+        Send `message` to the broker. With `ack`, wait for the broker to route it and
+        return whether a subscriber got it (False: a work-queue item is held until a
+        worker subscribes), or None if the broker didn't answer within `timeout`.
+        """
+        data = {"op": "pub", "topic": message.topic, "data": asdict(message)}
+        if not ack:
+            self._send(data, timeout)
+            return None
+        reply = self._send_acked(data, timeout)
+        return None if reply is None else bool(reply.get("delivered"))
+
+    def subscribe(self, topic: Union[str, Type], callback: Callable[[Message], None]):
+        """Call `callback(message)` from the bus reader thread for every message on `topic`, in order."""
+        name = topic if isinstance(topic, str) else topic.topic
+        new_topic = name not in self._handlers
+        self._handlers[name].append(callback)
+        connected = self._sock is not None
+        sock = self._connect()  # a fresh connection subscribes to every handled topic itself
+        if new_topic and connected:
+            with self._send_lock:
+                sock.sendall(_frame({"op": "sub", "topics": [name]}))
+        self._start_reader()
+
+    def unsubscribe(self, topic: Union[str, Type], callback: Callable[[Message], None]):
+        """Stop calling `callback`; the connection stays subscribed for the process's other handlers."""
+        handlers = self._handlers.get(topic if isinstance(topic, str) else topic.topic, [])
+        if callback in handlers:
+            handlers.remove(callback)
+
+    def leave(self, topic: Union[str, Type], timeout: float = 5.0) -> bool:
+        """
+        Unsubscribe the connection from `topic` at the broker. Returns True once the
+        broker confirms; by then every message it routed here has been handed to the
+        topic's callbacks, so nothing sent to this process is still in flight.
+        """
+        name = topic if isinstance(topic, str) else topic.topic
+        try:
+            confirmed = self._send_acked({"op": "unsub", "topics": [name]}, timeout) is not None
+        except OSError:
+            confirmed = False
+        self._handlers.pop(name, None)
+        return confirmed
+
+    def last(self, topic: Union[str, Type]) -> Optional[Message]:
+        """Most recent message seen on a subscribed topic."""
+        return self._last.get(topic if isinstance(topic, str) else topic.topic)
+
+    def _start_reader(self):
+        if self._reader is None or not self._reader.is_alive():
+            self._reader = threading.Thread(target=self._read_loop, daemon=True)
+            self._reader.start()
+
+    def _read_loop(self):
+        while True:
+            sock = self._sock
+            if sock is None:
+                try:
+                    sock = self._connect()
+                except OSError:
+                    time.sleep(1.0)
+                    continue
+            try:
+                for msg in _read_lines(sock):
+                    if msg.get("op") == "ack":
+                        waiter = self._acks.get(msg.get("id"))
+                        if waiter is not None:
+                            waiter[1] = msg
+                            waiter[0].set()
+                        continue
+                    cls = TOPICS.get(msg.get("topic"))
+                    if cls is None:
+                        continue
+                    message = cls(**msg["data"])
+                    self._last[cls.topic] = message
+                    for handler in list(self._handlers.get(cls.topic, [])):
+                        try:
+                            handler(message)
+                        except Exception as e:
+                            print(f"[MessageBus] {cls.topic} handler failed: {e}")
+            except (OSError, ValueError):
+                pass
+            self._drop(sock)  # broker gone: reconnect, re-subscribe, possibly become the broker
+
+
+_client = Lazy(BusClient)
+
+
+def get_bus() -> BusClient:
+    return _client.get()
+
+
+def publish(message: Message):
+    """Publish without ever failing the caller (the GUI may simply not be running)."""
+    try:
+        get_bus().publish(message)
+    except OSError as e:
+        print(f"[MessageBus] Could not publish {message.topic}: {e}")
+
+
+def SetAssistantStatus(Status: str):
+    publish(AssistantStatus(text=Status))
+
+
+def ShowTextToScreen(Text: str, message_id: str = "", final: bool = True):
+    publish(Response(text=Text, message_id=message_id, final=final))
+
+
+def SetMicrophoneStatus(active: bool):
+    publish(MicState(active=active))
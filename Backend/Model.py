@@ -1,15 +1,10 @@
-import cohere  # Import the Cohere library for AI services.
 from rich import print  # Import the Rich Library to enhance terminal outputs.
-from dotenv import dotenv_values  # Import dotenv to load environment variables from a .env file.
-
-# Load environment variables from the .env file.
-env_vars = dotenv_values(".env")
-
-# Retrieve API key.
-CohereAPIKey = env_vars.get("CohereAPIKey")
-
-# Create a Cohere client using the provided API key.
-co = cohere.Client(api_key=CohereAPIKey)
+import json
+import threading
+import time
+from typing import List, Optional
+from .Settings import get_settings  # Shared typed settings (.env parsed once).
+from . import LLMGateway  # Shared Cohere client (built on first use), timeouts and usage accounting.
 
 # Define a list of recognized function keywords for task categorization.
 funcs = [
@@ -18,9 +13,6 @@ funcs = [
     "youtube search", "reminder"
 ]
 
-# Initialize an empty list to store user messages.
-messages = []
-
 # Define the preamble that guides the AI model on how to categorize queries.
 preamble = """
 You are a very accurate Decision-Making Model, which decides what kind of a query is given to you.
@@ -74,33 +66,8 @@ def normalize_chat_history(history):
     return fixed
 
 
-# Define the main function for decision-making on queries.
-def FirstLayerDMM(prompt: str = "test"):
-    # Add the user's query to the messages list.
-    messages.append({"role": "user", "content": f"{prompt}"})
-    # Prevent messages from growing too large
-    if len(messages) > 50:
-        del messages[:-50]
-
-    # Create a streaming chat session with the Cohere model.
-    stream = co.chat_stream(
-        model='command-a-03-2025',  # Specify the Cohere model to use.
-        message=prompt,          # Pass the user's query.
-        temperature=0.7,         # Set the creativity level of the model.
-        chat_history=normalize_chat_history(ChatHistory),  # Ensured role formatting
-        prompt_truncation='OFF',  # Ensure the prompt is not truncated.
-        connectors=[],            # No additional connectors are used.
-        preamble=preamble        # Pass the detailed instruction preamble.
-    )
-
-    # Initialize an empty string to store the generated response.
-    response = ""
-
-    # Iterate over events in the stream and capture text generation events.
-    for event in stream:
-        if event.event_type == "text-generation":
-            response += event.text  # Append generated text to the response.
-
+# Turn the model's reply into the list of recognized tasks.
+def ParseDecision(response: str):
     # Remove newline characters and split responses into individual tasks.
     response = response.replace("\n", "")
     response = response.split(",")
@@ -108,25 +75,154 @@ def FirstLayerDMM(prompt: str = "test"):
     # Strip leading and trailing whitespaces from each task.
     response = [i.strip() for i in response]
 
-    # Initialize an empty list to filter valid tasks.
-    temp = []
-
     # Filter the tasks based on recognized function keywords.
+    temp = []
     for task in response:
         for func in funcs:
             if task.startswith(func):
                 temp.append(task)  # Add valid tasks to the filtered list.
+    return temp
+
+# Decide one query with its own Cohere call.
+def SingleDecision(prompt: str = "test"):
+    settings = get_settings().decision
+
+    # Stream a chat with the Cohere model; the gateway concatenates the generated text.
+    response = LLMGateway.cohere_chat(
+        "decision",
+        prompt,                   # Pass the user's query.
+        model=settings.model,     # Specify the Cohere model to use.
+        timeout=settings.timeout,
+        temperature=settings.temperature,  # Set the creativity level of the model.
+        chat_history=normalize_chat_history(ChatHistory),  # Ensured role formatting
+        prompt_truncation='OFF',  # Ensure the prompt is not truncated.
+        connectors=[],            # No additional connectors are used.
+        preamble=preamble        # Pass the detailed instruction preamble.
+    ).text
 
-    # Update the response with the filtered list of tasks.
-    response = temp
+    response = ParseDecision(response)
 
     # If "(query)" is in the response, recursively call the function for further clarification.
     if "(query)" in response:
-        newresponse = FirstLayerDMM(prompt=prompt)
+        newresponse = SingleDecision(prompt=prompt)
         return newresponse  # Return the clarified response.
     else:
         return response  # Return the filtered response.
 
+# First line of a batched classification message (the benchmark's fake Cohere recognizes it).
+BATCH_HEADER = "Decide each of these numbered queries separately, exactly as you would decide it alone."
+
+# Decide several queries with one Cohere call; None for any query the reply doesn't cover.
+def BatchDecision(prompts: List[str]) -> List[Optional[list]]:
+    settings = get_settings().decision
+    message = (
+        f"{BATCH_HEADER} Reply with only a JSON object that maps each query number to your response for that query, "
+        'like {"1": "general who was akbar?", "2": "open chrome, open firefox"}.\n'
+        + "\n".join(f"{n}. {' '.join(prompt.split())}" for n, prompt in enumerate(prompts, 1))
+    )
+    text = LLMGateway.cohere_chat(
+        "decision",
+        message,
+        model=settings.model,
+        stream=False,
+        timeout=settings.timeout,
+        temperature=settings.temperature,
+        chat_history=normalize_chat_history(ChatHistory),
+        prompt_truncation='OFF',
+        connectors=[],
+        preamble=preamble
+    ).text
+    start, end = text.find("{"), text.rfind("}")
+    try:
+        answers = json.loads(text[start:end + 1]) if 0 <= start < end else {}
+    except ValueError:
+        answers = {}
+    if not isinstance(answers, dict):
+        answers = {}
+
+    results = []
+    for n in range(1, len(prompts) + 1):
+        answer = answers.get(str(n))
+        results.append((ParseDecision(answer) or None) if isinstance(answer, str) else None)
+    return results
+
+
+class DecisionBatcher:
+    """
+    Micro-batching for FirstLayerDMM. Under load many /chat requests classify
+    within a few milliseconds of each other, and each Cohere call repeats the
+    same ~4 KB preamble and few-shot history. The first caller of a batch waits up
+    to DecisionBatchWindowMs (or until DecisionBatchSize callers have joined), then
+    classifies them all in one call and hands each caller its own result. A caller
+    alone in its window, or whose item the batched reply doesn't cover, gets the
+    usual single call.
+    """
+
+    class _Pending:
+        def __init__(self, prompt: str):
+            self.prompt = prompt
+            self.result: Optional[list] = None
+            self.done = threading.Event()
+            self.wake = threading.Event()  # set when done, or when promoted to lead the next batch
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending: List["DecisionBatcher._Pending"] = []
+
+    def decide(self, prompt: str) -> list:
+        settings = get_settings().decision
+        size = max(2, settings.batch_size)
+        item = self._Pending(prompt)
+        with self._cond:
+            self._pending.append(item)
+            leader = len(self._pending) == 1
+            if len(self._pending) >= size:
+                self._cond.notify_all()
+
+        if not leader:
+            item.wake.wait()
+        if not item.done.is_set():
+            self._lead(size, settings.batch_window_ms / 1000.0)
+        item.done.wait()
+        return item.result if item.result is not None else SingleDecision(prompt)
+
+    def _lead(self, size: int, window: float):
+        deadline = time.monotonic() + window
+        with self._cond:
+            while len(self._pending) < size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            # Callers can join between the notify and this swap: take at most `size`,
+            # and the oldest caller left behind leads the next batch.
+            batch, self._pending = self._pending[:size], self._pending[size:]
+            if self._pending:
+                self._pending[0].wake.set()
+        self._run(batch)
+
+    @staticmethod
+    def _run(batch):
+        try:
+            if len(batch) > 1:
+                for item, result in zip(batch, BatchDecision([item.prompt for item in batch])):
+                    item.result = result
+        except Exception as e:
+            print(f"[Model] Batched decision failed, deciding one by one: {e}")
+        finally:
+            for item in batch:
+                item.done.set()
+                item.wake.set()
+
+
+batcher = DecisionBatcher()
+
+# Define the main function for decision-making on queries.
+def FirstLayerDMM(prompt: str = "test"):
+    if get_settings().decision.batching:
+        return batcher.decide(prompt)
+    return SingleDecision(prompt)
+
 # Entry point for the script.
 if __name__ == "__main__":
     # Continuously prompt the user for input and process it.
@@ -0,0 +1,102 @@
+# ModelRouter.py
+"""
+Picks the model and token ceiling for each chat and realtime turn.
+
+A short conversational turn ("thanks", "how are you?") doesn't need the
+primary model or a 1024-token budget. A general query of at most
+ModelRoutingFastMaxWords words, with none of the ModelRoutingDetailKeywords
+("explain", "write", "step by step", ...), goes to the fast tier
+(ModelRoutingFastModel, ModelRoutingFastMaxTokens). Everything else uses the
+primary model of its category (ChatModel / RealtimeModel) with its configured
+ceiling. Realtime turns always use the primary model, because it has to work
+through the search results, but short ones get ModelRoutingBriefMaxTokens.
+
+Routing also looks at how models have been doing lately in this worker
+(LLMGateway.model_health). A model is unhealthy when at least
+ModelRoutingMinSamples calls of the last ModelRoutingHealthWindow seconds give
+a median time to first token above ModelRoutingSlowMs, or an error rate above
+ModelRoutingMaxErrorRate. An unhealthy fast tier falls back to the primary
+model. An unhealthy primary is replaced by ModelRoutingFallbackModel. The
+fallback is also passed to the gateway, which retries on it when a call fails
+before its first token.
+
+A model that gets no traffic gets no new samples, so an unhealthy one still
+gets one turn every ModelRoutingProbeInterval seconds. A turn that succeeds
+there brings its numbers back down; a failing one is retried on the fallback.
+Once its bad calls age out of the window the model is healthy again anyway.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .KeywordRouter import KeywordMatcher, tokenize
+from .Lazy import Lazy
+from .LLMGateway import model_health
+from .Settings import get_settings, on_reload
+
+
+@dataclass(frozen=True)
+class ModelChoice:
+    model: str
+    max_tokens: int
+    tier: str                # "fast", "primary" or "fallback"
+    fallback: Optional[str]  # retried on when the call fails before its first token
+
+
+def _make_detail_matcher() -> KeywordMatcher:
+    phrases = get_settings().model_routing.detail_keywords.split(",")
+    return KeywordMatcher({"detail": [p.strip() for p in phrases if p.strip()]})
+
+
+_detail = Lazy(_make_detail_matcher)
+_probe_lock = threading.Lock()
+_last_probe: Dict[str, float] = {}  # model -> monotonic time of its last trial turn while unhealthy
+on_reload(lambda old, new: _detail.reset() if old.model_routing != new.model_routing else None)
+
+
+def is_brief(query: str) -> bool:
+    """A short turn that asks for no explanation or long output."""
+    settings = get_settings().model_routing
+    return len(tokenize(query)) <= settings.fast_max_words and not _detail.get().scan(query)
+
+
+def healthy(model: str) -> bool:
+    settings = get_settings().model_routing
+    health = model_health(model, settings.health_window)
+    if health.samples < settings.min_samples or (
+            health.error_rate <= settings.max_error_rate and
+            (health.latency_ms is None or health.latency_ms <= settings.slow_ms)):
+        _last_probe.pop(model, None)
+        return True
+    return _probe(model, settings.probe_interval)
+
+
+def _probe(model: str, interval: float) -> bool:
+    """True for one caller per `interval` seconds, so an unhealthy model gets a trial turn."""
+    now = time.monotonic()
+    with _probe_lock:
+        if now - _last_probe.setdefault(model, now) < interval:  # the first trial comes `interval` after the first miss
+            return False
+        _last_probe[model] = now
+        return True
+
+
+def choose(category: str, query: str) -> ModelChoice:
+    """Model tier and token ceiling for a "chat" or "realtime" turn about `query`."""
+    settings = get_settings()
+    routing = settings.model_routing
+    primary = settings.realtime if category == "realtime" else settings.chat
+    fallback = routing.fallback_model if routing.fallback_model != primary.model else None
+    if not routing.enabled:
+        return ModelChoice(primary.model, primary.max_tokens, "primary", None)
+
+    brief = is_brief(query)
+    if category == "chat" and brief and healthy(routing.fast_model):
+        return ModelChoice(routing.fast_model, min(routing.fast_max_tokens, primary.max_tokens), "fast", primary.model)
+
+    max_tokens = min(routing.brief_max_tokens, primary.max_tokens) if brief else primary.max_tokens
+    if fallback and not healthy(primary.model) and healthy(fallback):
+        return ModelChoice(fallback, max_tokens, "fallback", primary.model)
+    return ModelChoice(primary.model, max_tokens, "primary", fallback)
@@ -0,0 +1,216 @@
+# PageFetcher.py
+"""
+Page text for realtime answers, fetched within a fixed latency budget.
+
+Search result titles and descriptions are often too thin to answer from, so
+GoogleSearch also passes the main text of the top PageFetchPages result pages.
+Fetching them one after another would add several round trips to every
+realtime turn. Instead all of them are requested at once from a shared pool of
+PageFetchWorkers threads, on one keep-alive `requests` session. The turn waits
+for them until PageFetchDeadline seconds have passed in total. Pages that
+aren't back by then are left out of this answer. They keep downloading in the
+background, so the next question about the same results finds them in the
+cache.
+
+Main text comes from a stdlib HTMLParser pass. Scripts, styles, navigation,
+headers, footers, sidebars and forms are skipped. When the page has an
+<article> or <main> element, only the text inside it is kept. Bodies are
+streamed: anything that isn't HTML or text is skipped from its headers alone,
+and only the first PageFetchMaxBytes of a page are downloaded and parsed. The text is then cut on a word
+boundary to PageFetchTokenBudget tokens, at about four characters per token.
+
+Extracted text is cached by URL in the state backend for PageFetchCacheTTL
+seconds, so every worker shares it. Pages that fail to load aren't cached and
+are tried again next time.
+"""
+
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+from .Lazy import Lazy
+from .Settings import get_settings, on_reload
+from .State import get_state
+
+CHARS_PER_TOKEN = 4
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+SKIP_TAGS = frozenset(["script", "style", "noscript", "template", "svg", "iframe", "nav", "header", "footer",
+                       "aside", "form", "button", "select"])
+MAIN_TAGS = frozenset(["article", "main"])
+BLOCK_TAGS = frozenset(["p", "div", "section", "article", "main", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5",
+                        "h6", "blockquote", "pre", "table", "tr", "td", "th", "dd", "dt", "br", "figcaption"])
+VOID_TAGS = frozenset(["br", "img", "hr", "input", "meta", "link", "area", "base", "col", "embed", "source",
+                       "track", "wbr"])
+MIN_BLOCK_WORDS = 4  # shorter blocks are mostly menus, buttons and bylines
+CHUNK_SIZE = 16384
+
+
+class MainTextParser(HTMLParser):
+    """Collects text blocks outside skipped elements, noting which are inside <article>/<main>."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._skip = 0
+        self._main = 0
+        self._parts: List[str] = []
+        self.blocks: List[str] = []
+        self.main_blocks: List[str] = []
+
+    def _flush(self):
+        text = " ".join(" ".join(self._parts).split())
+        self._parts = []
+        if len(text.split()) >= MIN_BLOCK_WORDS:
+            self.blocks.append(text)
+            if self._main:
+                self.main_blocks.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            if tag == "br":
+                self._flush()
+            return
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        if tag in MAIN_TAGS:
+            self._main += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in BLOCK_TAGS:
+            self._flush()
+        if tag in MAIN_TAGS:
+            self._main = max(0, self._main - 1)
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._parts.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def extract_text(html: str) -> str:
+    """The readable main text of an HTML page, one block per line."""
+    parser = MainTextParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:  # malformed markup: keep what was parsed so far
+        pass
+    return "\n".join(parser.main_blocks or parser.blocks)
+
+
+def truncate(text: str, tokens: int) -> str:
+    """`text` cut on a word boundary to roughly `tokens` tokens."""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    space = max(cut.rfind(" "), cut.rfind("\n"))
+    return (cut[:space] if space > limit // 2 else cut).rstrip() + " ..."
+
+
+def _make_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=max(1, get_settings().page_fetch.workers), thread_name_prefix="page-fetch")
+
+
+def _make_session():
+    import requests
+    session = requests.Session()
+    session.headers.update({"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml"})
+    return session
+
+
+_pool = Lazy(_make_pool)
+_session = Lazy(_make_session)
+
+
+def _on_reload(old, new):
+    if old.page_fetch.workers != new.page_fetch.workers:
+        _pool.reset()  # the old pool finishes its fetches and is collected
+
+
+on_reload(_on_reload)
+
+
+def _cache_key(url: str) -> str:
+    return "page:" + hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def _read(response, max_bytes: int, deadline: float) -> bytes:
+    """At most `max_bytes` of the body, stopping when the wall-clock `deadline` (monotonic) passes."""
+    chunks: List[bytes] = []
+    size = 0
+    for chunk in response.iter_content(CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes or time.monotonic() >= deadline:
+            break
+    return b"".join(chunks)[:max_bytes]
+
+
+def _decode(raw: bytes, response) -> str:
+    # requests falls back to ISO-8859-1 for text/* without a charset, which garbles UTF-8 pages.
+    declared = "charset=" in response.headers.get("Content-Type", "").lower()
+    encoding = response.encoding if declared else None
+    if encoding is None:
+        try:
+            return raw.decode("utf-8")
+        except UnicodeDecodeError:
+            encoding = getattr(response, "apparent_encoding", None) or "utf-8"
+    return raw.decode(encoding, "replace")
+
+
+def _fetch(url: str) -> Optional[str]:
+    """Download, extract, truncate and cache one page; None if it couldn't be loaded."""
+    settings = get_settings().page_fetch
+    # `timeout` bounds each socket read, not the whole download; the read loop checks the total.
+    deadline = time.monotonic() + settings.deadline
+    try:
+        with _session.get().get(url, timeout=settings.deadline, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "text/html")
+            if "html" not in content_type and "text" not in content_type:
+                text = ""  # a PDF, image, video, ...: not downloaded, but worth remembering
+            else:
+                raw = _read(response, settings.max_bytes, deadline)
+                text = truncate(extract_text(_decode(raw, response)), settings.token_budget)
+    except Exception as e:
+        print(f"[PageFetcher] {url}: {e}")
+        return None
+    get_state().set(_cache_key(url), text, ttl=settings.cache_ttl)
+    return text
+
+
+def fetch_pages(urls: List[str]) -> Dict[str, str]:
+    """
+    Main text of each page in `urls` that is cached or arrives within
+    PageFetchDeadline seconds, by URL. Pages that failed, timed out or had no
+    text are missing.
+    """
+    settings = get_settings().page_fetch
+    start = time.monotonic()
+    state = get_state()
+    pages: Dict[str, str] = {}
+    pending = {}
+    for url in dict.fromkeys(urls):  # unique, in order
+        cached = state.get(_cache_key(url))
+        if cached is not None:
+            pages[url] = cached
+        else:
+            pending[_pool.get().submit(_fetch, url)] = url
+
+    if pending:
+        done, _ = wait(pending, timeout=max(0.0, settings.deadline - (time.monotonic() - start)))
+        for future in done:
+            text = future.result()
+            if text is not None:
+                pages[pending[future]] = text
+    return {url: pages[url] for url in dict.fromkeys(urls) if pages.get(url)}
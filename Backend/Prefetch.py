@@ -0,0 +1,268 @@
+# Prefetch.py
+"""
+Search results for popular realtime queries, refreshed before users ask.
+
+Most realtime traffic is a handful of questions asked again and again ("what
+is today's news?", "today's headlines"). Each one used to scrape Google while
+the user waited. Now:
+
+- Search results are cached in the state backend for SearchCacheTTL seconds,
+  keyed by the query's words (case and punctuation don't matter). A realtime
+  turn searches only when the cache has nothing fresh.
+- Every realtime turn is counted in this worker's `HotQueries`. Counts decay
+  with a half-life of PrefetchHalfLife seconds, so yesterday's burst doesn't
+  stay hot. At most PrefetchMaxTracked queries are tracked; the coldest one
+  makes room for a new one.
+- `PrefetchScheduler` wakes every PrefetchCheckInterval seconds. It refreshes
+  the PrefetchTopQueries hottest queries (with a decayed count of at least
+  PrefetchMinHits) whose results are older than PrefetchRefreshInterval. A
+  refresh runs the search again and warms the page text cache (PageFetcher).
+  With PrefetchDrafts on, it also writes a draft answer, which realtime turns
+  for that query return while it is fresh instead of calling the model.
+- Background work is capped at PrefetchMaxCallsPerHour upstream calls per
+  worker. A search, each page fetched and a draft answer count as one call
+  each. Refreshes that don't fit wait for the next pass.
+
+Keep PrefetchRefreshInterval below SearchCacheTTL, or hot queries will miss
+the cache between refreshes. `stats()` backs GET /prefetch.
+"""
+
+import hashlib
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .KeywordRouter import tokenize
+from .Lazy import Lazy
+from .Settings import get_settings, on_reload
+from .State import get_state, is_isolated
+
+COUNTERS = ("cache_hits", "searches", "refreshes", "drafts", "drafts_served", "skipped_budget", "errors")
+
+
+def normalize(query: str) -> str:
+    """Lowercase words only, so "What is today's news?" and "what is todays news" share an entry."""
+    return " ".join(tokenize(query.replace("'", "").replace("\u2019", "")))
+
+
+def _key(kind: str, query: str) -> str:
+    return f"{kind}:" + hashlib.sha1(normalize(query).encode("utf-8")).hexdigest()
+
+
+_lock = threading.Lock()
+_counts: Dict[str, int] = {name: 0 for name in COUNTERS}
+
+
+def _count(name: str, amount: int = 1):
+    with _lock:
+        _counts[name] += amount
+
+
+# =========================
+# SEARCH CACHE
+# =========================
+def _search(query: str) -> List[Dict[str, str]]:
+    from googlesearch import search
+    results = search(query, advanced=True, num_results=get_settings().realtime.search_results)
+    return [{"title": r.title, "description": r.description, "url": getattr(r, "url", "") or ""} for r in results]
+
+
+def search_results(query: str, max_age: Optional[float] = None) -> List[Dict[str, str]]:
+    """
+    Search results for `query` (title, description, url), from the cache when
+    they are at most `max_age` seconds old (SearchCacheTTL by default).
+    """
+    ttl = get_settings().prefetch.search_ttl
+    max_age = ttl if max_age is None else max_age
+    state = get_state()
+    if ttl > 0 and max_age > 0:
+        cached = state.get(_key("search", query))
+        if cached is not None and time.time() - cached["at"] <= max_age:
+            _count("cache_hits")
+            return cached["results"]
+    results = _search(query)
+    _count("searches")
+    if ttl > 0:
+        state.set(_key("search", query), {"at": time.time(), "results": results}, ttl=ttl)
+    return results
+
+
+def _search_age(query: str) -> Optional[float]:
+    cached = get_state().get(_key("search", query))
+    return None if cached is None else time.time() - cached["at"]
+
+
+def draft_answer(query: str) -> Optional[str]:
+    """A fresh background-written answer to `query`, if PrefetchDrafts is on and there is one."""
+    if not get_settings().prefetch.drafts:
+        return None
+    draft = get_state().get(_key("draft", query))
+    if draft is not None:
+        _count("drafts_served")
+    return draft
+
+
+# =========================
+# HOT QUERIES
+# =========================
+class HotQueries:
+    """Exponentially decayed counts of realtime queries, by normalized query."""
+
+    def __init__(self, half_life: float, capacity: int):
+        self.half_life = max(1.0, half_life)
+        self.capacity = max(1, capacity)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[str, float, float]] = {}  # key -> (query as asked, score, updated at)
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        return score * 0.5 ** ((now - updated) / self.half_life)
+
+    def record(self, query: str, now: Optional[float] = None):
+        key = normalize(query)
+        if not key:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and len(self._entries) >= self.capacity:
+                coldest = min(self._entries, key=lambda k: self._decayed(*self._entries[k][1:], now))
+                del self._entries[coldest]
+            score = self._decayed(entry[1], entry[2], now) if entry else 0.0
+            self._entries[key] = (query.strip(), score + 1.0, now)
+
+    def top(self, limit: int, min_score: float = 0.0, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Up to `limit` (query, decayed count) pairs scoring at least `min_score`, hottest first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            scored = [(query, round(self._decayed(score, updated, now), 2))
+                      for query, score, updated in self._entries.values()]
+        scored = [(query, score) for query, score in scored if score >= min_score]
+        return sorted(scored, key=lambda item: -item[1])[:limit]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def _make_hot() -> HotQueries:
+    settings = get_settings().prefetch
+    return HotQueries(settings.half_life, settings.max_tracked)
+
+
+_hot = Lazy(_make_hot)
+
+
+def _on_reload(old, new):
+    if _hot.loaded and old.prefetch != new.prefetch:  # keep the counts, apply the new limits
+        hot = _hot.get()
+        hot.half_life, hot.capacity = max(1.0, new.prefetch.half_life), max(1, new.prefetch.max_tracked)
+
+
+on_reload(_on_reload)
+
+
+def record(query: str):
+    """Count a realtime turn for `query`; batch runs (State.isolated_history) don't count."""
+    if not is_isolated():
+        _hot.get().record(query)
+
+
+# =========================
+# SCHEDULER
+# =========================
+class PrefetchScheduler:
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._calls: Deque[float] = deque()  # times of background upstream calls in the last hour
+        self.last_run: Optional[float] = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(max(1.0, get_settings().prefetch.check_interval)):
+            if not get_settings().prefetch.enabled:
+                continue
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[Prefetch] Pass failed: {e}")
+
+    def _expire(self):
+        cutoff = time.time() - 3600
+        while self._calls and self._calls[0] < cutoff:
+            self._calls.popleft()
+
+    def calls_last_hour(self) -> int:
+        with self._lock:
+            self._expire()
+            return len(self._calls)
+
+    def _spend(self, cost: int) -> bool:
+        with self._lock:
+            self._expire()
+            if len(self._calls) + cost > get_settings().prefetch.max_calls_per_hour:
+                return False
+            self._calls.extend([time.time()] * cost)
+            return True
+
+    def run_once(self) -> int:
+        """Refresh the hot queries that are due; returns how many were refreshed."""
+        settings = get_settings()
+        self.last_run = time.time()
+        refreshed = 0
+        for query, _ in _hot.get().top(settings.prefetch.top, settings.prefetch.min_hits):
+            age = _search_age(query)
+            if age is not None and age < settings.prefetch.refresh_interval:
+                continue
+            cost = 1 + max(0, settings.page_fetch.pages) + (1 if settings.prefetch.drafts else 0)
+            if not self._spend(cost):
+                _count("skipped_budget")
+                break
+            try:
+                self.refresh(query)
+                refreshed += 1
+            except Exception as e:
+                _count("errors")
+                print(f"[Prefetch] Refresh of {query!r} failed: {e}")
+        return refreshed
+
+    def refresh(self, query: str):
+        from .PageFetcher import fetch_pages
+        settings = get_settings()
+        results = search_results(query, max_age=0)
+        if settings.page_fetch.pages > 0:
+            fetch_pages([r["url"] for r in results[:settings.page_fetch.pages] if r["url"]])
+        if settings.prefetch.drafts:
+            from .RealtimeSearchEngine import DraftAnswer
+            get_state().set(_key("draft", query), DraftAnswer(query),
+                            ttl=settings.prefetch.refresh_interval + settings.prefetch.check_interval)
+            _count("drafts")
+        _count("refreshes")
+
+
+_scheduler = Lazy(PrefetchScheduler)
+
+
+def get_scheduler() -> PrefetchScheduler:
+    return _scheduler.get()
+
+
+def stats() -> Dict[str, Any]:
+    settings = get_settings().prefetch
+    scheduler = _scheduler.get()
+    with _lock:
+        counts = dict(_counts)
+    return {**counts, "enabled": settings.enabled, "tracked": len(_hot.get()),
+            "hot": [{"query": q, "score": s} for q, s in _hot.get().top(settings.top, settings.min_hits)],
+            "calls_last_hour": scheduler.calls_last_hour(), "max_calls_per_hour": settings.max_calls_per_hour,
+            "last_run": scheduler.last_run}
@@ -1,41 +1,32 @@
-from googlesearch import search
-from groq import Groq  # Importing the Groq library to use its API.
-from json import load, dump  # Importing functions to read and write JSON files.
 import datetime  # Importing the datetime module for real-time date and time information.
-from dotenv import dotenv_values  # Importing dotenv values to read environment variables from a .env file.
-
-# Load environment variables from the .env file.
-env_vars = dotenv_values(".env")
-
-# Retrieve environment variables for the chatbot configuration.
-Username = env_vars.get("Username")
-Assistantname = env_vars.get("Assistantname")
-GroqAPIKey = env_vars.get("GroqAPIKey")
-
-# Initialize the Groq client with the provided API key.
-client = Groq(api_key=GroqAPIKey)
+from .State import load_history, append_history  # Conversation history shared by all workers.
+from .Settings import get_settings  # Shared typed settings (.env parsed once).
+from . import LLMGateway  # Shared Groq client, streaming and usage accounting.
+from .ModelRouter import choose  # Model and token ceiling for this turn.
+from .PageFetcher import fetch_pages  # Main text of the top result pages, within a fixed deadline.
+from . import Prefetch  # Cached search results and hot-query tracking.
 
 # Define a system message that provides context to the AI chatbot about its role and behavior.
-
-System = f"""Hello, I am {Username}, You are a very accurate and advanced AI chatbot named {Assistantname} which has real-time up-to-date information from the internet.
+def SystemPrompt():
+    identity = get_settings().identity
+    return f"""Hello, I am {identity.username}, You are a very accurate and advanced AI chatbot named {identity.assistant_name} which has real-time up-to-date information from the internet.
 *** Provide Answers In a Professional Way, make sure to add full stops, commas, question marks, and use proper grammar.***
 *** Just answer the question from the provided data in a professional way. ***"""
 
-# Try to load the chat log from a JSON file, or create an empty one if it doesn't exist.
-try:
-    with open(r"Data\ChatLog.json", "r") as f:
-        messages = load(f)
-except:
-    with open(r"Data\ChatLog.json", "w") as f:
-        dump([], f)
-
 # Function to perform a Google search and format the results.
 def GoogleSearch(query):
-    results = list(search(query, advanced=True, num_results=5))
+    results = Prefetch.search_results(query)  # cached for SearchCacheTTL seconds
     Answer = f"The search results for '{query}' are:\n[start]\n"
 
+    # Fetch the top result pages concurrently; pages that miss the deadline are left out.
+    pages_wanted = get_settings().page_fetch.pages
+    pages = fetch_pages([i["url"] for i in results[:pages_wanted] if i["url"]]) if pages_wanted > 0 else {}
+
     for i in results:
-        Answer += f"Title: {i.title}\nDescription: {i.description}\n\n"
+        Answer += f"Title: {i['title']}\nDescription: {i['description']}\n"
+        if pages.get(i["url"]):
+            Answer += f"Page content: {pages[i['url']]}\n"
+        Answer += "\n"
 
     Answer += "[end]"
     return Answer
@@ -48,11 +39,12 @@ def AnswerModifier(Answer):
     return modified_answer
 
 # Predefined chatbot conversation system message and an initial user message.
-SystemChatBot = [
-    {"role": "system", "content": System},
-    {"role": "user", "content": "Hi"},
-    {"role": "assistant", "content": "Hello, how can I help you?"}
-]
+def SystemChatBot():
+    return [
+        {"role": "system", "content": SystemPrompt()},
+        {"role": "user", "content": "Hi"},
+        {"role": "assistant", "content": "Hello, how can I help you?"}
+    ]
 
 # Function to get real-time information like the current date and time.
 def Information():
@@ -74,48 +66,64 @@ def Information():
     return data
 
 # Function to handle real-time search and response generation.
-def RealtimeSearchEngine(prompt):
-    global SystemChatBot, messages
-
-    # Load the chat log from the JSON file.
-    with open(r"Data\ChatLog.json", "r") as f:
-        messages = load(f)
-    messages.append({"role": "user", "content": f"{prompt}"})
-
-    # Add Google search results to the system chatbot messages.
-    SystemChatBot.append({"role": "system", "content": GoogleSearch(prompt)})
-
-    # Generate a response using the Groq client.
-    completion = client.chat.completions.create(
-        model="meta-llama/llama-4-scout-17b-16e-instruct", # Specify the Groq model to use.
-        messages=SystemChatBot + [{"role": "system", "content": Information()}] + messages,
-        temperature=0.7,
-        max_tokens=2048,
-        top_p=1,
-        stream=True,
-        stop=None
+def RealtimeSearchEngine(prompt, on_token=None):
+    """`on_token(text)` is called with each streamed chunk as it arrives."""
+    # Count the query for background prefetching, and use a fresh pre-written answer if there is one.
+    Prefetch.record(prompt)
+    user_message = {"role": "user", "content": f"{prompt}"}
+    Draft = Prefetch.draft_answer(prompt)
+    if Draft:
+        if on_token:
+            on_token(Draft)
+        append_history([user_message, {"role": "assistant", "content": Draft}])
+        return AnswerModifier(Draft)
+
+    # Load the chat log from the state backend.
+    messages = load_history()
+    messages.append(user_message)
+
+    # Add Google search results to this request's system messages.
+    system_msgs = SystemChatBot() + [{"role": "system", "content": GoogleSearch(prompt)}]
+
+    # Generate a response through the shared LLM gateway, streaming chunks to on_token.
+    settings = get_settings().realtime
+    route = choose("realtime", prompt)
+    completion = LLMGateway.stream_chat(
+        "realtime",
+        system_msgs + [{"role": "system", "content": Information()}] + messages,
+        model=route.model, # The Groq model picked for this turn.
+        temperature=settings.temperature,
+        max_tokens=route.max_tokens,
+        top_p=settings.top_p,
+        on_token=on_token,
+        fallback_model=route.fallback,
     )
 
-    Answer = ""
-
-    # Concatenate response chunks from the streaming output.
-    for chunk in completion:
-        if chunk.choices[0].delta.content:
-            Answer += chunk.choices[0].delta.content
-
     # Clean up the response.
-    Answer = Answer.strip().replace("</s>", "")
-    messages.append({"role": "assistant", "content": Answer})
-
-    # Save the updated chat log back to the JSON file.
-    with open(r"Data\ChatLog.json", "w") as f:
-        dump(messages, f, indent=4)
+    Answer = completion.text.strip()
 
-    # Remove the most recent system message from the chatbot conversation.
-    SystemChatBot.pop()
+    # Save the updated chat log back to the state backend.
+    append_history([user_message, {"role": "assistant", "content": Answer}])
 
     return AnswerModifier(Answer)
 
+# Background answer for a hot query (Prefetch): no chat history, nothing streamed or saved.
+def DraftAnswer(prompt):
+    settings = get_settings().realtime
+    route = choose("realtime", prompt)
+    completion = LLMGateway.stream_chat(
+        "prefetch",
+        SystemChatBot() + [{"role": "system", "content": GoogleSearch(prompt)},
+                           {"role": "system", "content": Information()},
+                           {"role": "user", "content": f"{prompt}"}],
+        model=route.model,
+        temperature=settings.temperature,
+        max_tokens=route.max_tokens,
+        top_p=settings.top_p,
+        fallback_model=route.fallback,
+    )
+    return AnswerModifier(completion.text.strip())
+
 # Main entry point of the program for interactive querying.
 if __name__ == "__main__":
     while True:
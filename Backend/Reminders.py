@@ -0,0 +1,409 @@
+# Reminders.py
+"""
+Reminders for the decision model's "reminder" intent
+("reminder 9:00pm 25th june business meeting").
+
+- Parsing: `parse_reminder()` finds the date and time in the text and keeps the
+  rest as the message. It understands clock times ("9pm", "9:30 pm", "21:30",
+  "noon"), dates ("25th june", "june 25", "25/06", "2025-06-25", "today",
+  "tomorrow", "monday", "next friday") and offsets ("in 10 minutes",
+  "in an hour"). A date without a time uses ReminderDefaultTime. A time
+  without a date is the next time the clock shows it. An hour from 1 to 11
+  without am/pm ("at 5", "5:30", but not "05:30") can be either half of the
+  day: today it is whichever is still ahead, on another day 1 to 6 are read
+  as the afternoon and 7 to 11 as the morning ("tomorrow at 5" is 17:00).
+  With "tonight" ("9 tonight", "tonight at 12") 5 to 11 are the evening and
+  12 and 1 to 4 are after midnight. A date without a year that has already
+  passed this year is taken to mean next year.
+- Storage: reminders live in a SQLite file (ReminderStorePath) shared by all
+  workers, so they survive restarts. A row is 'pending' until it is 'fired'
+  or 'cancelled'.
+- Scheduling: one thread per worker holds a heap of (due time, id) for the
+  pending reminders. Adding one is a heap push, O(log n). The thread sleeps on
+  a condition until the earliest one is due, or until an earlier one is added.
+  There is no per-reminder thread or timer and no polling, so hundreds of
+  thousands of pending reminders cost one heap entry each. (The thread does
+  wake every MAX_SLEEP seconds, so a wall clock change can't delay it long.)
+  When the scheduler starts it loads every pending reminder; ones that came
+  due while nothing was running fire at once.
+- Delivery: a due reminder is claimed with a conditional UPDATE, so it fires
+  once even when several workers hold it, and not at all once cancelled. It is
+  then shown through the status and response channel (MessageBus) like any
+  other assistant message.
+"""
+
+import datetime as dt
+import heapq
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .Lazy import Lazy
+from .MessageBus import SetAssistantStatus, ShowTextToScreen
+from .Settings import get_settings
+
+MAX_SLEEP = 300.0
+AFTERNOON_HOURS = range(1, 7)  # an am/pm-less hour on another day: "tomorrow at 5" is 17:00, "at 9" 09:00
+
+MONTHS = {name: number for number, names in enumerate(
+    [("jan", "january"), ("feb", "february"), ("mar", "march"), ("apr", "april"), ("may",), ("jun", "june"),
+     ("jul", "july"), ("aug", "august"), ("sep", "sept", "september"), ("oct", "october"), ("nov", "november"),
+     ("dec", "december")], start=1) for name in names}
+WEEKDAYS = {name: number for number, name in enumerate(
+    ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"])}
+NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "ten": 10,
+                "fifteen": 15, "twenty": 20, "thirty": 30, "forty five": 45, "half an": 0.5, "a couple of": 2}
+UNITS = {"s": 1, "sec": 1, "second": 1, "min": 60, "minute": 60, "h": 3600, "hr": 3600, "hour": 3600,
+         "day": 86400, "week": 604800}
+
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+_WEEKDAY = "|".join(WEEKDAYS)
+_AMOUNT = r"\d+(?:\.\d+)?|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True))
+
+RELATIVE = re.compile(rf"\bin\s+({_AMOUNT})\s*(s|secs?|seconds?|mins?|minutes?|h|hrs?|hours?|days?|weeks?)\b")
+CLOCK_12 = re.compile(r"\b(?:at\s+)?(\d{1,2})(?:[:.](\d{2}))?\s*([ap])\.?m\b\.?")
+CLOCK_24 = re.compile(r"\b(?:at\s+)?(\d{1,2}):(\d{2})\b")  # "5:30" is either half, "05:30" and "17:30" are not
+CLOCK_WORD = re.compile(r"\b(?:at\s+)?(noon|midday|midnight)\b")
+AT_HOUR = re.compile(r"\bat\s+(\d{1,2})\b(?!\s*(?:st|nd|rd|th|/|-|:))")  # "at 5": 5:00 or 17:00 today, whichever is still ahead
+TONIGHT_HOUR = re.compile(r"\b(\d{1,2})(?=\s+tonight\b)|(?<=\btonight\s)\s*(\d{1,2})\b(?!\s*(?:st|nd|rd|th|/|-|:))")  # "9 tonight"
+DAY_MONTH = re.compile(
+    rf"\b(?:on\s+)?(?:the\s+)?(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?({_MONTH})\b\.?(?:,?\s+(\d{{4}})\b)?")
+MONTH_DAY = re.compile(rf"\b(?:on\s+)?({_MONTH})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?\b(?:,?\s+(\d{{4}})\b)?")
+ISO_DATE = re.compile(r"\b(?:on\s+)?(\d{4})-(\d{1,2})-(\d{1,2})\b")
+NUMERIC_DATE = re.compile(r"\b(?:on\s+)?(\d{1,2})/(\d{1,2})(?:/(\d{4}|\d{2}))?\b")  # day/month[/year]
+RELATIVE_DAY = re.compile(r"\b(day after tomorrow|tomorrow|today|tonight)\b")
+WEEKDAY = re.compile(rf"\b(?:on\s+)?(next\s+|this\s+)?({_WEEKDAY})\b")
+# Words left around the message once the date and time are cut out ("remind me to ...", "... at").
+LEADING = re.compile(r"^(?:(?:set|add|create)\s+(?:a\s+)?reminder|remind\s+me|reminder|to|for|about|that|of|on|at|the)\b"
+                     r"[\s,:-]*", re.IGNORECASE)
+TRAILING = re.compile(r"[\s,:-]*\b(?:at|on|for|to|by|the)$", re.IGNORECASE)
+
+
+# =========================
+# PARSING
+# =========================
+def _default_time() -> Tuple[int, int]:
+    hour, _, minute = get_settings().reminders.default_time.partition(":")
+    return int(hour), int(minute or 0)
+
+
+def _seconds(amount: str, unit: str) -> float:
+    value = NUMBER_WORDS[amount] if amount in NUMBER_WORDS else float(amount)
+    unit = unit.rstrip("s") or "s"
+    return value * UNITS.get(unit, UNITS.get(unit[:3], 60))
+
+
+def _date(year: Optional[str], month: int, day: int, now: dt.datetime) -> Tuple[dt.date, bool]:
+    """The date, and whether the year was given."""
+    if year and len(year) == 2:
+        year = "20" + year
+    try:
+        return dt.date(int(year) if year else now.year, month, day), bool(year)
+    except ValueError:
+        raise ValueError(f"{day}/{month} is not a date")
+
+
+def parse_reminder(text: str, now: Optional[dt.datetime] = None) -> Tuple[dt.datetime, str]:
+    """
+    The due time and message of a reminder request, e.g. "9:00pm 25th june
+    business meeting". Raises ValueError when it names no date or time, or a
+    time that has passed.
+    """
+    now = now or dt.datetime.now()
+    lowered = text.lower()
+    if len(lowered) != len(text):  # a few characters change length when lowercased; spans must line up
+        text = lowered
+    spans: List[Tuple[int, int]] = []
+
+    def take(pattern: "re.Pattern[str]") -> Optional["re.Match[str]"]:
+        # Blank out what a pattern matched, so the next patterns and the message don't see it again.
+        nonlocal lowered
+        match = pattern.search(lowered)
+        if match:
+            start, end = match.span()
+            spans.append((start, end))
+            lowered = lowered[:start] + " " * (end - start) + lowered[end:]
+        return match
+
+    relative = take(RELATIVE)
+    if relative:
+        due = now + dt.timedelta(seconds=_seconds(relative.group(1), relative.group(2)))
+    else:
+        due = _absolute(take, now)
+    if due <= now:
+        raise ValueError(f"{due:%I:%M %p on %d %B %Y} has already passed")
+
+    for start, end in sorted(spans, reverse=True):
+        text = text[:start] + " " + text[end:]
+    message = " ".join(text.split())
+    previous = None
+    while message != previous:
+        previous = message
+        message = TRAILING.sub("", LEADING.sub("", message))
+    return due, message.strip(" ,.") or "Reminder"
+
+
+def _absolute(take: Callable, now: dt.datetime) -> dt.datetime:
+    # Time of day
+    clock: Optional[Tuple[int, int]] = None
+    m = take(CLOCK_12)
+    if m:
+        hour, minute = int(m.group(1)), int(m.group(2) or 0)
+        clock = (hour % 12 + (12 if m.group(3) == "p" else 0), minute) if 1 <= hour <= 12 else (hour, minute)
+    else:
+        m = take(CLOCK_24) or take(CLOCK_WORD)
+        if m and m.re is CLOCK_WORD:
+            clock = (0, 0) if m.group(1) == "midnight" else (12, 0)
+        elif m:
+            clock = (int(m.group(1)), int(m.group(2)))
+    bare = bool(m) and m.re is CLOCK_24 and not m.group(1).startswith("0")  # no am/pm: "5:30", "at 5"
+    if clock is None and (m := take(AT_HOUR) or take(TONIGHT_HOUR)):
+        clock, bare = (int(m.group(m.lastindex)), 0), True
+    bare = bare and 1 <= clock[0] <= 12
+    either_half = bare and clock[0] != 12
+    if clock is not None and not (0 <= clock[0] <= 23 and 0 <= clock[1] <= 59):
+        raise ValueError(f"{clock[0]}:{clock[1]:02d} is not a time of day")
+
+    # Date
+    date: Optional[dt.date] = None
+    explicit_year = False
+    if m := take(ISO_DATE):
+        date, explicit_year = _date(m.group(1), int(m.group(2)), int(m.group(3)), now)
+    elif m := take(DAY_MONTH):
+        date, explicit_year = _date(m.group(3), MONTHS[m.group(2)], int(m.group(1)), now)
+    elif m := take(MONTH_DAY):
+        date, explicit_year = _date(m.group(3), MONTHS[m.group(1)], int(m.group(2)), now)
+    elif m := take(NUMERIC_DATE):
+        date, explicit_year = _date(m.group(3), int(m.group(2)), int(m.group(1)), now)
+    elif m := take(RELATIVE_DAY):
+        word = m.group(1)
+        date = now.date() + dt.timedelta(days={"tomorrow": 1, "day after tomorrow": 2}.get(word, 0))
+        explicit_year = True
+        if word == "tonight":
+            date, clock = _tonight(date, clock, bare)
+            either_half = False
+    elif m := take(WEEKDAY):
+        ahead = (WEEKDAYS[m.group(2)] - now.weekday()) % 7
+        if ahead == 0 and (m.group(1) or "").strip() == "next":
+            ahead = 7
+        date, explicit_year = now.date() + dt.timedelta(days=ahead), True
+        if ahead == 0 and either_half:
+            clock = _later_half(clock, now)
+            either_half = False
+        if dt.datetime.combine(date, dt.time(*(clock or _default_time()))) <= now:
+            date += dt.timedelta(days=7)  # "monday" said on a Monday evening
+
+    if date is None and clock is None:
+        raise ValueError("No date or time found")
+    if date is None:
+        if either_half:
+            clock = _later_half(clock, now)
+        due = dt.datetime.combine(now.date(), dt.time(*clock))
+        return due + dt.timedelta(days=1) if due <= now else due
+    if either_half and date == now.date():
+        clock = _later_half(clock, now)
+    elif either_half and clock[0] in AFTERNOON_HOURS:
+        clock = (clock[0] + 12, clock[1])
+    due = dt.datetime.combine(date, dt.time(*(clock or _default_time())))
+    if due <= now and not explicit_year:
+        due = due.replace(year=due.year + 1)
+    return due
+
+
+def _tonight(date: dt.date, clock: Optional[Tuple[int, int]], bare: bool) -> Tuple[dt.date, Tuple[int, int]]:
+    """
+    "tonight" with an optional time: 20:00 without one. An hour without am/pm
+    is evening from 5 to 11 and after midnight otherwise ("tonight at 12" is
+    00:00 tomorrow); any other time before noon is after midnight as well.
+    """
+    if clock is None:
+        return date, (20, 0)
+    hour, minute = clock
+    if bare and 5 <= hour <= 11:
+        return date, (hour + 12, minute)
+    if hour < 12 or (bare and hour == 12):
+        return date + dt.timedelta(days=1), (hour % 12, minute)
+    return date, clock
+
+
+def _later_half(clock: Tuple[int, int], now: dt.datetime) -> Tuple[int, int]:
+    """An am/pm-less time today: the afternoon one once the morning one has passed."""
+    if dt.datetime.combine(now.date(), dt.time(*clock)) <= now:
+        return clock[0] + 12, clock[1]
+    return clock
+
+
+def describe(reminder: Dict[str, Any]) -> str:
+    due = dt.datetime.fromtimestamp(reminder["due"])
+    return f"{due:%I:%M %p}".lstrip("0") + f" on {due:%A}, {due.day} {due:%B %Y}"
+
+
+# =========================
+# STORE
+# =========================
+class ReminderStore:
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript("""
+            CREATE TABLE IF NOT EXISTS reminders (
+                id TEXT PRIMARY KEY, due REAL, message TEXT, request TEXT, created REAL,
+                status TEXT DEFAULT 'pending', fired REAL);
+            CREATE INDEX IF NOT EXISTS reminders_status_due ON reminders (status, due);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def add(self, due: float, message: str, request: str = "") -> Dict[str, Any]:
+        row = {"id": uuid.uuid4().hex, "due": due, "message": message, "request": request,
+               "created": time.time(), "status": "pending", "fired": None}
+        self._conn().execute("INSERT INTO reminders (id, due, message, request, created, status)"
+                             " VALUES (:id, :due, :message, :request, :created, :status)", row)
+        return row
+
+    def get(self, reminder_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM reminders WHERE id = ?", (reminder_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, status: str = "pending", limit: int = 50) -> List[Dict[str, Any]]:
+        """Reminders with `status`: pending ones soonest first, others latest first."""
+        order = "due" if status == "pending" else "due DESC"
+        rows = self._conn().execute(f"SELECT * FROM reminders WHERE status = ? ORDER BY {order} LIMIT ?",
+                                    (status, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def pending(self) -> List[Tuple[float, str]]:
+        """(due, id) of every pending reminder."""
+        return [(row[0], row[1]) for row in
+                self._conn().execute("SELECT due, id FROM reminders WHERE status = 'pending'")]
+
+    def claim(self, reminder_id: str) -> Optional[Dict[str, Any]]:
+        """Mark a pending reminder fired; None if another worker got it first or it was cancelled."""
+        cursor = self._conn().execute("UPDATE reminders SET status = 'fired', fired = ? WHERE id = ? AND status = 'pending'",
+                                      (time.time(), reminder_id))
+        return self.get(reminder_id) if cursor.rowcount else None
+
+    def cancel(self, reminder_id: str) -> bool:
+        cursor = self._conn().execute(
+            "UPDATE reminders SET status = 'cancelled' WHERE id = ? AND status = 'pending'", (reminder_id,))
+        return bool(cursor.rowcount)
+
+
+_store = Lazy(lambda: ReminderStore(get_settings().reminders.store_path))
+
+
+def get_reminder_store() -> ReminderStore:
+    return _store.get()
+
+
+# =========================
+# SCHEDULER
+# =========================
+def deliver(reminder: Dict[str, Any]):
+    """Show a fired reminder like any other assistant message."""
+    assistant = get_settings().identity.assistant_name
+    late = time.time() - reminder["due"]
+    note = f" (due {describe(reminder)})" if late > 60 else ""
+    SetAssistantStatus(f"Reminder: {reminder['message']}")
+    ShowTextToScreen(f"{assistant} : Reminder: {reminder['message']}{note}")
+
+
+class ReminderScheduler:
+    """One thread firing pending reminders from a heap of (due, id)."""
+
+    def __init__(self, store: ReminderStore, on_fire: Callable[[Dict[str, Any]], None] = deliver):
+        self.store = store
+        self.on_fire = on_fire
+        self._heap: List[Tuple[float, str]] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def start(self):
+        """Load the pending reminders and start firing them."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            known = set(reminder_id for _, reminder_id in self._heap)
+            self._heap.extend(entry for entry in self.store.pending() if entry[1] not in known)
+            heapq.heapify(self._heap)
+            self._stopped = False
+            self._thread = threading.Thread(target=self._loop, name="reminders", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def add(self, due: float, reminder_id: str):
+        with self._cond:
+            heapq.heappush(self._heap, (due, reminder_id))
+            if self._heap[0][1] == reminder_id:  # new earliest: wake the thread to shorten its sleep
+                self._cond.notify()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _next_due(self) -> Optional[str]:
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait(MAX_SLEEP)
+                    continue
+                delay = self._heap[0][0] - time.time()
+                if delay <= 0:
+                    return heapq.heappop(self._heap)[1]
+                self._cond.wait(min(delay, MAX_SLEEP))
+        return None
+
+    def _loop(self):
+        while True:
+            reminder_id = self._next_due()
+            if reminder_id is None:
+                return
+            try:
+                reminder = self.store.claim(reminder_id)
+                if reminder is not None:
+                    self.on_fire(reminder)
+            except Exception as e:
+                print(f"[Reminders] Could not fire {reminder_id}: {e}")
+
+
+_scheduler = Lazy(lambda: ReminderScheduler(get_reminder_store()))
+
+
+def get_scheduler() -> ReminderScheduler:
+    return _scheduler.get()
+
+
+# =========================
+# API
+# =========================
+def set_reminder(request: str) -> Dict[str, Any]:
+    """Parse, store and schedule a reminder request; raises ValueError if it has no usable time."""
+    due, message = parse_reminder(request)
+    reminder = get_reminder_store().add(due.timestamp(), message, request.strip())
+    get_scheduler().add(reminder["due"], reminder["id"])
+    return reminder
+
+
+def cancel_reminder(reminder_id: str) -> bool:
+    # The heap entry stays; the scheduler skips it because the claim fails.
+    return get_reminder_store().cancel(reminder_id)
@@ -0,0 +1,371 @@
+# Settings.py
+"""
+Typed settings for every backend subsystem, parsed once from `.env`.
+
+Values come from the `.env` file (path overridable with the BAI_ENV_FILE
+environment variable) and process environment variables of the same name take
+precedence, which is how production deployments override them. The existing key
+names (GroqAPIKey, Username, Assistantname, ...) are unchanged; tunables that
+used to be hard-coded (model IDs, token limits, temperatures, timeouts, pool
+sizes) have their own keys, listed next to each field below.
+
+Call `get_settings()` wherever a value is needed instead of caching it at import:
+the file is re-read automatically when its modification time changes (checked at
+most once per second) or explicitly with `reload_settings()`, so parameters can
+be tuned on a running server without code edits or restarts.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field, fields, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import dotenv_values
+
+ENV_FILE = os.environ.get("BAI_ENV_FILE", ".env")
+RELOAD_CHECK_INTERVAL = 1.0  # seconds between .env mtime checks
+
+
+def env(key: str, default: Any):
+    """Dataclass field bound to an env key."""
+    return field(default=default, metadata={"env": key})
+
+
+@dataclass(frozen=True)
+class IdentitySettings:
+    username: str = env("Username", "User")
+    assistant_name: str = env("Assistantname", "Assistant")
+    input_language: str = env("InputLanguage", "en")
+
+
+@dataclass(frozen=True)
+class KeySettings:
+    cohere: str = env("CohereAPIKey", "")
+    groq: str = env("GroqAPIKey", "")
+    huggingface: str = env("HuggingFaceAPIKey", "")
+    openweathermap: str = env("OpenWeatherMapAPIKey", "")
+
+
+@dataclass(frozen=True)
+class LLMSettings:
+    timeout: float = env("LLMTimeout", 60.0)  # seconds per call, unless the caller sets its own
+    max_connections: int = env("LLMMaxConnections", 20)  # per provider and worker
+    keepalive: int = env("LLMKeepAlive", 10)  # idle connections kept open for reuse
+    keepalive_expiry: float = env("LLMKeepAliveExpiry", 60.0)  # seconds an idle connection is kept
+    max_retries: int = env("LLMMaxRetries", 2)
+
+
+@dataclass(frozen=True)
+class DecisionSettings:
+    model: str = env("DecisionModel", "command-a-03-2025")
+    temperature: float = env("DecisionTemperature", 0.7)
+    batching: bool = env("DecisionBatching", False)  # classify concurrent queries in one Cohere call
+    batch_window_ms: float = env("DecisionBatchWindowMs", 15.0)  # how long the first query waits for others
+    batch_size: int = env("DecisionBatchSize", 8)  # a batch is sent as soon as this many have joined
+    timeout: float = env("DecisionTimeout", 20.0)  # seconds per decision call
+
+
+@dataclass(frozen=True)
+class ChatSettings:
+    model: str = env("ChatModel", "meta-llama/llama-4-scout-17b-16e-instruct")
+    max_tokens: int = env("ChatMaxTokens", 1024)
+    temperature: float = env("ChatTemperature", 0.7)
+    top_p: float = env("ChatTopP", 1.0)
+
+
+@dataclass(frozen=True)
+class RealtimeSettings:
+    model: str = env("RealtimeModel", "meta-llama/llama-4-scout-17b-16e-instruct")
+    max_tokens: int = env("RealtimeMaxTokens", 2048)
+    temperature: float = env("RealtimeTemperature", 0.7)
+    top_p: float = env("RealtimeTopP", 1.0)
+    search_results: int = env("SearchResults", 5)
+
+
+@dataclass(frozen=True)
+class PageFetchSettings:
+    pages: int = env("PageFetchPages", 3)  # top search results whose page text is added; 0 = titles only
+    deadline: float = env("PageFetchDeadline", 1.5)  # seconds a realtime turn waits for all pages together
+    token_budget: int = env("PageFetchTokenBudget", 400)  # per page
+    max_bytes: int = env("PageFetchMaxBytes", 500000)  # of each page's HTML that is parsed
+    cache_ttl: float = env("PageFetchCacheTTL", 3600.0)  # seconds extracted text is kept per URL
+    workers: int = env("PageFetchWorkers", 8)
+
+
+@dataclass(frozen=True)
+class PrefetchSettings:
+    enabled: bool = env("Prefetch", True)  # background refresh of hot realtime queries
+    search_ttl: float = env("SearchCacheTTL", 600.0)  # seconds search results are reused; 0 = always search
+    refresh_interval: float = env("PrefetchRefreshInterval", 300.0)  # refresh hot results older than this
+    check_interval: float = env("PrefetchCheckInterval", 30.0)  # seconds between scheduler passes
+    top: int = env("PrefetchTopQueries", 10)
+    min_hits: float = env("PrefetchMinHits", 3.0)  # decayed count that makes a query hot
+    half_life: float = env("PrefetchHalfLife", 3600.0)  # seconds
+    max_tracked: int = env("PrefetchMaxTracked", 500)
+    max_calls_per_hour: int = env("PrefetchMaxCallsPerHour", 120)  # background searches, page fetches and drafts
+    drafts: bool = env("PrefetchDrafts", False)  # also pre-write answers and serve them while fresh
+
+
+@dataclass(frozen=True)
+class ModelRoutingSettings:
+    enabled: bool = env("ModelRouting", True)
+    fast_model: str = env("ModelRoutingFastModel", "llama-3.1-8b-instant")
+    fast_max_tokens: int = env("ModelRoutingFastMaxTokens", 256)
+    fast_max_words: int = env("ModelRoutingFastMaxWords", 12)  # longer general queries use the primary model
+    brief_max_tokens: int = env("ModelRoutingBriefMaxTokens", 512)  # ceiling for short realtime turns
+    detail_keywords: str = env(
+        "ModelRoutingDetailKeywords",
+        "explain, explanation, detail, detailed, describe, elaborate, write, essay, code, program, compare, "
+        "difference, steps, step by step, list, analyze, analyse, summarize, summarise, why, how does, how do, pros and cons")
+    fallback_model: str = env("ModelRoutingFallbackModel", "llama-3.3-70b-versatile")
+    slow_ms: float = env("ModelRoutingSlowMs", 3000.0)  # median time to first token that marks a model slow
+    max_error_rate: float = env("ModelRoutingMaxErrorRate", 0.3)
+    min_samples: int = env("ModelRoutingMinSamples", 5)  # recent calls needed before a model is judged
+    health_window: float = env("ModelRoutingHealthWindow", 300.0)  # seconds a call counts towards health
+    probe_interval: float = env("ModelRoutingProbeInterval", 30.0)  # seconds between trial turns on an unhealthy model
+
+
+@dataclass(frozen=True)
+class ContentSettings:
+    model: str = env("ContentModel", "llama-3.3-70b-versatile")
+    max_tokens: int = env("ContentMaxTokens", 2048)
+    temperature: float = env("ContentTemperature", 0.7)
+
+
+@dataclass(frozen=True)
+class WeatherSettings:
+    default_location: str = env("DefaultLocation", "Tempe,AZ,US")
+    timeout: float = env("WeatherTimeout", 10.0)
+    gazetteer: bool = env("Gazetteer", True)  # resolve locations locally before asking the remote geocoder
+    gazetteer_path: str = env("GazetteerPath", "")  # empty = the bundled data/Gazetteer.tsv
+    gazetteer_index_path: str = env("GazetteerIndexPath", os.path.join("Data", "Gazetteer.idx"))
+    gazetteer_fuzzy_threshold: float = env("GazetteerFuzzyThreshold", 0.85)  # similarity for a misspelled name
+
+
+@dataclass(frozen=True)
+class ImageSettings:
+    api_url: str = env("ImageAPIURL", "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0")
+    count: int = env("ImageCount", 4)
+    timeout: float = env("ImageTimeout", 120.0)
+
+
+@dataclass(frozen=True)
+class SpeechSettings:
+    timeout: float = env("STTTimeout", 10.0)
+    poll_interval: float = env("STTPollInterval", 0.5)
+
+
+@dataclass(frozen=True)
+class VoiceSettings:
+    voice: str = env("AssistantVoice", "en-US-AriaNeural")
+    pitch: str = env("VoicePitch", "+5Hz")
+    rate: str = env("VoiceRate", "+13%")
+
+
+@dataclass(frozen=True)
+class StateSettings:
+    backend: str = env("StateBackend", "sqlite")
+    path: str = env("StatePath", os.path.join("Data", "State.db"))
+    redis_url: str = env("RedisURL", "redis://127.0.0.1:6379/0")
+    namespace: str = env("StateNamespace", "bai")
+    history_limit: int = env("HistoryLimit", 100)
+    chat_store_path: str = env("ChatStorePath", os.path.join("Data", "Chats.db"))
+    chat_page_size: int = env("ChatPageSize", 50)
+
+
+@dataclass(frozen=True)
+class AdmissionSettings:
+    enabled: bool = env("AdmissionControl", True)
+    chat_concurrency: int = env("ChatConcurrency", 4)
+    stt_concurrency: int = env("STTConcurrency", 2)
+    tts_concurrency: int = env("TTSConcurrency", 4)
+    batch_concurrency: int = env("ChatBatchConcurrency", 1)  # /chat/batch requests running at once
+    queue_size: int = env("AdmissionQueueSize", 16)
+    queue_timeout: float = env("AdmissionQueueTimeout", 15.0)
+    rate_per_minute: float = env("RateLimitPerMinute", 30.0)
+    burst: float = env("RateLimitBurst", 10.0)
+    trust_proxy: bool = env("TrustProxyHeaders", False)
+
+
+@dataclass(frozen=True)
+class BusSettings:
+    path: str = env("BusPath", os.path.join("Data", "bus.sock"))
+    port: int = env("BusPort", 8765)
+    queue_size: int = env("BusQueueSize", 256)
+    image_worker_idle: float = env("ImageWorkerIdle", 120.0)
+
+
+@dataclass(frozen=True)
+class GuiSettings:
+    scrollback: int = env("GuiScrollback", 1000)
+
+
+@dataclass(frozen=True)
+class AutomationSettings:
+    # Jobs of one action type allowed to run at once; pool size is AutomationWorkers.
+    open_concurrency: int = env("AutomationOpenConcurrency", 2)
+    close_concurrency: int = env("AutomationCloseConcurrency", 2)
+    play_concurrency: int = env("AutomationPlayConcurrency", 1)
+    content_concurrency: int = env("AutomationContentConcurrency", 3)
+    other_concurrency: int = env("AutomationOtherConcurrency", 2)  # searches, system keys
+    job_history: int = env("AutomationJobHistory", 200)
+    app_index_refresh: float = env("AppIndexRefresh", 600.0)  # seconds between installed-app rescans; 0 = never
+    app_match_threshold: float = env("AppMatchThreshold", 0.5)  # minimum trigram similarity for a match
+
+
+@dataclass(frozen=True)
+class AnswerCacheSettings:
+    enabled: bool = env("AnswerCache", True)
+    size: int = env("AnswerCacheSize", 1000)
+    ttl: float = env("AnswerCacheTTL", 86400.0)  # seconds
+    embedding_model: str = env("AnswerCacheEmbeddingModel", "BAAI/bge-small-en-v1.5")
+    threshold: float = env("AnswerCacheThreshold", 0.92)  # cosine similarity for a hit
+    hash_threshold: float = env("AnswerCacheHashThreshold", 0.88)  # same, for the hashed n-gram fallback
+
+
+@dataclass(frozen=True)
+class RouterSettings:
+    # Comma-separated phrases; each matches whole words only.
+    weather_keywords: str = env("RouterWeatherKeywords", "weather, temperature, temperatures, forecast, forecasts, humidity")
+    realtime_keywords: str = env(
+        "RouterRealtimeKeywords",
+        "what time, time is it, current time, time now, local time, time in, what s the time, today, todays, "
+        "tonight, news, headlines, breaking, right now, latest, this week, live score, stock price")
+    multi_keywords: str = env("RouterMultiKeywords", "and, also, then, plus, as well as")
+
+
+@dataclass(frozen=True)
+class ReminderSettings:
+    enabled: bool = env("Reminders", True)  # run the reminder scheduler in the API workers
+    store_path: str = env("ReminderStorePath", os.path.join("Data", "Reminders.db"))
+    default_time: str = env("ReminderDefaultTime", "09:00")  # for reminders that name a day but no time
+
+
+@dataclass(frozen=True)
+class BatchSettings:
+    concurrency: int = env("BatchConcurrency", 4)  # prompts of one batch answered at once
+    max_concurrency: int = env("BatchMaxConcurrency", 16)  # upper bound for a requested concurrency
+    max_items: int = env("BatchMaxItems", 1000)  # prompts accepted by one POST /chat/batch
+
+
+@dataclass(frozen=True)
+class ServerSettings:
+    host: str = env("ServerHost", "0.0.0.0")
+    port: int = env("ServerPort", 8000)
+    workers: int = env("ServerWorkers", 1)
+    automation_workers: int = env("AutomationWorkers", 4)
+
+
+@dataclass(frozen=True)
+class Settings:
+    identity: IdentitySettings
+    keys: KeySettings
+    llm: LLMSettings
+    decision: DecisionSettings
+    chat: ChatSettings
+    realtime: RealtimeSettings
+    page_fetch: PageFetchSettings
+    prefetch: PrefetchSettings
+    model_routing: ModelRoutingSettings
+    content: ContentSettings
+    weather: WeatherSettings
+    image: ImageSettings
+    speech: SpeechSettings
+    voice: VoiceSettings
+    state: StateSettings
+    admission: AdmissionSettings
+    bus: BusSettings
+    gui: GuiSettings
+    automation: AutomationSettings
+    answer_cache: AnswerCacheSettings
+    router: RouterSettings
+    reminders: ReminderSettings
+    batch: BatchSettings
+    server: ServerSettings
+
+    def public(self) -> Dict[str, Any]:
+        """Everything except API keys, for diagnostics endpoints."""
+        data = asdict(self)
+        data["keys"] = {name: bool(value) for name, value in data["keys"].items()}
+        return data
+
+
+def _convert(raw: str, kind: Any):
+    if kind is bool:
+        return raw.strip().lower() in ("1", "true", "yes", "on")
+    if kind is int:
+        return int(raw)
+    if kind is float:
+        return float(raw)
+    return raw
+
+
+def _build(cls, values: Dict[str, Optional[str]]):
+    kwargs = {}
+    for f in fields(cls):
+        key = f.metadata["env"]
+        raw = os.environ.get(key, values.get(key))
+        if raw is None or raw == "":
+            continue
+        try:
+            kwargs[f.name] = _convert(raw, f.type)
+        except ValueError:
+            print(f"[Settings] Ignoring invalid value for {key}: {raw!r}")
+    return cls(**kwargs)
+
+
+def load_settings(path: str = ENV_FILE) -> Settings:
+    """Parse `.env` plus environment overrides into a Settings object."""
+    values: Dict[str, Optional[str]] = dict(dotenv_values(path)) if os.path.exists(path) else {}
+    return Settings(**{f.name: _build(f.type, values) for f in fields(Settings)})
+
+# =========================
+# CACHED ACCESS & HOT RELOAD
+# =========================
+_lock = threading.Lock()
+_settings: Optional[Settings] = None
+_mtime: Optional[float] = None
+_checked_at = 0.0
+_listeners: List[Callable[[Settings, Settings], None]] = []
+
+
+def _env_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(ENV_FILE)
+    except OSError:
+        return None
+
+
+def get_settings() -> Settings:
+    """Current settings; re-parses `.env` if it changed since the last check."""
+    global _checked_at
+    now = time.monotonic()
+    if _settings is not None and now - _checked_at < RELOAD_CHECK_INTERVAL:
+        return _settings
+    _checked_at = now
+    if _settings is None or _env_mtime() != _mtime:
+        return reload_settings()
+    return _settings
+
+
+def reload_settings() -> Settings:
+    """Force a re-parse and notify listeners registered with `on_reload`."""
+    global _settings, _mtime
+    with _lock:
+        old = _settings
+        _mtime = _env_mtime()
+        _settings = load_settings()
+        new = _settings
+    if old is not None and old != new:
+        for callback in list(_listeners):
+            try:
+                callback(old, new)
+            except Exception as e:
+                print(f"[Settings] Reload listener failed: {e}")
+    return new
+
+
+def on_reload(callback: Callable[[Settings, Settings], None]):
+    """Register `callback(old, new)`, called after settings change (e.g. to rebuild clients on a key change)."""
+    _listeners.append(callback)
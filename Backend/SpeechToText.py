@@ -1,16 +1,10 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from dotenv import dotenv_values
 import os
-import mtranslate as mt
 import time
+from .Settings import get_settings
+from . import Tasks
 
-# Load environment variables
-env_vars = dotenv_values(".env")
-Inputlanguage = env_vars.get("InputLanguage") or "en"
+# selenium, webdriver_manager and mtranslate are imported on first use so that
+# API workers which never transcribe audio don't load the browser stack.
 
 def QueryModifier(Query):
     new_query = Query.lower().strip()
@@ -21,11 +15,20 @@ def QueryModifier(Query):
         return new_query.rstrip(".?!") + "."
 
 def UniversalTranslator(Text):
+    import mtranslate as mt
     english_translation = mt.translate(Text, "en", "auto")
     return english_translation.capitalize()
 
 def SpeechRecognitionFromFile(file_path: str):
     """Run Selenium webkitSpeechRecognition on a given audio file."""
+    Inputlanguage = get_settings().identity.input_language
+    speech = get_settings().speech
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+
     # Create temporary HTML that auto-plays audio
     HtmlCode = f'''<!DOCTYPE html>
     <html lang="en">
@@ -62,11 +65,15 @@ def SpeechRecognitionFromFile(file_path: str):
 
     driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
 
+    # /stop ends the poll loop below; the browser is then closed as usual.
+    task = Tasks.register("browser", description="speech recognition")
     try:
         driver.get("file:///" + os.path.abspath(html_path))
 
-        # Wait up to 10 seconds for result
-        for _ in range(20):
+        # Wait up to STTTimeout seconds for result
+        for _ in range(max(1, int(speech.timeout / speech.poll_interval))):
+            if task.cancelled.is_set():
+                return ""
             try:
                 text = driver.find_element(By.ID, "output").text
                 if text:
@@ -76,7 +83,8 @@ def SpeechRecognitionFromFile(file_path: str):
                         return QueryModifier(UniversalTranslator(text))
             except Exception:
                 pass
-            time.sleep(0.5)
+            time.sleep(speech.poll_interval)
         return ""
     finally:
+        Tasks.unregister(task)
         driver.quit()  # ✅ Always close Chrome
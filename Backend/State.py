@@ -0,0 +1,404 @@
+# State.py
+"""
+Pluggable shared state for the API workers.
+
+Anything that must be visible to every worker process lives here instead of in
+module globals: conversation history, caches and job records. The
+backend is chosen with the StateBackend setting:
+
+- memory : in-process dicts; fastest, but each worker has its own copy (dev, single worker)
+- sqlite : one WAL-mode database file (StatePath) shared by all workers on the host
+- redis  : any Redis-compatible server at RedisURL (redis, valkey, keydb, ...); needs `pip install redis`
+
+All values are JSON-serialisable Python objects. Keys set with a TTL read as
+missing once expired; the memory and sqlite backends also delete expired keys
+every PURGE_INTERVAL seconds, so caches keyed by URL or query (page:..., search:...)
+don't grow the store without bound. Redis expires keys itself.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from .Lazy import Lazy
+from .Settings import get_settings
+
+LEGACY_CHAT_LOG = r"Data\ChatLog.json"
+PURGE_INTERVAL = 60.0  # seconds between sweeps of expired keys (memory, sqlite)
+
+
+class StateBackend(ABC):
+    """Interface shared by all backends."""
+
+    # --- key/value with optional TTL (caches) ---
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1) -> int:
+        ...
+
+    # --- capped lists (conversation history) ---
+    @abstractmethod
+    def list_append(self, key: str, values: List[Any], max_len: Optional[int] = None):
+        ...
+
+    @abstractmethod
+    def list_range(self, key: str, last: Optional[int] = None) -> List[Any]:
+        """Whole list, or only its `last` items."""
+        ...
+
+    @abstractmethod
+    def list_clear(self, key: str):
+        ...
+
+    # --- hashes (job registries) ---
+    @abstractmethod
+    def hset(self, name: str, field: str, value: Any):
+        ...
+
+    @abstractmethod
+    def hgetall(self, name: str) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    def hdel(self, name: str, field: str):
+        ...
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kv: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lists: Dict[str, List[Any]] = {}
+        self._hashes: Dict[str, Dict[str, Any]] = {}
+        self._next_purge = 0.0
+
+    def get(self, key):
+        with self._lock:
+            expires = self._expires.get(key)
+            if expires is not None and expires < time.time():
+                self._kv.pop(key, None)
+                self._expires.pop(key, None)
+            return self._kv.get(key)
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._purge_expired()
+            self._kv[key] = value
+            if ttl:
+                self._expires[key] = time.time() + ttl
+            else:
+                self._expires.pop(key, None)
+
+    def _purge_expired(self):
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_INTERVAL
+        for key in [k for k, expires in self._expires.items() if expires < now]:
+            self._kv.pop(key, None)
+            del self._expires[key]
+
+    def delete(self, key):
+        with self._lock:
+            self._kv.pop(key, None)
+            self._expires.pop(key, None)
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            self._kv[key] = int(self._kv.get(key, 0)) + amount
+            return self._kv[key]
+
+    def list_append(self, key, values, max_len=None):
+        with self._lock:
+            items = self._lists.setdefault(key, [])
+            items.extend(values)
+            if max_len and len(items) > max_len:
+                del items[:-max_len]
+
+    def list_range(self, key, last=None):
+        with self._lock:
+            items = self._lists.get(key, [])
+            return list(items[-last:] if last else items)
+
+    def list_clear(self, key):
+        with self._lock:
+            self._lists.pop(key, None)
+
+    def hset(self, name, field, value):
+        with self._lock:
+            self._hashes.setdefault(name, {})[field] = value
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def hdel(self, name, field):
+        with self._lock:
+            self._hashes.get(name, {}).pop(field, None)
+
+
+class SQLiteBackend(StateBackend):
+    """Shared by every process on the host through one WAL-mode database file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._next_purge = 0.0
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires REAL);
+                CREATE TABLE IF NOT EXISTS lists (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, value TEXT);
+                CREATE INDEX IF NOT EXISTS lists_key ON lists (key, id);
+                CREATE TABLE IF NOT EXISTS hashes (name TEXT, field TEXT, value TEXT, PRIMARY KEY (name, field));
+                CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires) WHERE expires IS NOT NULL;
+            """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute("SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] < time.time():
+            self.delete(key)
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        self._conn().execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                             (key, json.dumps(value), expires))
+        self._purge_expired()
+
+    def _purge_expired(self):
+        # Unsynchronised across threads on purpose: an extra sweep is harmless.
+        now = time.time()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + PURGE_INTERVAL
+        self._conn().execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires < ?", (now,))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def incr(self, key, amount=1):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+            value = (json.loads(row[0]) if row else 0) + amount
+            conn.execute("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, NULL)", (key, json.dumps(value)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def list_append(self, key, values, max_len=None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT INTO lists (key, value) VALUES (?, ?)", [(key, json.dumps(v)) for v in values])
+            if max_len:
+                conn.execute(
+                    "DELETE FROM lists WHERE key = ? AND id <= "
+                    "(SELECT id FROM lists WHERE key = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (key, key, max_len),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def list_range(self, key, last=None):
+        if last:
+            rows = self._conn().execute(
+                "SELECT value FROM (SELECT id, value FROM lists WHERE key = ? ORDER BY id DESC LIMIT ?) ORDER BY id",
+                (key, last),
+            ).fetchall()
+        else:
+            rows = self._conn().execute("SELECT value FROM lists WHERE key = ? ORDER BY id", (key,)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def list_clear(self, key):
+        self._conn().execute("DELETE FROM lists WHERE key = ?", (key,))
+
+    def hset(self, name, field, value):
+        self._conn().execute("INSERT OR REPLACE INTO hashes (name, field, value) VALUES (?, ?, ?)",
+                             (name, field, json.dumps(value)))
+
+    def hgetall(self, name):
+        rows = self._conn().execute("SELECT field, value FROM hashes WHERE name = ?", (name,)).fetchall()
+        return {field: json.loads(value) for field, value in rows}
+
+    def hdel(self, name, field):
+        self._conn().execute("DELETE FROM hashes WHERE name = ? AND field = ?", (name, field))
+
+
+class RedisBackend(StateBackend):
+    """Any Redis-compatible server; keys are prefixed with the StateNamespace setting."""
+
+    def __init__(self, url: str, namespace: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("StateBackend=redis requires the 'redis' package (pip install redis)") from e
+        self._redis = redis.Redis.from_url(url)
+        self._ns = namespace
+
+    def _k(self, key: str) -> str:
+        return f"{self._ns}:{key}"
+
+    def get(self, key):
+        raw = self._redis.get(self._k(key))
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(self._k(key), json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key):
+        self._redis.delete(self._k(key))
+
+    def incr(self, key, amount=1):
+        return int(self._redis.incrby(self._k(key), amount))
+
+    def list_append(self, key, values, max_len=None):
+        if not values:
+            return
+        pipe = self._redis.pipeline()
+        pipe.rpush(self._k(key), *[json.dumps(v) for v in values])
+        if max_len:
+            pipe.ltrim(self._k(key), -max_len, -1)
+        pipe.execute()
+
+    def list_range(self, key, last=None):
+        raw = self._redis.lrange(self._k(key), -last if last else 0, -1)
+        return [json.loads(r) for r in raw]
+
+    def list_clear(self, key):
+        self._redis.delete(self._k(key))
+
+    def hset(self, name, field, value):
+        self._redis.hset(self._k(name), field, json.dumps(value))
+
+    def hgetall(self, name):
+        return {k.decode(): json.loads(v) for k, v in self._redis.hgetall(self._k(name)).items()}
+
+    def hdel(self, name, field):
+        self._redis.hdel(self._k(name), field)
+
+
+def _make_backend() -> StateBackend:
+    settings = get_settings().state
+    kind = settings.backend.lower()
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(settings.path)
+    if kind == "redis":
+        return RedisBackend(settings.redis_url, settings.namespace)
+    raise ValueError(f"Unknown StateBackend {settings.backend!r} (expected memory, sqlite or redis)")
+
+_backend = Lazy(_make_backend)
+
+
+def get_state() -> StateBackend:
+    """This process's connection to the configured backend."""
+    return _backend.get()
+
+# =========================
+# CONVERSATION HISTORY
+# =========================
+# Set inside isolated_history(): the conversation is this list, never the shared state.
+_isolated: ContextVar[Optional[List[Dict[str, str]]]] = ContextVar("isolated_history", default=None)
+
+
+@contextmanager
+def isolated_history():
+    """
+    Give the code in the block a private, empty conversation that is dropped afterwards
+    (batch runs): history reads see only what the block appended, writes never persist.
+    """
+    token = _isolated.set([])
+    try:
+        yield
+    finally:
+        _isolated.reset(token)
+
+
+def is_isolated() -> bool:
+    """True inside isolated_history(): a batch run, whose side effects are suppressed."""
+    return _isolated.get() is not None
+
+
+def _history_key(session: Optional[str]) -> str:
+    return f"history:{session or 'default'}"
+
+
+def load_history(session: Optional[str] = None) -> List[Dict[str, str]]:
+    """Most recent HistoryLimit messages of a conversation, oldest first."""
+    isolated = _isolated.get()
+    if isolated is not None:
+        return list(isolated[-get_settings().state.history_limit:])
+    state = get_state()
+    key = _history_key(session)
+    if session is None and state.get("history:imported") is None:
+        _import_legacy_chat_log(state, key)
+    return state.list_range(key, last=get_settings().state.history_limit)
+
+
+def append_history(messages: List[Dict[str, str]], session: Optional[str] = None):
+    isolated = _isolated.get()
+    if isolated is not None:
+        isolated.extend(messages)
+        return
+    get_state().list_append(_history_key(session), messages, max_len=get_settings().state.history_limit)
+
+
+def clear_history(session: Optional[str] = None):
+    isolated = _isolated.get()
+    if isolated is not None:
+        isolated.clear()
+        return
+    get_state().list_clear(_history_key(session))
+
+
+def _import_legacy_chat_log(state: StateBackend, key: str):
+    """Carry an existing Data\\ChatLog.json over into the default conversation, once."""
+    if state.incr("history:imported") != 1:
+        return
+    try:
+        with open(LEGACY_CHAT_LOG, "r") as f:
+            legacy = json.load(f)
+    except (OSError, ValueError):
+        return
+    if legacy and not state.list_range(key, last=1):
+        state.list_append(key, legacy, max_len=get_settings().state.history_limit)
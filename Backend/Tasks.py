@@ -0,0 +1,149 @@
+# Tasks.py
+"""
+Registry of the work in flight in this worker, so /stop can actually cancel it.
+
+Everything long-running registers here with a cancellation handle while it runs:
+LLM streams (the handle closes the HTTP stream), the STT browser session,
+audio playback, automation jobs and the WebSocket's per-request tasks.
+Cancelling sets the task's `cancelled` event and calls its handle. Code that
+loops, such as stream readers or poll loops, also checks the event, so it stops
+at the next step even when the handle can't interrupt it.
+
+Tasks are tagged with the session and job they run for. Both are taken from
+context variables set per request: the X-Session-ID / X-Job-ID headers over
+HTTP, and the connection and request ids on /ws. /stop can then cancel a single
+session or job; an unscoped /stop cancels everything. Worker subprocesses (image
+generation) are shared by all sessions and stay in Main's process registry,
+which only an unscoped /stop clears.
+"""
+
+import inspect
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+_session: ContextVar[Optional[str]] = ContextVar("task_session", default=None)
+_job: ContextVar[Optional[str]] = ContextVar("task_job", default=None)
+
+
+@contextmanager
+def scope(session: Optional[str] = None, job: Optional[str] = None):
+    """Tag work started inside the block with `session` / `job` (unset ones are inherited)."""
+    tokens = [(var, var.set(value)) for var, value in ((_session, session), (_job, job)) if value]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_session() -> Optional[str]:
+    return _session.get()
+
+
+def current_job() -> Optional[str]:
+    return _job.get()
+
+
+class Task:
+    def __init__(self, kind: str, cancel: Optional[Callable[[], Any]], task_id: str,
+                 session: Optional[str], job: Optional[str], description: str):
+        self.kind = kind
+        self.task_id = task_id
+        self.session = session
+        self.job = job
+        self.description = description
+        self.started = time.time()
+        self.cancelled = threading.Event()
+        self._cancel = cancel
+
+    def matches(self, session: Optional[str], job: Optional[str]) -> bool:
+        if session and self.session != session:
+            return False
+        return not job or job in (self.job, self.task_id)
+
+    def cancel(self):
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        if self._cancel is not None:
+            try:
+                self._cancel()
+            except Exception as e:
+                print(f"[Tasks] Cancelling {self.kind} {self.task_id} failed: {e}")
+
+    def info(self) -> Dict[str, Any]:
+        return {"task_id": self.task_id, "kind": self.kind, "session": self.session, "job": self.job,
+                "description": self.description, "started": self.started,
+                "cancelled": self.cancelled.is_set()}
+
+
+_lock = threading.Lock()
+_tasks: Dict[str, Task] = {}
+
+
+def register(kind: str, cancel: Optional[Callable[[], Any]] = None, task_id: Optional[str] = None,
+             description: str = "", session: Optional[str] = None, job: Optional[str] = None) -> Task:
+    """Add a task; `session` and `job` default to the current scope."""
+    task = Task(kind, cancel, task_id or uuid.uuid4().hex, session or _session.get(), job or _job.get(),
+                description)
+    with _lock:
+        _tasks[task.task_id] = task
+    return task
+
+
+def unregister(task: Task):
+    with _lock:
+        if _tasks.get(task.task_id) is task:
+            del _tasks[task.task_id]
+
+
+@contextmanager
+def track(kind: str, cancel: Optional[Callable[[], Any]] = None, description: str = "", **kwargs) -> Iterator[Task]:
+    """Register a task for the duration of the block."""
+    task = register(kind, cancel, description=description, **kwargs)
+    try:
+        yield task
+    finally:
+        unregister(task)
+
+
+def stream(kind: str, iterable: Iterable, description: str = "",
+           cancelled: Optional[threading.Event] = None) -> Iterator:
+    """
+    Iterate `iterable` (e.g. an LLM response stream) as a registered task. Cancelling
+    closes it and iteration ends quietly; whatever was consumed so far stands. Pass
+    `cancelled` to learn afterwards whether the stream was cut short.
+    """
+    # A generator can't be closed from another thread while it runs; the flag stops it instead.
+    close = None if inspect.isgenerator(iterable) else getattr(iterable, "close", None)
+    with track(kind, close, description) as task:
+        try:
+            for item in iterable:
+                if task.cancelled.is_set():
+                    break
+                yield item
+        except Exception:
+            if not task.cancelled.is_set():
+                raise
+            # the stream was closed under us
+        if task.cancelled.is_set() and cancelled is not None:
+            cancelled.set()
+
+
+def cancel(session: Optional[str] = None, job: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Cancel the tasks of `session` and/or `job` (everything when both are None); returns them."""
+    with _lock:
+        matched = [t for t in _tasks.values() if t.matches(session, job) and not t.cancelled.is_set()]
+    for task in matched:
+        task.cancel()
+    return [task.info() for task in matched]
+
+
+def active() -> List[Dict[str, Any]]:
+    with _lock:
+        tasks = list(_tasks.values())
+    return [task.info() for task in sorted(tasks, key=lambda t: t.started)]
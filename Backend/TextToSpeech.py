@@ -1,16 +1,16 @@
-import pygame
 import random
+import re
 import asyncio
-import edge_tts
 import os
-from dotenv import dotenv_values
+from .Settings import get_settings
+from . import Tasks
 
-# Load environment variables
-env_vars = dotenv_values(".env")
-AssistantVoice = env_vars.get("AssistantVoice")
+# pygame and edge_tts are imported on first use: they pull in SDL and aiohttp,
+# which workers that never speak shouldn't pay for at startup.
 
 # Async function to create audio file
 async def TextToAudioFile(text) -> None:
+    import edge_tts
     file_path = r"Data\speech.mp3"
 
     # Remove old file if exists
@@ -18,11 +18,23 @@ async def TextToAudioFile(text) -> None:
         os.remove(file_path)
 
     # Generate speech
-    communicate = edge_tts.Communicate(text, AssistantVoice, pitch='+5Hz', rate='+13%')  # type: ignore
+    voice = get_settings().voice
+    communicate = edge_tts.Communicate(text, voice.voice, pitch=voice.pitch, rate=voice.rate)  # type: ignore
     await communicate.save(file_path)
 
+async def StreamSpeech(text):
+    """Yield MP3 chunks for `text` as edge-tts produces them, without touching disk or the speakers."""
+    import edge_tts
+    voice = get_settings().voice
+    communicate = edge_tts.Communicate(text, voice.voice, pitch=voice.pitch, rate=voice.rate)  # type: ignore
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            yield chunk["data"]
+
 # Async TTS function for backend use
 async def async_TTS(Text, func=lambda r=None: True):
+    import pygame
+    task = Tasks.register("playback", description=str(Text)[:50])
     try:
         # Generate the audio file
         await TextToAudioFile(Text)
@@ -36,7 +48,7 @@ async def async_TTS(Text, func=lambda r=None: True):
         pygame.mixer.music.play()
 
         while pygame.mixer.music.get_busy():
-            if func() == False:
+            if func() == False or task.cancelled.is_set():
                 break
             pygame.time.Clock().tick(10)
         return True
@@ -45,6 +57,7 @@ async def async_TTS(Text, func=lambda r=None: True):
         print(f"Error in async_TTS: {e}")
 
     finally:
+        Tasks.unregister(task)
         try:
             func(False)
             if pygame.mixer.get_init():
@@ -67,36 +80,60 @@ def TTS(Text, func=lambda r=None: True):
         # Standalone execution
         asyncio.run(async_TTS(Text, func))
 
+# Said instead of the rest of a long answer, which is on the chat screen.
+RESPONSES = [
+    "The rest of the result has been printed to the chat screen, kindly check it out sir.",
+    "The rest of the text is now on the chat screen, sir, please check it.",
+    "You can see the rest of the text on the chat screen, sir.",
+    "The remaining part of the text is now on the chat screen, sir.",
+    "Sir, you'll find more text on the chat screen for you to see.",
+    "The rest of the answer is now on the chat screen, sir.",
+    "Sir, please look at the chat screen, the rest of the answer is there.",
+    "You'll find the complete answer on the chat screen, sir.",
+    "The next part of the text is on the chat screen, sir.",
+    "Sir, please check the chat screen for more information.",
+    "There's more text on the chat screen for you, sir.",
+    "Sir, take a look at the chat screen for additional text.",
+    "You'll find more to read on the chat screen, sir.",
+    "Sir, check the chat screen for the rest of the text.",
+    "The chat screen has the rest of the text, sir.",
+    "There's more to see on the chat screen, sir, please look.",
+    "Sir, the chat screen holds the continuation of the text.",
+    "You'll find the complete answer on the chat screen, kindly check it out sir.",
+    "Please review the chat screen for the rest of the text, sir.",
+    "Sir, look at the chat screen for the complete answer."
+]
+
+SPOKEN_SENTENCES = 2  # sentences of a long answer that are read out
+
+def IsLongAnswer(Text):
+    return len(str(Text).split(".")) > 4 and len(Text) >= 250
+
 # Handles long text like before
+def SpokenText(Text):
+    """What actually gets spoken: long answers are cut to two sentences plus a pointer to the screen."""
+    if IsLongAnswer(Text):
+        return ".".join(Text.split(".")[0:SPOKEN_SENTENCES]) + "." + random.choice(RESPONSES)
+    return Text
+
+class SentenceSplitter:
+    """Cuts streamed text into sentences as soon as each one is complete, so speech can start early."""
+    BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        *done, self.buffer = self.BOUNDARY.split(self.buffer)
+        return [s.strip() for s in done if s.strip()]
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
 def TextToSpeech(Text, func=lambda r=None: True):
-    Data = str(Text).split(".")
-    responses = [
-        "The rest of the result has been printed to the chat screen, kindly check it out sir.",
-        "The rest of the text is now on the chat screen, sir, please check it.",
-        "You can see the rest of the text on the chat screen, sir.",
-        "The remaining part of the text is now on the chat screen, sir.",
-        "Sir, you'll find more text on the chat screen for you to see.",
-        "The rest of the answer is now on the chat screen, sir.",
-        "Sir, please look at the chat screen, the rest of the answer is there.",
-        "You'll find the complete answer on the chat screen, sir.",
-        "The next part of the text is on the chat screen, sir.",
-        "Sir, please check the chat screen for more information.",
-        "There's more text on the chat screen for you, sir.",
-        "Sir, take a look at the chat screen for additional text.",
-        "You'll find more to read on the chat screen, sir.",
-        "Sir, check the chat screen for the rest of the text.",
-        "The chat screen has the rest of the text, sir.",
-        "There's more to see on the chat screen, sir, please look.",
-        "Sir, the chat screen holds the continuation of the text.",
-        "You'll find the complete answer on the chat screen, kindly check it out sir.",
-        "Please review the chat screen for the rest of the text, sir.",
-        "Sir, look at the chat screen for the complete answer."
-    ]
-
-    if len(Data) > 4 and len(Text) >= 250:
-        TTS(".".join(Text.split(".")[0:2]) + "." + random.choice(responses), func)
-    else:
-        TTS(Text, func)
+    TTS(SpokenText(Text), func)
 
 # Standalone usage
 if __name__ == "__main__":
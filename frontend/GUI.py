@@ -1,19 +1,21 @@
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QTextEdit, QStackedWidget, QWidget, QLineEdit,
-    QGridLayout, QVBoxLayout, QHBoxLayout, QPushButton, QFrame, QLabel, QSizePolicy
+    QApplication, QMainWindow, QStackedWidget, QWidget, QLineEdit,
+    QGridLayout, QVBoxLayout, QHBoxLayout, QPushButton, QFrame, QLabel, QSizePolicy,
+    QListView, QStyledItemDelegate, QAbstractItemView
 )
-from PyQt5.QtGui import QIcon, QPainter, QMovie, QColor, QTextCharFormat, QFont, QPixmap, QTextBlockFormat, QScreen
-from PyQt5.QtCore import Qt, QSize, QTimer
-from dotenv import dotenv_values
+from PyQt5.QtGui import QIcon, QPainter, QMovie, QColor, QFont, QPixmap, QScreen
+from PyQt5.QtCore import Qt, QSize, QObject, QRect, QAbstractListModel, QModelIndex, QTimer, pyqtSignal
 from typing import cast
 import sys
 import os
 
-env_vars = dotenv_values(".env")
-Assistantname = env_vars.get("Assistantname")
+# Share the backend's settings and message bus (run from the project root: python frontend\GUI.py).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Backend.Settings import get_settings, on_reload
+from Backend import MessageBus
+
+Assistantname = get_settings().identity.assistant_name
 current_dir = os.getcwd()
-old_chat_message = ""
-TempDirPath = rf"{current_dir}\Frontend\Files"
 GraphicsDirPath = rf"{current_dir}\Frontend\Graphics"
 
 def AnswerModifier(Answer):
@@ -40,20 +42,18 @@ def QueryModifier(Query):
     return new_query.capitalize()
 
 def SetMicrophoneStatus(Command):
-    with open(rf'{TempDirPath}\Mic.data', "w", encoding='utf-8') as file:
-        file.write(Command)
+    MessageBus.SetMicrophoneStatus(Command == "True")
 
 def GetMicrophoneStatus():
-    with open(rf'{TempDirPath}\Mic.data', "r", encoding='utf-8') as file:
-        return file.read()
+    state = MessageBus.get_bus().last(MessageBus.MicState)
+    return str(state.active) if state else "False"
 
 def SetAssistantStatus(Status):
-    with open(rf'{TempDirPath}\Status.data', "w", encoding='utf-8') as file:
-        file.write(Status)
+    MessageBus.SetAssistantStatus(Status)
 
 def GetAssistantStatus():
-    with open(rf'{TempDirPath}\Status.data', "r", encoding='utf-8') as file:
-        return file.read()
+    status = MessageBus.get_bus().last(MessageBus.AssistantStatus)
+    return status.text if status else ""
 
 def MicButtonInitialed():
     SetMicrophoneStatus("False")
@@ -64,35 +64,185 @@ def MicButtonClosed():
 def GraphicsDirectoryPath(Filename):
     return rf'{GraphicsDirPath}\{Filename}'
 
-def TempDirectoryPath(Filename):
-    return rf'{TempDirPath}\{Filename}'
-
 def ShowTextToScreen(Text):
-    with open(rf'{TempDirPath}\Responses.data', "w", encoding='utf-8') as file:
-        file.write(Text)
+    MessageBus.ShowTextToScreen(Text)
+
+class BusBridge(QObject):
+    """
+    Forwards message bus events (delivered on the bus reader thread) into the Qt
+    event loop through queued signals, in the order they were published.
+    """
+    status = pyqtSignal(str)
+    response = pyqtSignal(str, str, bool)  # text, message_id, final
+
+    def start(self):
+        """Subscribe once the signals are connected; retained values arrive immediately."""
+        bus = MessageBus.get_bus()
+        bus.subscribe(MessageBus.AssistantStatus, lambda m: self.status.emit(m.text))
+        bus.subscribe(MessageBus.Response, lambda m: self.response.emit(m.text, m.message_id, m.final))
+        bus.subscribe(MessageBus.MicState, lambda m: None)  # keeps GetMicrophoneStatus current
+
+class ChatEntry:
+    __slots__ = ("seq", "text", "color", "message_id", "height_cache")
+
+    def __init__(self, seq, text, color, message_id=""):
+        self.seq = seq
+        self.text = text
+        self.color = color
+        self.message_id = message_id  # key in ChatModel.by_id, so trimming drops it without a scan
+        self.height_cache = (0, 0)  # (width, height)
+
+class ChatModel(QAbstractListModel):
+    """
+    Chat messages for the virtualized view. Keeps at most `limit` rows (GuiScrollback),
+    dropping the oldest, and lets streamed messages grow in place by message_id.
+    """
+
+    def __init__(self, limit, parent=None):
+        super().__init__(parent)
+        self.limit = max(1, limit)
+        self.entries = []
+        self.by_id = {}
+        self.next_seq = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return entry.text
+        if role == Qt.ItemDataRole.ForegroundRole:
+            return QColor(entry.color)
+        if role == Qt.ItemDataRole.UserRole:
+            return entry
+        return None
+
+    def _row(self, entry):
+        return entry.seq - self.entries[0].seq
+
+    def append(self, text, color, message_id=""):
+        row = len(self.entries)
+        self.beginInsertRows(QModelIndex(), row, row)
+        entry = ChatEntry(self.next_seq, text, color, message_id)
+        self.next_seq += 1
+        self.entries.append(entry)
+        if message_id:
+            self.by_id[message_id] = entry
+        self.endInsertRows()
+        self.trim()
+        return entry
+
+    def update(self, message_id, text, color, append=False):
+        """Replace (or extend with `append`) the text of a streamed message, adding it if unseen."""
+        entry = self.by_id.get(message_id)
+        if entry is None:
+            return self.append(text, color, message_id)
+        entry.text = entry.text + text if append else text
+        entry.height_cache = (0, 0)
+        index = self.index(self._row(entry))
+        self.dataChanged.emit(index, index)
+        return entry
+
+    def trim(self):
+        excess = len(self.entries) - self.limit
+        if excess <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), 0, excess - 1)
+        dropped, self.entries = self.entries[:excess], self.entries[excess:]
+        for entry in dropped:
+            if entry.message_id and self.by_id.get(entry.message_id) is entry:
+                del self.by_id[entry.message_id]
+        self.endRemoveRows()
+
+    def setLimit(self, limit):
+        self.limit = max(1, limit)
+        self.trim()
+
+class ChatDelegate(QStyledItemDelegate):
+    """Paints one word-wrapped message per row; heights are cached per view width."""
+    MARGIN_TOP = 10
+    MARGIN_LEFT = 10
+
+    def _textRect(self, rect):
+        return rect.adjusted(self.MARGIN_LEFT, self.MARGIN_TOP, -self.MARGIN_LEFT, 0)
+
+    def sizeHint(self, option, index):
+        entry = index.data(Qt.ItemDataRole.UserRole)
+        width = option.rect.width() or 600
+        cached_width, height = entry.height_cache
+        if cached_width != width:
+            bounds = option.fontMetrics.boundingRect(
+                self._textRect(QRect(0, 0, width, 0)), int(Qt.TextFlag.TextWordWrap), entry.text)
+            height = bounds.height() + self.MARGIN_TOP
+            entry.height_cache = (width, height)
+        return QSize(width, height)
+
+    def paint(self, painter, option, index):
+        entry = index.data(Qt.ItemDataRole.UserRole)
+        painter.save()
+        painter.setFont(option.font)
+        painter.setPen(QColor(entry.color))
+        painter.drawText(self._textRect(option.rect),
+                         int(Qt.TextFlag.TextWordWrap) | int(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop),
+                         entry.text)
+        painter.restore()
+
+class ChatView(QListView):
+    """Only visible rows are laid out and painted, so thousands of messages stay cheap."""
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.setModel(model)
+        self.setItemDelegate(ChatDelegate(self))
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(100)
+        self.setWordWrap(True)
+        self.setFrameStyle(QFrame.NoFrame)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        model.dataChanged.connect(self.scheduleDelayedItemsLayout)  # a streamed row grew; re-measure it
+        self._atBottom = True
+        self.verticalScrollBar().valueChanged.connect(self._trackBottom)
+        self.verticalScrollBar().rangeChanged.connect(self._followTail)
+
+    def _trackBottom(self, value):
+        self._atBottom = value >= self.verticalScrollBar().maximum()
+
+    def _followTail(self, minimum, maximum):
+        # Keep following new messages unless the user scrolled up to read history.
+        if self._atBottom:
+            self.verticalScrollBar().setValue(maximum)
 
 class ChatSection(QWidget):
+    scrollbackChanged = pyqtSignal(int)
+
     def __init__(self):
         super(ChatSection, self).__init__()
         layout = QVBoxLayout(self)
         layout.setContentsMargins(-10, 40, 40, 100)
         layout.setSpacing(-100)
 
-        self.chat_text_edit = QTextEdit()
-        self.chat_text_edit.setReadOnly(True)
-        self.chat_text_edit.setTextInteractionFlags(Qt.TextInteractionFlag.NoTextInteraction)
-        self.chat_text_edit.setFrameStyle(QFrame.NoFrame)
-        layout.addWidget(self.chat_text_edit)
+        self.chat_model = ChatModel(get_settings().gui.scrollback, self)
+        self.chat_view = ChatView(self.chat_model)
+        self.scrollbackChanged.connect(self.chat_model.setLimit)
+        on_reload(self._onSettingsReload)
+        # Nothing else in the GUI process reads settings regularly; an mtime check every few seconds applies .env edits.
+        self.settingsTimer = QTimer(self)
+        self.settingsTimer.timeout.connect(get_settings)
+        self.settingsTimer.start(5000)
+        layout.addWidget(self.chat_view)
 
         self.setStyleSheet("background-color: black;")
         layout.setSizeConstraint(QVBoxLayout.SizeConstraint.SetDefaultConstraint)
         layout.setStretch(1, 1)
         self.setSizePolicy(QSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding))
 
-        text_color_text = QTextCharFormat()
-        text_color_text.setForeground(QColor(Qt.GlobalColor.blue))
-        self.chat_text_edit.setCurrentCharFormat(text_color_text)
-
         self.gif_label = QLabel()
         self.gif_label.setStyleSheet("border: none;")
         movie = QMovie(GraphicsDirectoryPath('Jarvis.gif'))
@@ -109,14 +259,16 @@ class ChatSection(QWidget):
 
         font = QFont()
         font.setPointSize(13)
-        self.chat_text_edit.setFont(font)
+        self.chat_view.setFont(font)
 
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.loadMessages)
-        self.timer.timeout.connect(self.SpeechRecogText)
-        self.timer.start(5)
+        # Status and responses arrive on the message bus; the retained last
+        # values are delivered on subscribe, so nothing needs loading here.
+        self.bus = BusBridge(self)
+        self.bus.response.connect(self.showMessage)
+        self.bus.status.connect(self.label.setText)
+        self.bus.start()
 
-        cast(QWidget, self.chat_text_edit.viewport()).installEventFilter(self)  # type: ignore
+        cast(QWidget, self.chat_view.viewport()).installEventFilter(self)  # type: ignore
 
         # Scrollbar styling
         self.setStyleSheet("""
@@ -131,31 +283,21 @@ class ChatSection(QWidget):
             }
         """)
 
-    def loadMessages(self):
-        global old_chat_message
-        with open(TempDirectoryPath('Responses.data'), "r", encoding='utf-8') as file:
-            messages = file.read()
-
-        if messages and messages != old_chat_message:
-            self.addMessage(message=messages, color='White')
-            old_chat_message = messages
+    def _onSettingsReload(self, old, new):
+        # Called on whichever thread reloaded the settings; resize the model in the Qt thread.
+        if old.gui.scrollback != new.gui.scrollback:
+            self.scrollbackChanged.emit(new.gui.scrollback)
 
-    def SpeechRecogText(self):
-        with open(TempDirectoryPath('Status.data'), "r", encoding='utf-8') as file:
-            messages = file.read()
-        self.label.setText(messages)
+    def showMessage(self, message, message_id="", final=True):
+        if not message_id:
+            if message:
+                self.addMessage(message=message, color='White')
+            return
+        # Streamed answers: partial updates append tokens, the final one carries the full text.
+        self.chat_model.update(message_id, message, 'White', append=not final)
 
     def addMessage(self, message, color):
-        cursor = self.chat_text_edit.textCursor()
-        format = QTextCharFormat()
-        formatm = QTextBlockFormat()
-        formatm.setTopMargin(10)
-        formatm.setLeftMargin(10)
-        format.setForeground(QColor(color))
-        cursor.setCharFormat(format)
-        cursor.setBlockFormat(formatm)
-        cursor.insertText(message + "\n")
-        self.chat_text_edit.setTextCursor(cursor)
+        self.chat_model.append(message, color)
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -1,4 +1,4 @@
-import { useState, useEffect, useRef } from 'react';
+import { useState, useEffect, useLayoutEffect, useRef } from 'react';
 import { Menu } from 'lucide-react';
 import { Sidebar } from './components/Sidebar';
 import { ChatMessage } from './components/ChatMessage';
@@ -11,23 +11,53 @@ function App() {
   const [isDarkMode, setIsDarkMode] = useState(true);
   const [sidebarOpen, setSidebarOpen] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const messagesContainerRef = useRef<HTMLDivElement>(null);
+  const previousScrollHeight = useRef<number | null>(null);
   
   const {
     chats,
     currentChat,
     currentChatId,
     isLoading,
+    isLoadingOlder,
     isConnected,
+    assistantStatus,
+    hasMoreChats,
     createChat,
     selectChat,
     deleteChat,
     sendMessage,
+    transcribe,
+    speak,
+    loadOlderMessages,
+    loadMoreChats,
   } = useChat();
 
-  // Auto-scroll to bottom when new messages are added
+  const messages = currentChat?.messages ?? [];
+  const firstMessageId = messages[0]?.id;
+  const lastMessageId = messages[messages.length - 1]?.id;
+
+  // Auto-scroll to bottom when new messages are added (not when older ones are prepended)
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [currentChat?.messages]);
+  }, [lastMessageId, currentChatId]);
+
+  // Keep the reader's place when an older page is prepended
+  useLayoutEffect(() => {
+    const container = messagesContainerRef.current;
+    if (container && previousScrollHeight.current !== null) {
+      container.scrollTop += container.scrollHeight - previousScrollHeight.current;
+      previousScrollHeight.current = null;
+    }
+  }, [firstMessageId]);
+
+  const handleMessagesScroll = () => {
+    const container = messagesContainerRef.current;
+    if (container && container.scrollTop < 100 && currentChat?.nextBefore != null && !isLoadingOlder) {
+      previousScrollHeight.current = container.scrollHeight;
+      loadOlderMessages();
+    }
+  };
 
   // Apply theme to document
   useEffect(() => {
@@ -56,6 +86,8 @@ function App() {
         onNewChat={createChat}
         onSelectChat={selectChat}
         onDeleteChat={deleteChat}
+        hasMoreChats={hasMoreChats}
+        onLoadMoreChats={loadMoreChats}
         isDarkMode={isDarkMode}
         onToggleTheme={handleToggleTheme}
         isOpen={sidebarOpen}
@@ -87,8 +119,8 @@ function App() {
         </div>
 
         {/* Chat Messages */}
-        <div className="flex-1 overflow-y-auto">
-          {currentChat?.messages.length === 0 ? (
+        <div ref={messagesContainerRef} onScroll={handleMessagesScroll} className="flex-1 overflow-y-auto">
+          {messages.length === 0 ? (
             <div className="h-full flex items-center justify-center">
               <div className="text-center max-w-md mx-auto p-8">
                 <div className={`w-16 h-16 rounded-full mx-auto mb-4 flex items-center justify-center ${
@@ -114,11 +146,17 @@ function App() {
             </div>
           ) : (
             <div>
-              {currentChat?.messages.map((message) => (
+              {isLoadingOlder && (
+                <div className={`text-center text-sm py-2 ${isDarkMode ? 'text-gray-500' : 'text-gray-400'}`}>
+                  Loading earlier messages...
+                </div>
+              )}
+              {messages.map((message) => (
                 <ChatMessage
                   key={message.id}
                   message={message}
                   isDarkMode={isDarkMode}
+                  onSpeak={speak}
                 />
               ))}
               {isLoading && (
@@ -137,7 +175,7 @@ function App() {
                       <div className={`w-2 h-2 rounded-full animate-pulse ${isDarkMode ? 'bg-gray-500' : 'bg-gray-400'}`} style={{ animationDelay: '0.2s' }} />
                       <div className={`w-2 h-2 rounded-full animate-pulse ${isDarkMode ? 'bg-gray-500' : 'bg-gray-400'}`} style={{ animationDelay: '0.4s' }} />
                       <span className={`ml-2 text-sm ${isDarkMode ? 'text-gray-400' : 'text-gray-500'}`}>
-                        Thinking...
+                        {assistantStatus || 'Thinking...'}
                       </span>
                     </div>
                   </div>
@@ -151,6 +189,7 @@ function App() {
         {/* Message Input */}
         <MessageInput
           onSendMessage={sendMessage}
+          onTranscribe={transcribe}
           isDarkMode={isDarkMode}
           disabled={isLoading}
         />
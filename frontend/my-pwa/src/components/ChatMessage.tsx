@@ -1,6 +1,5 @@
 import React from 'react';
 import { User, Bot, Volume2 } from 'lucide-react';
-import { textToSpeech } from '../utils/chatUtils';
 
 interface ChatMessageProps {
   message: {
@@ -10,21 +9,15 @@ interface ChatMessageProps {
     timestamp: Date;
   };
   isDarkMode: boolean;
+  onSpeak: (text: string) => Promise<void>;
 }
 
-export const ChatMessage: React.FC<ChatMessageProps> = ({ message, isDarkMode }) => {
+export const ChatMessage: React.FC<ChatMessageProps> = ({ message, isDarkMode, onSpeak }) => {
   const isUser = message.role === 'user';
 
   const handlePlayAudio = async () => {
     try {
-      const audioPath = await textToSpeech(message.content);
-      // In a real implementation, you would play the audio file
-      // For now, we'll just log the path
-      console.log('Audio file path:', audioPath);
-      
-      // You could implement audio playback here:
-      // const audio = new Audio(audioPath);
-      // audio.play();
+      await onSpeak(message.content);
     } catch (error) {
       console.error('Error playing audio:', error);
     }
@@ -1,6 +1,5 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { Send, Paperclip, Mic, MicOff, Square } from 'lucide-react';
-import { speechToText } from '../utils/chatUtils';
 import { stopProcess } from '../utils/chatUtils';
 
 
@@ -8,12 +7,14 @@ import { stopProcess } from '../utils/chatUtils';
 
 interface MessageInputProps {
   onSendMessage: (message: string) => void;
+  onTranscribe: (audio: File) => Promise<string>;
   isDarkMode: boolean;
   disabled?: boolean;
 }
 
 export const MessageInput: React.FC<MessageInputProps> = ({ 
   onSendMessage, 
+  onTranscribe,
   isDarkMode, 
   disabled = false 
 }) => {
@@ -60,7 +61,7 @@ export const MessageInput: React.FC<MessageInputProps> = ({
         const audioFile = new File([audioBlob], 'recording.wav', { type: 'audio/wav' });
         
         try {
-          const transcribedText = await speechToText(audioFile);
+          const transcribedText = await onTranscribe(audioFile);
           setMessage(prev => prev + (prev ? ' ' : '') + transcribedText);
         } catch (error) {
           console.error('Speech to text error:', error);
@@ -14,6 +14,8 @@ interface SidebarProps {
   onNewChat: () => void;
   onSelectChat: (chatId: string) => void;
   onDeleteChat: (chatId: string) => void;
+  hasMoreChats?: boolean;
+  onLoadMoreChats?: () => void;
   isDarkMode: boolean;
   onToggleTheme: () => void;
   isOpen: boolean;
@@ -26,6 +28,8 @@ export const Sidebar: React.FC<SidebarProps> = ({
   onNewChat,
   onSelectChat,
   onDeleteChat,
+  hasMoreChats,
+  onLoadMoreChats,
   isDarkMode,
   onToggleTheme,
   isOpen,
@@ -82,7 +86,16 @@ export const Sidebar: React.FC<SidebarProps> = ({
         </div>
 
         {/* Chat History */}
-        <div className="flex-1 overflow-y-auto p-2">
+        <div
+          className="flex-1 overflow-y-auto p-2"
+          onScroll={(e) => {
+            // Fetch the next page of chats when scrolled near the end
+            const list = e.currentTarget;
+            if (hasMoreChats && list.scrollTop + list.clientHeight >= list.scrollHeight - 50) {
+              onLoadMoreChats?.();
+            }
+          }}
+        >
           <div className="space-y-1">
             {chats.map((chat) => (
               <div
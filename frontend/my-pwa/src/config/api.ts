@@ -8,8 +8,14 @@ export const API_ENDPOINTS = {
   CHAT: '/chat',
   SPEECH_TO_TEXT: '/stt',
   TEXT_TO_SPEECH: '/tts',
+  CHATS: '/chats',
+  CHAT_SYNC: '/chats/sync',
+  WEBSOCKET: '/ws',
 } as const;
 
+export const chatEndpoint = (chatId: string) => `${API_ENDPOINTS.CHATS}/${encodeURIComponent(chatId)}`;
+export const chatMessagesEndpoint = (chatId: string) => `${chatEndpoint(chatId)}/messages`;
+
 // API utility functions
 export const apiRequest = async (endpoint: string, options: RequestInit = {}) => {
   const url = `${API_BASE_URL}${endpoint}`;
@@ -1,26 +1,187 @@
-import { useState, useCallback, useEffect } from 'react';
-import { Chat, Message } from '../types/chat';
-import { createNewChat, generateChatTitle, generateResponse, checkHealth } from '../utils/chatUtils';
+import { useState, useCallback, useEffect, useRef } from 'react';
+import { Chat, Message, SyncDelta } from '../types/chat';
+import {
+  createNewChat,
+  generateChatTitle,
+  checkHealth,
+  fetchChats,
+  fetchMessages,
+  fetchChanges,
+  deleteChatOnServer,
+  sendChatMessage,
+  speechToText,
+  textToSpeech,
+  fromServerChat,
+  fromServerMessage,
+  mergeMessages,
+} from '../utils/chatUtils';
+import { Channel } from '../utils/channel';
+
+const SYNC_INTERVAL_MS = 15000;
 
 export const useChat = () => {
   const [chats, setChats] = useState<Chat[]>([]);
   const [currentChatId, setCurrentChatId] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(false);
   const [isConnected, setIsConnected] = useState(false);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
+  const [chatsCursor, setChatsCursor] = useState<string | null>(null);
+  const syncCursor = useRef<number | null>(null); // null until the server's chat list was loaded
+  const pendingLoads = useRef(new Set<string>());
+  const [assistantStatus, setAssistantStatus] = useState<string | null>(null);
+  const channel = useRef<Channel | null>(null);
+
+  const updateChat = useCallback((chatId: string, update: (chat: Chat) => Chat) => {
+    setChats(prev => prev.map(chat => (chat.id === chatId ? update(chat) : chat)));
+  }, []);
 
-  // Initialize with a default chat
+  // Load the first page of chats from the server; fall back to a local chat when offline
   useEffect(() => {
-    const defaultChat = createNewChat();
-    setChats([defaultChat]);
-    setCurrentChatId(defaultChat.id);
-    
-    // Check backend health
     checkHealth().then(setIsConnected);
+
+    fetchChats()
+      .then(page => {
+        syncCursor.current = page.sync_cursor;
+        setChatsCursor(page.next_cursor);
+        const serverChats = page.chats.map(fromServerChat);
+        const initial = serverChats.length > 0 ? serverChats : [createNewChat()];
+        setChats(initial);
+        setCurrentChatId(initial[0].id);
+      })
+      .catch(() => {
+        const defaultChat = createNewChat();
+        setChats([defaultChat]);
+        setCurrentChatId(defaultChat.id);
+      });
+  }, []);
+
+  // Persistent socket for streamed answers and live status; HTTP is the fallback
+  useEffect(() => {
+    const socket = new Channel();
+    socket.onStatus = setAssistantStatus;
+    socket.onConnectionChange = connected => {
+      if (connected) setIsConnected(true);
+    };
+    socket.connect();
+    channel.current = socket;
+    return () => socket.close();
   }, []);
 
   const currentChat = chats.find(chat => chat.id === currentChatId);
 
+  // Fetch the latest page of a chat the first time it is opened
+  useEffect(() => {
+    if (!currentChat || currentChat.loaded || pendingLoads.current.has(currentChat.id)) return;
+    const chatId = currentChat.id;
+    pendingLoads.current.add(chatId);
+    fetchMessages(chatId)
+      .then(page => updateChat(chatId, chat => ({
+        ...chat,
+        messages: mergeMessages(chat.messages, page.messages.map(fromServerMessage)),
+        loaded: true,
+        nextBefore: page.next_before,
+      })))
+      .catch(error => console.error('Error loading messages:', error))
+      .finally(() => pendingLoads.current.delete(chatId));
+  }, [currentChat, updateChat]);
+
+  const loadOlderMessages = useCallback(async () => {
+    if (!currentChat || currentChat.nextBefore == null || isLoadingOlder) return;
+    const chatId = currentChat.id;
+    setIsLoadingOlder(true);
+    try {
+      const page = await fetchMessages(chatId, currentChat.nextBefore);
+      updateChat(chatId, chat => ({
+        ...chat,
+        messages: mergeMessages(chat.messages, page.messages.map(fromServerMessage)),
+        nextBefore: page.next_before,
+      }));
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  }, [currentChat, isLoadingOlder, updateChat]);
+
+  const loadMoreChats = useCallback(async () => {
+    if (!chatsCursor) return;
+    try {
+      const page = await fetchChats(chatsCursor);
+      setChatsCursor(page.next_cursor);
+      setChats(prev => {
+        const known = new Set(prev.map(chat => chat.id));
+        return [...prev, ...page.chats.map(fromServerChat).filter(chat => !known.has(chat.id))];
+      });
+    } catch (error) {
+      console.error('Error loading chats:', error);
+    }
+  }, [chatsCursor]);
+
+  // Apply server-side changes (other tabs/devices) since the last sync cursor
+  const applyDelta = useCallback((delta: SyncDelta) => {
+    setChats(prev => {
+      let next = [...prev];
+      delta.chats.forEach(serverChat => {
+        const index = next.findIndex(chat => chat.id === serverChat.id);
+        if (serverChat.deleted) {
+          if (index >= 0) next.splice(index, 1);
+        } else if (index >= 0) {
+          next[index] = {
+            ...next[index],
+            title: serverChat.title,
+            lastMessage: serverChat.last_message,
+            timestamp: new Date(serverChat.updated * 1000),
+          };
+        } else {
+          next.push(fromServerChat(serverChat));
+        }
+      });
+      // Only chats whose latest page is loaded take new messages; others fetch on open
+      const incoming = new Map<string, Message[]>();
+      delta.messages.forEach(message => {
+        incoming.set(message.chat_id, [...(incoming.get(message.chat_id) || []), fromServerMessage(message)]);
+      });
+      next = next.map(chat => (chat.loaded && incoming.has(chat.id)
+        ? { ...chat, messages: mergeMessages(chat.messages, incoming.get(chat.id)!) }
+        : chat));
+      if (next.length === 0) next = [createNewChat()];
+      return next.sort((a, b) => b.timestamp.getTime() - a.timestamp.getTime());
+    });
+  }, []);
+
+  const sync = useCallback(async () => {
+    if (syncCursor.current == null) return;
+    try {
+      let delta: SyncDelta;
+      do {
+        delta = await fetchChanges(syncCursor.current);
+        syncCursor.current = delta.cursor;
+        if (delta.chats.length > 0 || delta.messages.length > 0) applyDelta(delta);
+      } while (delta.more);
+      setIsConnected(true);
+    } catch {
+      setIsConnected(false);
+    }
+  }, [applyDelta]);
+
+  useEffect(() => {
+    const interval = setInterval(sync, SYNC_INTERVAL_MS);
+    window.addEventListener('focus', sync);
+    return () => {
+      clearInterval(interval);
+      window.removeEventListener('focus', sync);
+    };
+  }, [sync]);
+
+  // Keep a valid selection when the current chat disappears (deleted here or elsewhere)
+  useEffect(() => {
+    if (chats.length > 0 && !chats.some(chat => chat.id === currentChatId)) {
+      setCurrentChatId(chats[0].id);
+    }
+  }, [chats, currentChatId]);
+
   const createChat = useCallback(() => {
+    // Created on the server with its first message
     const newChat = createNewChat();
     setChats(prev => [newChat, ...prev]);
     setCurrentChatId(newChat.id);
@@ -33,112 +194,140 @@ export const useChat = () => {
   const deleteChat = useCallback((chatId: string) => {
     setChats(prev => {
       const filtered = prev.filter(chat => chat.id !== chatId);
-      
-      // If we deleted the current chat, select the first remaining chat
-      if (chatId === currentChatId) {
-        if (filtered.length > 0) {
-          setCurrentChatId(filtered[0].id);
-        } else {
-          // If no chats left, create a new one
-          const newChat = createNewChat();
-          setChats([newChat]);
-          setCurrentChatId(newChat.id);
-          return [newChat];
-        }
-      }
-      
-      return filtered;
+      // If no chats left, create a new one
+      return filtered.length > 0 ? filtered : [createNewChat()];
     });
-  }, [currentChatId]);
+    deleteChatOnServer(chatId);
+  }, []);
 
   const sendMessage = useCallback(async (content: string) => {
     if (!currentChatId) return;
+    const chatId = currentChatId;
 
     const userMessage: Message = {
-      id: Date.now().toString(),
+      id: `local-${Date.now()}`,
       role: 'user',
       content,
       timestamp: new Date(),
     };
 
     // Add user message
-    setChats(prev => prev.map(chat => {
-      if (chat.id === currentChatId) {
-        const updatedMessages = [...chat.messages, userMessage];
-        const title = chat.messages.length === 0 ? generateChatTitle(content) : chat.title;
-        
-        return {
-          ...chat,
-          messages: updatedMessages,
-          title,
-          lastMessage: content,
-          timestamp: new Date(),
-        };
-      }
-      return chat;
+    updateChat(chatId, chat => ({
+      ...chat,
+      messages: [...chat.messages, userMessage],
+      title: chat.messages.length === 0 ? generateChatTitle(content) : chat.title,
+      lastMessage: content,
+      timestamp: new Date(),
     }));
 
     setIsLoading(true);
 
     try {
-      // Generate AI response
-      const responseContent = await generateResponse(content);
-      
+      // Generate AI response; the server returns both stored messages
+      const socket = channel.current;
+      let response: string;
+      let messages: Message[];
+      if (socket?.connected) {
+        // Stream tokens into a placeholder that the stored messages replace at the end
+        const streamingId = `local-${Date.now() + 1}`;
+        updateChat(chatId, chat => ({
+          ...chat,
+          messages: [...chat.messages, { id: streamingId, role: 'assistant', content: '', timestamp: new Date() }],
+        }));
+        try {
+          const answer = await socket.chat(content, chatId, text => updateChat(chatId, chat => ({
+            ...chat,
+            messages: chat.messages.map(message => (message.id === streamingId
+              ? { ...message, content: message.content + text }
+              : message)),
+          })));
+          response = answer.text;
+          messages = answer.messages.map(fromServerMessage);
+        } finally {
+          updateChat(chatId, chat => ({
+            ...chat,
+            messages: chat.messages.filter(message => message.id !== streamingId),
+          }));
+        }
+      } else {
+        ({ response, messages } = await sendChatMessage(chatId, content));
+      }
       const assistantMessage: Message = {
-        id: (Date.now() + 1).toString(),
+        id: `local-${Date.now() + 1}`,
         role: 'assistant',
-        content: responseContent,
+        content: response,
         timestamp: new Date(),
       };
 
-      // Add assistant message
-      setChats(prev => prev.map(chat => {
-        if (chat.id === currentChatId) {
-          return {
-            ...chat,
-            messages: [...chat.messages, assistantMessage],
-            lastMessage: responseContent.substring(0, 100),
-            timestamp: new Date(),
-          };
-        }
-        return chat;
+      // Replace the optimistic message with the stored ones
+      updateChat(chatId, chat => ({
+        ...chat,
+        messages: mergeMessages(
+          chat.messages.filter(message => message.id !== userMessage.id),
+          messages.length > 0 ? messages : [userMessage, assistantMessage],
+        ),
+        lastMessage: response.substring(0, 100),
+        timestamp: new Date(),
       }));
     } catch (error) {
       console.error('Error generating response:', error);
-      
+
       // Add error message
       const errorMessage: Message = {
-        id: (Date.now() + 1).toString(),
+        id: `local-${Date.now() + 1}`,
         role: 'assistant',
         content: "I'm sorry, I encountered an error while processing your message. Please try again.",
         timestamp: new Date(),
       };
 
-      setChats(prev => prev.map(chat => {
-        if (chat.id === currentChatId) {
-          return {
-            ...chat,
-            messages: [...chat.messages, errorMessage],
-            lastMessage: "Error occurred",
-            timestamp: new Date(),
-          };
-        }
-        return chat;
+      updateChat(chatId, chat => ({
+        ...chat,
+        messages: [...chat.messages, errorMessage],
+        lastMessage: "Error occurred",
+        timestamp: new Date(),
       }));
     } finally {
       setIsLoading(false);
+      setAssistantStatus(null);
     }
-  }, [currentChatId]);
+  }, [currentChatId, updateChat]);
+
+  // Mic audio and speech go over the socket too; the form-POST endpoints are the fallback
+  const transcribe = useCallback(async (audio: File): Promise<string> => {
+    const socket = channel.current;
+    return socket?.connected ? socket.transcribe(audio, 'wav') : speechToText(audio);
+  }, []);
+
+  const speak = useCallback(async (text: string): Promise<void> => {
+    const socket = channel.current;
+    if (!socket?.connected) {
+      await textToSpeech(text); // played on the server
+      return;
+    }
+    const chunks: ArrayBuffer[] = [];
+    await socket.speak(text, chunk => chunks.push(chunk));
+    const url = URL.createObjectURL(new Blob(chunks, { type: 'audio/mpeg' }));
+    const audio = new Audio(url);
+    audio.onended = () => URL.revokeObjectURL(url);
+    await audio.play();
+  }, []);
 
   return {
     chats,
     currentChat,
     currentChatId,
     isLoading,
+    isLoadingOlder,
     isConnected,
+    assistantStatus,
+    hasMoreChats: chatsCursor !== null,
     createChat,
     selectChat,
     deleteChat,
     sendMessage,
+    transcribe,
+    speak,
+    loadOlderMessages,
+    loadMoreChats,
   };
-};
\ No newline at end of file
+};
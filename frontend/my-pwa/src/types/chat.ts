@@ -3,6 +3,7 @@ export interface Message {
   role: 'user' | 'assistant';
   content: string;
   timestamp: Date;
+  seq?: number; // server ordering; absent while a message is only local
 }
 
 export interface Chat {
@@ -11,4 +12,44 @@ export interface Chat {
   messages: Message[];
   lastMessage: string;
   timestamp: Date;
-}
\ No newline at end of file
+  loaded: boolean; // latest page fetched from the server
+  nextBefore: number | null; // cursor for the next older page, null when fully loaded
+}
+
+// Shapes returned by the backend's chat sync API (timestamps are epoch seconds).
+export interface ServerChat {
+  id: string;
+  title: string;
+  created: number;
+  updated: number;
+  last_message: string;
+  deleted: number;
+  rev: number;
+}
+
+export interface ServerMessage {
+  seq: number;
+  id: string;
+  chat_id: string;
+  role: 'user' | 'assistant';
+  content: string;
+  created: number;
+}
+
+export interface ChatPage {
+  chats: ServerChat[];
+  next_cursor: string | null;
+  sync_cursor: number;
+}
+
+export interface MessagePage {
+  messages: ServerMessage[];
+  next_before: number | null;
+}
+
+export interface SyncDelta {
+  chats: ServerChat[];
+  messages: ServerMessage[];
+  cursor: number;
+  more: boolean;
+}
@@ -0,0 +1,134 @@
+import { API_BASE_URL, API_ENDPOINTS } from '../config/api';
+import { ServerMessage } from '../types/chat';
+
+// Client for the backend's /ws channel: one persistent socket carrying chat turns,
+// streamed tokens, assistant status, TTS audio and mic audio (see Backend/Main.py).
+
+interface Frame {
+  type: string;
+  id?: string | null;
+  [key: string]: unknown;
+}
+
+interface PendingRequest {
+  resolve: (frame: Frame) => void;
+  reject: (error: Error) => void;
+  onToken?: (text: string) => void;
+  onAudio?: (chunk: ArrayBuffer) => void;
+  done: string; // frame type that completes the request
+}
+
+const MIC_FRAME_BYTES = 64 * 1024;
+const MAX_RETRY_MS = 15000;
+
+export const WS_URL = `${API_BASE_URL.replace(/^http/, 'ws')}${API_ENDPOINTS.WEBSOCKET}`;
+
+export class Channel {
+  onStatus?: (text: string) => void;
+  onConnectionChange?: (connected: boolean) => void;
+
+  private socket: WebSocket | null = null;
+  private pending = new Map<string, PendingRequest>();
+  private audioId: string | null = null; // binary frames belong to this request
+  private nextId = 0;
+  private retryMs = 1000;
+  private closed = false;
+
+  constructor(private url: string = WS_URL) {}
+
+  get connected(): boolean {
+    return this.socket?.readyState === WebSocket.OPEN;
+  }
+
+  connect() {
+    this.closed = false;
+    const socket = new WebSocket(this.url);
+    socket.binaryType = 'arraybuffer';
+    socket.onopen = () => {
+      this.retryMs = 1000;
+      this.onConnectionChange?.(true);
+    };
+    socket.onmessage = event => this.handle(event.data);
+    socket.onclose = () => {
+      this.socket = null;
+      this.onConnectionChange?.(false);
+      this.pending.forEach(request => request.reject(new Error('Connection closed')));
+      this.pending.clear();
+      if (!this.closed) {
+        setTimeout(() => this.connect(), this.retryMs);
+        this.retryMs = Math.min(this.retryMs * 2, MAX_RETRY_MS);
+      }
+    };
+    this.socket = socket;
+  }
+
+  close() {
+    this.closed = true;
+    this.socket?.close();
+  }
+
+  chat(prompt: string, chatId: string, onToken?: (text: string) => void):
+    Promise<{ text: string; messages: ServerMessage[] }> {
+    return this.request({ type: 'chat', prompt, chat_id: chatId }, 'answer', { onToken })
+      .then(frame => ({ text: frame.text as string, messages: (frame.messages as ServerMessage[]) || [] }));
+  }
+
+  speak(text: string, onAudio: (chunk: ArrayBuffer) => void): Promise<void> {
+    return this.request({ type: 'tts', text }, 'audio_end', { onAudio }).then(() => undefined);
+  }
+
+  async transcribe(audio: Blob, format = 'webm'): Promise<string> {
+    const id = this.newId();
+    const result = this.request({ type: 'mic_start', format }, 'transcript', {}, id);
+    const bytes = await audio.arrayBuffer();
+    for (let offset = 0; offset < bytes.byteLength; offset += MIC_FRAME_BYTES) {
+      this.socket?.send(bytes.slice(offset, offset + MIC_FRAME_BYTES));
+    }
+    this.socket?.send(JSON.stringify({ type: 'mic_end', id }));
+    return (await result).text as string;
+  }
+
+  private newId(): string {
+    this.nextId += 1;
+    return `r${this.nextId}`;
+  }
+
+  private request(
+    body: Record<string, unknown>,
+    done: string,
+    callbacks: Pick<PendingRequest, 'onToken' | 'onAudio'>,
+    id: string = this.newId(),
+  ): Promise<Frame> {
+    if (!this.connected) return Promise.reject(new Error('Not connected'));
+    return new Promise((resolve, reject) => {
+      this.pending.set(id, { resolve, reject, done, ...callbacks });
+      this.socket!.send(JSON.stringify({ ...body, id }));
+    });
+  }
+
+  private handle(data: string | ArrayBuffer) {
+    if (data instanceof ArrayBuffer) {
+      if (this.audioId) this.pending.get(this.audioId)?.onAudio?.(data);
+      return;
+    }
+    const frame: Frame = JSON.parse(data);
+    if (frame.type === 'status') {
+      this.onStatus?.(frame.text as string);
+      return;
+    }
+    const request = frame.id != null ? this.pending.get(frame.id) : undefined;
+    if (!request) return;
+    if (frame.type === 'token') {
+      request.onToken?.(frame.text as string);
+    } else if (frame.type === 'audio_start') {
+      this.audioId = frame.id as string;
+    } else if (frame.type === 'error') {
+      this.pending.delete(frame.id as string);
+      request.reject(new Error(frame.error as string));
+    } else if (frame.type === request.done) {
+      if (frame.type === 'audio_end') this.audioId = null;
+      this.pending.delete(frame.id as string);
+      request.resolve(frame);
+    }
+  }
+}
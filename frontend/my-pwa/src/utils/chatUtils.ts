@@ -1,5 +1,5 @@
-import { Chat, Message } from '../types/chat';
-import { apiRequest, API_ENDPOINTS } from '../config/api';
+import { Chat, Message, ServerChat, ServerMessage, ChatPage, MessagePage, SyncDelta } from '../types/chat';
+import { apiRequest, API_ENDPOINTS, chatEndpoint, chatMessagesEndpoint } from '../config/api';
 
 export const generateChatTitle = (firstMessage: string): string => {
   // Generate a title from the first message (truncate to reasonable length)
@@ -17,20 +17,82 @@ export const createNewChat = (): Chat => {
     messages: [],
     lastMessage: '',
     timestamp: new Date(),
+    loaded: true, // nothing on the server yet
+    nextBefore: null,
   };
 };
 
-export const generateResponse = async (userMessage: string): Promise<string> => {
+export const fromServerChat = (chat: ServerChat): Chat => ({
+  id: chat.id,
+  title: chat.title,
+  messages: [],
+  lastMessage: chat.last_message,
+  timestamp: new Date(chat.updated * 1000),
+  loaded: false,
+  nextBefore: null,
+});
+
+export const fromServerMessage = (message: ServerMessage): Message => ({
+  id: message.id,
+  role: message.role,
+  content: message.content,
+  timestamp: new Date(message.created * 1000),
+  seq: message.seq,
+});
+
+// Union by id, in server order; local-only (optimistic) messages stay at the end.
+export const mergeMessages = (existing: Message[], incoming: Message[]): Message[] => {
+  const byId = new Map(existing.map(message => [message.id, message]));
+  incoming.forEach(message => byId.set(message.id, message));
+  return [...byId.values()].sort((a, b) => (a.seq ?? Infinity) - (b.seq ?? Infinity));
+};
+
+export const fetchChats = async (cursor?: string | null, limit = 20): Promise<ChatPage> => {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set('cursor', cursor);
+  const response = await apiRequest(`${API_ENDPOINTS.CHATS}?${params}`);
+  return response.json();
+};
+
+export const fetchMessages = async (chatId: string, before?: number | null): Promise<MessagePage> => {
+  const query = before != null ? `?before=${before}` : '';
+  const response = await apiRequest(`${chatMessagesEndpoint(chatId)}${query}`);
+  return response.json();
+};
+
+export const fetchChanges = async (since: number): Promise<SyncDelta> => {
+  const response = await apiRequest(`${API_ENDPOINTS.CHAT_SYNC}?since=${since}`);
+  return response.json();
+};
+
+export const deleteChatOnServer = async (chatId: string): Promise<void> => {
+  try {
+    await apiRequest(chatEndpoint(chatId), { method: 'DELETE' });
+  } catch (error) {
+    // 404: the chat never reached the server (no messages sent yet)
+    console.error('Error deleting chat:', error);
+  }
+};
+
+// Sends a message within a chat; the server stores both sides and returns them with their ids.
+export const sendChatMessage = async (
+  chatId: string,
+  userMessage: string,
+): Promise<{ response: string; messages: Message[] }> => {
   try {
     const formData = new FormData();
     formData.append('prompt', userMessage);
+    formData.append('chat_id', chatId);
 
     const response = await apiRequest(API_ENDPOINTS.CHAT, {
       method: 'POST',
       body: formData,
     });
     const data = await response.json();
-    return data.response || 'Sorry, I could not generate a response.';
+    return {
+      response: data.response || 'Sorry, I could not generate a response.',
+      messages: (data.messages || []).map(fromServerMessage),
+    };
   } catch (error) {
     console.error('Error calling chat API:', error);
     throw new Error('Failed to get response from the server. Please try again.');